@@ -0,0 +1,111 @@
+# Copyright 2013 Donald Stufft
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Measures the per request overhead of dispatching to a view, comparing
+importing the view for every request with looking it up in the dispatch
+table that is built when the application is created.
+
+    $ python benchmarks/dispatch.py -n 100000
+"""
+from __future__ import absolute_import, division, print_function
+from __future__ import unicode_literals
+
+import argparse
+import importlib
+import timeit
+
+from werkzeug.test import create_environ
+
+from warehouse.application import Warehouse
+from warehouse.http import Request
+
+
+ENDPOINT = "warehouse.legacy.simple.project"
+
+
+class ImportingWarehouse(Warehouse):
+    # The dispatch that was used before the dispatch table existed
+
+    def dispatch(self, environ):
+        urls = self.urls.bind_to_environ(environ)
+        endpoint, kwargs = urls.match()
+
+        modname, viewname = endpoint.rsplit(".", 1)
+        module = importlib.import_module(modname)
+        view = getattr(module, viewname)
+
+        request = Request(environ)
+        request.url_adapter = urls
+
+        return view(self, request, **kwargs)
+
+
+def _view(app, request, **kwargs):
+    return None
+
+
+def _make_app(cls):
+    app = cls.from_yaml(
+        override={"database": {"url": "postgresql:///benchmark"}},
+        engine=object(),
+    )
+
+    # Swap out the real view so that we only measure the dispatching
+    module = importlib.import_module(ENDPOINT.rsplit(".", 1)[0])
+    module.project = _view
+    app.views[ENDPOINT] = _view
+
+    return app
+
+
+def _report(name, number, seconds):
+    print("{:<32} {:>8.2f} usec/request".format(
+        name,
+        seconds / number * 1e6,
+    ))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--number", type=int, default=100000)
+    parser.add_argument("-r", "--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    environ = create_environ("/simple/foo/")
+
+    for name, cls in [("import per request", ImportingWarehouse),
+                      ("dispatch table", Warehouse)]:
+        app = _make_app(cls)
+
+        # Only the view lookup
+        if cls is Warehouse:
+            def lookup():
+                return app.views[ENDPOINT]
+        else:
+            def lookup():
+                modname, viewname = ENDPOINT.rsplit(".", 1)
+                return getattr(importlib.import_module(modname), viewname)
+
+        seconds = min(timeit.repeat(lookup, number=args.number,
+                                    repeat=args.repeat))
+        _report(name + " (lookup)", args.number, seconds)
+
+        # The entire dispatch, including matching the URL
+        seconds = min(timeit.repeat(lambda: app.dispatch(dict(environ)),
+                                    number=args.number, repeat=args.repeat))
+        _report(name + " (dispatch)", args.number, seconds)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+# Copyright 2013 Donald Stufft
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Measures how long it takes to look up the last serial of a project by
+aggregating the journals, with and without the (name, id) index, and by
+reading the package_serials table.
+
+The database must already be migrated. With --populate an empty database
+is filled with a journal of 10 million rows first, which takes a few minutes.
+Populating refuses to touch a database which already has journal entries, so
+point it at a database of its own.
+
+    $ warehouse migrate upgrade head
+    $ python benchmarks/last_serial.py postgresql:///benchmark --populate
+    $ python benchmarks/last_serial.py postgresql:///benchmark
+"""
+from __future__ import absolute_import, division, print_function
+from __future__ import unicode_literals
+
+import argparse
+import random
+import timeit
+
+from warehouse.application import Warehouse
+
+
+def _has_journals(engine):
+    with engine.connect() as conn:
+        return conn.execute("SELECT EXISTS (SELECT 1 FROM journals)").scalar()
+
+
+def _populate(engine, rows, projects):
+    with engine.begin() as conn:
+        # The journal is empty, so anything in here is left over
+        conn.execute("TRUNCATE package_serials")
+
+        # Fill package_serials in a single pass afterwards instead of firing
+        #   the trigger for every row.
+        conn.execute(
+            "ALTER TABLE journals DISABLE TRIGGER journals_package_serial"
+        )
+        conn.execute(
+            """ INSERT INTO journals (id, name, version, action)
+                SELECT i, 'project-' || (i %% %s), '1.0', 'new release'
+                FROM generate_series(1, %s) AS i
+            """,
+            [projects, rows],
+        )
+        conn.execute(
+            """ INSERT INTO package_serials (name, last_serial)
+                SELECT name, max(id) FROM journals GROUP BY name
+            """
+        )
+        conn.execute(
+            "ALTER TABLE journals ENABLE TRIGGER journals_package_serial"
+        )
+
+    with engine.connect() as conn:
+        conn.execution_options(isolation_level="AUTOCOMMIT").execute(
+            "VACUUM ANALYZE journals"
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("database_url")
+    parser.add_argument("-n", "--rows", type=int, default=10000000)
+    parser.add_argument("-p", "--projects", type=int, default=50000)
+    parser.add_argument("-l", "--lookups", type=int, default=1000)
+    parser.add_argument(
+        "--populate",
+        action="store_true",
+        help="Fill an empty database with --rows journal entries first",
+    )
+    args = parser.parse_args(argv)
+
+    app = Warehouse.from_yaml(
+        override={"database": {"url": args.database_url}},
+    )
+    model = app.models.packaging
+
+    # Never fill a database that has a journal of its own, it may well be a
+    #   real one.
+    if args.populate:
+        if _has_journals(app.engine):
+            raise SystemExit(
+                "Refusing to populate a database which already has journal "
+                "entries"
+            )
+        _populate(app.engine, args.rows, args.projects)
+    elif not _has_journals(app.engine):
+        raise SystemExit("The database has no journal entries, use --populate")
+
+    names = [
+        "project-{}".format(random.randrange(args.projects))
+        for _ in range(args.lookups)
+    ]
+
+    for name, package_serials, drop_index in [
+            ("journals", False, True),
+            ("journals (name, id) index", False, False),
+            ("package_serials", True, False)]:
+        app.config.database["package_serials"] = package_serials
+
+        # Share one connection between every lookup, the way a request does
+        app.engine.begin_scope()
+        try:
+            conn = app.engine.connect()
+            transaction = conn.begin()
+
+            # Measure without the index by dropping it inside of a transaction
+            #   which is rolled back afterwards.
+            if drop_index:
+                conn.execute("DROP INDEX journals_name_id_idx")
+
+            seconds = timeit.timeit(
+                lambda: [model.get_last_serial(n) for n in names],
+                number=1,
+            )
+
+            transaction.rollback()
+        finally:
+            app.engine.end_scope()
+
+        print("{:<28} {:>8.3f} msec/lookup".format(
+            name,
+            seconds / args.lookups * 1e3,
+        ))
+
+
+if __name__ == "__main__":
+    main()
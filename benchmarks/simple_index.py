@@ -0,0 +1,74 @@
+# Copyright 2013 Donald Stufft
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Measures how long it takes to render the /simple/ index with the Jinja2
+templates and with the native renderer, with and without the precomputed
+project paths.
+
+    $ python benchmarks/simple_index.py -p 50000
+"""
+from __future__ import absolute_import, division, print_function
+from __future__ import unicode_literals
+
+import argparse
+import timeit
+
+from werkzeug.test import create_environ
+
+from warehouse.application import Warehouse
+from warehouse.http import Request
+from warehouse.legacy import native
+from warehouse.packaging.models import Project, _project_path
+from warehouse.utils import render_response
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-p", "--projects", type=int, default=50000)
+    parser.add_argument("-r", "--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    app = Warehouse.from_yaml(
+        override={"database": {"url": "postgresql:///benchmark"}},
+        engine=object(),
+    )
+
+    environ = create_environ("/simple/")
+    request = Request(environ)
+    request.url_adapter = app.urls.bind_to_environ(environ)
+
+    projects = [
+        Project("project-{}_name".format(i)) for i in range(args.projects)
+    ]
+
+    paths = {p.name: _project_path(p.name) for p in projects}
+
+    for name, render, variables in [
+            ("jinja2", render_response, {}),
+            ("native", native.render_response, {}),
+            ("native with paths", native.render_response,
+                {"project_paths": paths})]:
+        def run():
+            render(
+                app, request, "legacy/simple/index.html",
+                projects=projects,
+                **variables
+            ).get_data()
+
+        seconds = min(timeit.repeat(run, number=1, repeat=args.repeat))
+        print("{:<20} {:>10.2f} msec".format(name, seconds * 1e3))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+# Copyright 2013 Donald Stufft
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from __future__ import absolute_import, division, print_function
+from __future__ import unicode_literals
+
+import datetime
+import json
+
+import pretend
+import pytest
+
+from werkzeug.test import create_environ
+
+from warehouse.application import Warehouse
+from warehouse.http import Request
+from warehouse.legacy import changelog
+from warehouse.packaging.models import ChangelogEntry
+
+
+def _entries(serials):
+    return [
+        ChangelogEntry(
+            serial=serial,
+            name="foo",
+            version="1.0",
+            action="new release",
+            submitted_date=datetime.datetime(2014, 5, 1, 12, serial % 60),
+        )
+        for serial in serials
+    ]
+
+
+@pytest.mark.parametrize(
+    ("query", "available", "limit", "next_serial"),
+    [
+        ("", 2, 3, None),
+        ("", 5, 3, 13),
+        ("?limit=2", 5, 2, 12),
+        ("?limit=100", 5, 4, 14),
+        ("?limit=0", 5, 1, 11),
+        ("?limit=wat", 5, 3, 13),
+    ],
+)
+def test_since(query, available, limit, next_serial):
+    app = Warehouse.from_yaml(
+        override={
+            "database": {"url": "postgresql:///nonexistant"},
+            "changelog": {"page_size": 3, "max_page_size": 4},
+        },
+        engine=pretend.stub(),
+    )
+
+    get_changelog = pretend.call_recorder(
+        lambda since, limit: _entries(range(since + 1, since + 1 + min(
+            limit, available,
+        )))
+    )
+    app.models.packaging = pretend.stub(
+        get_changelog=get_changelog,
+        get_last_serial=lambda: 9999,
+    )
+
+    environ = create_environ("/changelog/since/10" + query)
+    request = Request(environ)
+    request.url_adapter = app.urls.bind_to_environ(environ)
+
+    resp = changelog.since(app, request, serial=10)
+
+    assert get_changelog.calls == [pretend.call(10, limit)]
+    assert resp.mimetype == "application/x-ndjson"
+    assert resp.headers["X-PyPI-Last-Serial"] == "9999"
+
+    lines = resp.get_data(as_text=True).splitlines()
+    entries = [json.loads(line) for line in lines]
+    assert [e["serial"] for e in entries] == list(
+        range(11, 11 + min(limit, available))
+    )
+    assert entries[0] == {
+        "serial": 11,
+        "name": "foo",
+        "version": "1.0",
+        "action": "new release",
+        "submitted_date": "2014-05-01T12:11:00",
+    }
+
+    if next_serial is None:
+        assert "Link" not in resp.headers
+    else:
+        assert resp.headers["Link"] == (
+            "</changelog/since/{}?limit={}>; rel=next".format(
+                next_serial, limit,
+            )
+        )
+
+
+def test_serialize_without_date():
+    entry = ChangelogEntry(1, None, None, "wat", None)
+
+    assert json.loads(changelog._serialize(entry)) == {
+        "serial": 1,
+        "name": None,
+        "version": None,
+        "action": "wat",
+        "submitted_date": None,
+    }
@@ -0,0 +1,331 @@
+# Copyright 2013 Donald Stufft
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from __future__ import absolute_import, division, print_function
+from __future__ import unicode_literals
+
+import os
+
+import pretend
+import pytest
+
+from werkzeug.exceptions import NotFound
+
+from warehouse.http import Response
+from warehouse.legacy import cli, simple
+from warehouse.packaging.models import Project
+
+
+def test_write_atomic(tmpdir):
+    path = str(tmpdir.join("simple", "foo", "index.html"))
+
+    cli._write_atomic(path, [b"foo", b"bar"])
+    cli._write_atomic(path, [b"new"])
+
+    with open(path, "rb") as fp:
+        assert fp.read() == b"new"
+
+    assert os.listdir(os.path.dirname(path)) == ["index.html"]
+
+
+def test_write_atomic_failure(tmpdir):
+    path = str(tmpdir.join("simple", "foo", "index.html"))
+
+    def chunks():
+        yield b"foo"
+        raise ValueError
+
+    with pytest.raises(ValueError):
+        cli._write_atomic(path, chunks())
+
+    assert os.listdir(os.path.dirname(path)) == []
+
+
+def test_render_project_missing(app, tmpdir, monkeypatch):
+    def project(app, request, project_name):
+        raise NotFound
+
+    monkeypatch.setattr(simple, "project", project)
+
+    assert not cli.render_project(app, str(tmpdir), "foo")
+    assert not tmpdir.join("simple", "foo").check()
+
+
+def test_export_simple(app, tmpdir, monkeypatch, capsys):
+    index = pretend.call_recorder(lambda app, request: Response("index"))
+    project = pretend.call_recorder(
+        lambda app, request, project_name: Response(project_name),
+    )
+    monkeypatch.setattr(simple, "index", index)
+    monkeypatch.setattr(simple, "project", project)
+
+    app.models.packaging = pretend.stub(
+        all_projects=lambda: iter([Project("bar"), Project("foo")]),
+        get_last_serial=lambda: 10,
+    )
+
+    cli.ExportSimpleCommand()(app, str(tmpdir), processes=1, batch_size=10)
+
+    assert tmpdir.join("simple", "index.html").read() == "index"
+    assert tmpdir.join("simple", "bar", "index.html").read() == "bar"
+    assert tmpdir.join("simple", "foo", "index.html").read() == "foo"
+    assert tmpdir.join(".last-serial").read() == "10\n"
+
+    assert [c.args[0] for c in index.calls] == [app]
+    assert [c.kwargs for c in project.calls] == [
+        {"project_name": "bar"},
+        {"project_name": "foo"},
+    ]
+    assert project.calls[0].args[1].path == "/simple/bar/"
+
+    out, _ = capsys.readouterr()
+    assert out == "Exported 2 projects to {}\n".format(tmpdir)
+
+
+def test_export_simple_normalized(app, tmpdir, monkeypatch):
+    monkeypatch.setattr(
+        simple, "index", lambda app, request: Response("index"),
+    )
+    monkeypatch.setattr(
+        simple, "project",
+        lambda app, request, project_name: Response(project_name),
+    )
+
+    app.models.packaging = pretend.stub(
+        all_projects=lambda: iter([Project("Foo_Bar"), Project("zope2")]),
+        get_last_serial=lambda: None,
+    )
+
+    # A page from an export that used the real name
+    tmpdir.join("simple", "Foo_Bar", "index.html").write("old", ensure=True)
+
+    cli.export_simple(app, str(tmpdir), processes=1)
+
+    # Pages are served under the normalized name that installers ask for,
+    #   and the real name that the index links to leads to the same page.
+    assert tmpdir.join("simple", "foo-bar", "index.html").read() == "Foo_Bar"
+    assert tmpdir.join("simple", "Foo_Bar", "index.html").read() == "Foo_Bar"
+    assert os.readlink(str(tmpdir.join("simple", "Foo_Bar"))) == "foo-bar"
+    assert tmpdir.join("simple", "zope2", "index.html").read() == "zope2"
+    assert sorted(os.listdir(str(tmpdir.join("simple")))) == [
+        "Foo_Bar", "foo-bar", "index.html", "zope2",
+    ]
+
+    # Exporting again leaves the link as it is
+    cli.export_simple(app, str(tmpdir), processes=1)
+
+    assert os.readlink(str(tmpdir.join("simple", "Foo_Bar"))) == "foo-bar"
+
+    cli.remove_project(str(tmpdir), "Foo_Bar")
+
+    assert sorted(os.listdir(str(tmpdir.join("simple")))) == [
+        "index.html", "zope2",
+    ]
+
+
+def test_render_projects_pool(app, monkeypatch):
+    class FakePool(object):
+
+        def __init__(self, processes, initializer, initargs):
+            self.processes = processes
+            initializer(*initargs)
+
+        def imap_unordered(self, func, iterable, chunksize):
+            self.chunksize = chunksize
+            return map(func, iterable)
+
+        def close(self):
+            pass
+
+        def join(self):
+            pass
+
+    pools = []
+    monkeypatch.setattr(
+        cli.multiprocessing,
+        "Pool",
+        lambda *a, **kw: pools.append(FakePool(*a, **kw)) or pools[-1],
+    )
+    render = pretend.call_recorder(lambda app, d, n: n != "missing")
+    monkeypatch.setattr(cli, "render_project", render)
+
+    app.engine = pretend.stub(dispose=pretend.call_recorder(lambda: None))
+
+    results = list(cli.render_projects(
+        app, "/tmp/out", ["foo", "missing", "bar"],
+        processes=4,
+        batch_size=25,
+    ))
+
+    assert results == [("foo", True), ("missing", False), ("bar", True)]
+    assert app.engine.dispose.calls == [pretend.call()]
+    assert pools[0].processes == 4
+    assert pools[0].chunksize == 25
+    assert render.calls == [
+        pretend.call(app, "/tmp/out", "foo"),
+        pretend.call(app, "/tmp/out", "missing"),
+        pretend.call(app, "/tmp/out", "bar"),
+    ]
+
+
+def test_remove_project(tmpdir):
+    tmpdir.join("simple", "foo", "index.html").ensure()
+
+    cli.remove_project(str(tmpdir), "foo")
+    cli.remove_project(str(tmpdir), "missing")
+    cli.remove_project(str(tmpdir), "Missing_Too")
+
+    assert not tmpdir.join("simple", "foo").check()
+
+
+def test_remove_project_real_name(tmpdir):
+    # A page from an export that used the real name
+    tmpdir.join("simple", "Foo_Bar", "index.html").ensure()
+
+    cli.remove_project(str(tmpdir), "Foo_Bar")
+
+    assert os.listdir(str(tmpdir.join("simple"))) == []
+
+
+def _setup_sync(app, monkeypatch, existing, changed, serial=None):
+    index = pretend.call_recorder(lambda app, request: Response("index"))
+
+    def project(app, request, project_name):
+        if project_name not in existing:
+            raise NotFound
+        return Response(project_name)
+
+    monkeypatch.setattr(simple, "index", index)
+    monkeypatch.setattr(simple, "project", project)
+
+    app.models.packaging = pretend.stub(
+        all_projects=lambda: iter([Project(n) for n in sorted(existing)]),
+        get_last_serial=pretend.call_recorder(lambda: serial),
+        get_changed_projects=pretend.call_recorder(lambda since: changed),
+    )
+
+    return index
+
+
+@pytest.mark.parametrize("serial", [None, 10])
+def test_sync_simple_initial(serial, app, tmpdir, monkeypatch):
+    index = _setup_sync(app, monkeypatch, {"foo", "bar"}, {}, serial=serial)
+
+    synced = cli.sync_simple(app, str(tmpdir), processes=1)
+
+    assert synced == 2
+    assert len(index.calls) == 1
+    assert tmpdir.join("simple", "foo", "index.html").read() == "foo"
+    assert tmpdir.join("simple", "bar", "index.html").read() == "bar"
+    assert tmpdir.join(".last-serial").read() == "{}\n".format(serial or 0)
+    assert app.models.packaging.get_changed_projects.calls == []
+
+
+def test_sync_simple_no_changes(app, tmpdir, monkeypatch):
+    tmpdir.join(".last-serial").write("10\n")
+    index = _setup_sync(app, monkeypatch, {"foo"}, {})
+
+    assert cli.sync_simple(app, str(tmpdir), processes=1) == 0
+    assert index.calls == []
+    assert tmpdir.join(".last-serial").read() == "10\n"
+    assert app.models.packaging.get_changed_projects.calls == [
+        pretend.call(10),
+    ]
+
+
+@pytest.mark.parametrize(("existing", "changed", "updates_index"), [
+    # An existing project has a new release
+    ({"foo", "bar"}, {"foo": 15}, False),
+    # A new project has been created
+    ({"foo", "bar", "new"}, {"new": 12, "foo": 15}, True),
+    # A project has been removed
+    ({"bar"}, {"foo": 15}, True),
+    # A project was created and removed between syncs
+    ({"foo", "bar"}, {"gone": 15}, False),
+])
+def test_sync_simple_changes(existing, changed, updates_index, app, tmpdir,
+                             monkeypatch):
+    tmpdir.join(".last-serial").write("10\n")
+    tmpdir.join("simple", "index.html").write("old index", ensure=True)
+    for name in ["foo", "bar"]:
+        tmpdir.join("simple", name, "index.html").write("old", ensure=True)
+
+    index = _setup_sync(app, monkeypatch, existing, changed)
+
+    synced = cli.sync_simple(app, str(tmpdir), processes=1)
+
+    assert synced == len(changed)
+    assert tmpdir.join(".last-serial").read() == "15\n"
+    assert tmpdir.join("simple", "bar", "index.html").read() == "old"
+
+    for name in changed:
+        path = tmpdir.join("simple", name, "index.html")
+        if name in existing:
+            assert path.read() == name
+        else:
+            assert not tmpdir.join("simple", name).check()
+
+    if updates_index:
+        assert len(index.calls) == 1
+        assert tmpdir.join("simple", "index.html").read() == "index"
+    else:
+        assert index.calls == []
+        assert tmpdir.join("simple", "index.html").read() == "old index"
+
+
+def test_export_then_sync(app, tmpdir, monkeypatch):
+    index = pretend.call_recorder(lambda app, request: Response("index"))
+    project = pretend.call_recorder(
+        lambda app, request, project_name: Response(project_name),
+    )
+    monkeypatch.setattr(simple, "index", index)
+    monkeypatch.setattr(simple, "project", project)
+
+    app.models.packaging = pretend.stub(
+        all_projects=lambda: iter([Project("bar"), Project("foo")]),
+        get_last_serial=lambda: 10,
+        get_changed_projects=pretend.call_recorder(lambda since: {"foo": 11}),
+    )
+
+    cli.export_simple(app, str(tmpdir), processes=1)
+
+    assert len(project.calls) == 2
+    assert len(index.calls) == 1
+
+    # Only the projects which changed after the export are rendered again
+    assert cli.sync_simple(app, str(tmpdir), processes=1) == 1
+    assert app.models.packaging.get_changed_projects.calls == [
+        pretend.call(10),
+    ]
+    assert [c.kwargs for c in project.calls[2:]] == [{"project_name": "foo"}]
+    assert len(index.calls) == 1
+    assert tmpdir.join(".last-serial").read() == "11\n"
+
+
+@pytest.mark.parametrize(("command", "func", "output"), [
+    (cli.ExportSimpleCommand, "export_simple", "Exported"),
+    (cli.SyncSimpleCommand, "sync_simple", "Synced"),
+])
+def test_commands(command, func, output, monkeypatch, capsys):
+    impl = pretend.call_recorder(lambda *a, **kw: 5)
+    monkeypatch.setattr(cli, func, impl)
+
+    app = pretend.stub()
+    command()(app, "/tmp/out", processes=2, batch_size=10)
+
+    assert impl.calls == [
+        pretend.call(app, "/tmp/out", processes=2, batch_size=10),
+    ]
+
+    out, _ = capsys.readouterr()
+    assert out == "{} 5 projects to /tmp/out\n".format(output)
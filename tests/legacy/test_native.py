@@ -0,0 +1,147 @@
+# Copyright 2013 Donald Stufft
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from __future__ import absolute_import, division, print_function
+from __future__ import unicode_literals
+
+import pretend
+import pytest
+
+from werkzeug.test import create_environ
+
+from warehouse.http import Request
+from warehouse.legacy import native
+from warehouse.packaging.models import FileURL, Project, _project_path
+from warehouse.utils import render_response, stream_response
+
+
+PROJECT_NAMES = [
+    [],
+    ["foo"],
+    ["Foo_Bar", "foo.bar", "foo-bar", "Zope2"],
+    ["with space", "ünicode", "a/b", "a:b", "a?b", "a#b", "100%", "a;b"],
+    ["<script>", "a\"b", "a&b", "a'b"],
+    [".", "..", "a/../b", "./a", "a/.", ".hidden", "a..b"],
+]
+
+
+@pytest.fixture
+def request_for(app):
+    def make(path, script_name=""):
+        environ = create_environ(
+            path,
+            base_url="http://localhost{}/".format(script_name),
+        )
+        request = Request(environ)
+        request.url_adapter = app.urls.bind_to_environ(environ)
+        return request
+    return make
+
+
+def _assert_same(app, request, template, **variables):
+    expected = render_response(app, request, template, **variables)
+    resp = native.render_response(app, request, template, **variables)
+
+    assert resp.get_data() == expected.get_data()
+    assert resp.mimetype == expected.mimetype
+
+
+@pytest.mark.parametrize("paths", [False, True])
+@pytest.mark.parametrize("script_name", ["", "/pypi"])
+@pytest.mark.parametrize("names", PROJECT_NAMES)
+def test_index(names, script_name, paths, app, request_for):
+    request = request_for("/simple/", script_name=script_name)
+
+    variables = {"projects": [Project(n) for n in names]}
+    if paths:
+        # Leave one project out to check that missing paths are built
+        variables["project_paths"] = {n: _project_path(n) for n in names[1:]}
+
+    _assert_same(app, request, "legacy/simple/index.html", **variables)
+
+
+def test_index_streamed(app, request_for, monkeypatch):
+    monkeypatch.setattr(native, "STREAM_BUFFER_SIZE", 2)
+
+    request = request_for("/simple/")
+    projects = [Project("project{}".format(i)) for i in range(5)]
+
+    expected = stream_response(
+        app, request, "legacy/simple/index.html",
+        projects=projects,
+    )
+    resp = native.stream_response(
+        app, request, "legacy/simple/index.html",
+        projects=iter(projects),
+    )
+
+    chunks = list(resp.response)
+
+    # The header, three batches of projects, and the footer
+    assert len(chunks) == 5
+    assert "".join(chunks).encode("utf8") == expected.get_data()
+
+
+@pytest.mark.parametrize(("name", "files", "project_urls", "externals"), [
+    ("foo", [], [], []),
+    (
+        "Foo_Bar",
+        [
+            FileURL("Foo_Bar-1.0.tar.gz", "../../packages/source/F/Foo_Bar/"
+                                          "Foo_Bar-1.0.tar.gz#md5=abc"),
+            FileURL("Foo_Bar-2.0.tar.gz", "../../packages/source/F/Foo_Bar/"
+                                          "Foo_Bar-2.0.tar.gz#md5=def"),
+        ],
+        [
+            {
+                "rel": "homepage",
+                "url": "http://example.com/",
+                "name": "1.0 home_page",
+            },
+            {
+                "rel": "ext-download",
+                "url": "http://example.com/<download>?a=1&b=2",
+                "name": "1.0 download_url",
+            },
+        ],
+        ["http://example.com/foo-1.0.tar.gz"],
+    ),
+    ("ünicode & <friends>", [FileURL("ü.zip", "ü.zip")], [], []),
+])
+def test_detail(name, files, project_urls, externals, app, request_for):
+    request = request_for("/simple/{}/".format(name))
+
+    _assert_same(
+        app, request, "legacy/simple/detail.html",
+        project=Project(name),
+        files=files,
+        project_urls=project_urls,
+        externals=externals,
+    )
+
+
+def test_detail_external_urls(app, request_for):
+    request = request_for("/simple/foo/")
+
+    _assert_same(
+        app, request, "legacy/simple/detail.html",
+        project=Project("foo"),
+        files=[],
+        project_urls=[],
+        external_urls=["http://example.com/", "http://example.org/"],
+    )
+
+
+def test_unknown_template(app):
+    with pytest.raises(KeyError):
+        native.render_response(app, pretend.stub(), "legacy/foo.html")
@@ -14,24 +14,59 @@
 from __future__ import absolute_import, division, print_function
 from __future__ import unicode_literals
 
+import datetime
+import gzip
+import io
+import json
 import os.path
+import time
 
 import pretend
 import pytest
 
-from werkzeug.datastructures import Headers
-from werkzeug.exceptions import NotFound
+from werkzeug.datastructures import Headers, MultiDict
+from werkzeug.exceptions import BadRequest, NotFound
 from werkzeug.test import create_environ
 
-from warehouse.packaging.models import Project
-from warehouse.legacy import simple
+from warehouse import compression
+from warehouse.caching import LRUCache
+from warehouse.http import Request, Response
+from warehouse.packaging.models import (
+    FileMetadata, Project, ProjectFiles, ReleaseFile, SimplePage,
+)
+from warehouse.legacy import native, simple
 
 
-@pytest.mark.parametrize("fastly", [True, False])
-def test_index(fastly, monkeypatch):
+@pytest.mark.parametrize(("renderer", "stream", "expected"), [
+    ("jinja2", False, simple.render_response),
+    ("jinja2", True, simple.stream_response),
+    ("native", False, native.render_response),
+    ("native", True, native.stream_response),
+])
+def test_get_renderer(renderer, stream, expected):
+    app = pretend.stub(
+        config=pretend.stub(simple=pretend.stub(renderer=renderer)),
+    )
+
+    assert simple._get_renderer(app, stream=stream) is expected
+
+
+@pytest.mark.parametrize(("fastly", "stream"), [
+    (True, False),
+    (False, False),
+    (True, True),
+    (False, True),
+])
+def test_index(fastly, stream, monkeypatch):
     response = pretend.stub(headers=Headers())
     render = pretend.call_recorder(lambda *a, **k: response)
-    monkeypatch.setattr(simple, "render_response", render)
+    unused = pretend.call_recorder(lambda *a, **k: None)
+    monkeypatch.setattr(
+        simple, "stream_response" if stream else "render_response", render,
+    )
+    monkeypatch.setattr(
+        simple, "render_response" if stream else "stream_response", unused,
+    )
 
     all_projects = [Project("bar"), Project("foo")]
 
@@ -39,7 +74,14 @@ def test_index(fastly, monkeypatch):
         config=pretend.stub(
             fastly=fastly,
             cache=pretend.stub(browser=False, varnish=False),
+            simple=pretend.stub(
+                compression=False,
+                renderer="jinja2",
+                stream=stream,
+            ),
         ),
+        caches={},
+        template_version="abc",
         models=pretend.stub(
             packaging=pretend.stub(
                 all_projects=pretend.call_recorder(lambda: all_projects),
@@ -47,12 +89,13 @@ def test_index(fastly, monkeypatch):
             ),
         ),
     )
-    request = pretend.stub()
+    request = Request(create_environ())
 
     resp = simple.index(app, request)
 
     assert resp is response
     assert resp.headers["X-PyPI-Last-Serial"] == "9999"
+    assert resp.headers["ETag"] == '"9999-abc"'
 
     if fastly:
         assert resp.headers["Surrogate-Key"] == "simple-index"
@@ -66,6 +109,326 @@ def test_index(fastly, monkeypatch):
             projects=all_projects,
         ),
     ]
+    assert unused.calls == []
+
+
+def test_index_native(monkeypatch):
+    response = pretend.stub(headers=Headers())
+    render = pretend.call_recorder(lambda *a, **k: response)
+    monkeypatch.setattr(native, "render_response", render)
+
+    all_projects = [Project("bar"), Project("foo")]
+    project_paths = {"bar": "bar", "foo": "foo"}
+
+    app = pretend.stub(
+        config=pretend.stub(
+            fastly=False,
+            cache=pretend.stub(browser=False, varnish=False),
+            simple=pretend.stub(
+                compression=False,
+                renderer="native",
+                stream=False,
+            ),
+        ),
+        caches={},
+        template_version="abc",
+        models=pretend.stub(
+            packaging=pretend.stub(
+                all_projects=lambda: all_projects,
+                get_project_paths=lambda: project_paths,
+                get_last_serial=lambda: 9999,
+            ),
+        ),
+    )
+    request = Request(create_environ())
+
+    assert simple.index(app, request) is response
+    assert render.calls == [
+        pretend.call(
+            app, request,
+            "legacy/simple/index.html",
+            projects=all_projects,
+            project_paths=project_paths,
+        ),
+    ]
+
+
+def _index_app(pages=None, compression=False, stream=False, serial=10):
+    return pretend.stub(
+        config=pretend.stub(
+            fastly=False,
+            cache=pretend.stub(
+                browser=False,
+                varnish=False,
+                pages={"size": 10},
+            ),
+            simple=pretend.stub(
+                compression=compression,
+                renderer="jinja2",
+                stream=stream,
+            ),
+        ),
+        caches={"pages": pages} if pages is not None else {},
+        template_version="abc",
+        models=pretend.stub(
+            packaging=pretend.stub(
+                all_projects=lambda: [Project("foo")],
+                get_last_serial=pretend.call_recorder(lambda p=None: serial),
+            ),
+        ),
+    )
+
+
+def test_index_cached(monkeypatch):
+    render = pretend.call_recorder(lambda *a, **k: None)
+    monkeypatch.setattr(simple, "render_response", render)
+
+    pages = LRUCache(10)
+    pages.set(simple.INDEX_KEY, simple.CachedPage(
+        name=None,
+        serial=10,
+        checked=0,
+        data=b"cached index",
+        headers=[("X-PyPI-Last-Serial", "10")],
+        variants={},
+    ))
+    app = _index_app(pages=pages)
+
+    resp = simple.index(app, Request(create_environ()))
+
+    assert resp.get_data() == b"cached index"
+    assert resp.headers["X-PyPI-Last-Serial"] == "10"
+    assert render.calls == []
+    assert app.models.packaging.get_last_serial.calls == [pretend.call(None)]
+
+
+def test_index_stores_page(monkeypatch):
+    render = pretend.call_recorder(lambda *a, **k: Response("index"))
+    monkeypatch.setattr(simple, "render_response", render)
+    monkeypatch.setattr(time, "time", lambda: 1000)
+
+    # Even if we're configured to stream, we need the entire page to cache it
+    pages = LRUCache(10)
+    app = _index_app(pages=pages, stream=True)
+
+    resp = simple.index(app, Request(create_environ()))
+
+    assert resp.get_data() == b"index"
+    assert len(render.calls) == 1
+    assert pages.get(simple.INDEX_KEY) == simple.CachedPage(
+        name=None,
+        serial=10,
+        checked=1000,
+        data=b"index",
+        headers=list(resp.headers),
+        variants={},
+    )
+
+
+def test_index_compressed(monkeypatch):
+    render = pretend.call_recorder(lambda *a, **k: Response("index" * 100))
+    monkeypatch.setattr(simple, "render_response", render)
+    monkeypatch.setattr(simple, "stream_response", None)
+    compress = pretend.call_recorder(compression.compress)
+    monkeypatch.setattr(compression, "compress", compress)
+
+    pages = LRUCache(10)
+    app = _index_app(pages=pages, compression=["gzip"], stream=True)
+    request = Request(create_environ(headers={"Accept-Encoding": "gzip"}))
+
+    for _ in range(2):
+        resp = simple.index(app, request)
+
+        assert resp.headers["Content-Encoding"] == "gzip"
+        assert resp.headers["Vary"] == "Accept, Accept-Encoding"
+        assert resp.headers["Content-Length"] == str(len(resp.get_data()))
+        assert gzip.GzipFile(fileobj=io.BytesIO(resp.get_data())).read() == (
+            b"index" * 100
+        )
+
+    # The page was rendered and compressed once, and then reused
+    assert len(render.calls) == 1
+    assert len(compress.calls) == 1
+    assert pages.get(simple.INDEX_KEY).variants == {
+        "gzip": resp.get_data(),
+    }
+
+
+def test_index_compression_identity(monkeypatch):
+    render = pretend.call_recorder(lambda *a, **k: Response("index"))
+    monkeypatch.setattr(simple, "render_response", render)
+
+    pages = LRUCache(10)
+    app = _index_app(pages=pages, compression=["gzip"])
+    request = Request(create_environ(headers={"Accept-Encoding": "br"}))
+
+    resp = simple.index(app, request)
+
+    assert len(render.calls) == 1
+    assert resp.get_data() == b"index"
+    assert pages.get(simple.INDEX_KEY).variants == {}
+    assert "Content-Encoding" not in resp.headers
+    assert resp.headers["Vary"] == "Accept, Accept-Encoding"
+
+
+@pytest.mark.parametrize(("if_none_match", "encoding", "modified"), [
+    ('"10-abc"', None, False),
+    ('W/"10-abc"', None, False),
+    ('"9-abc", "10-abc"', None, False),
+    ("*", None, False),
+    ('"10-abc-gzip"', "gzip", False),
+    ('"10-abc"', "gzip", True),
+    ('"10-abc-gzip"', None, True),
+    ('"9-abc"', None, True),
+    ('"10-def"', None, True),
+])
+def test_index_not_modified(if_none_match, encoding, modified, monkeypatch):
+    render = pretend.call_recorder(lambda *a, **k: Response("index"))
+    monkeypatch.setattr(simple, "render_response", render)
+    monkeypatch.setattr(simple, "stream_response", render)
+
+    app = _index_app(compression=["gzip"])
+    headers = {"If-None-Match": if_none_match}
+    if encoding is not None:
+        headers["Accept-Encoding"] = encoding
+    request = Request(create_environ(headers=headers))
+
+    resp = simple.index(app, request)
+
+    if modified:
+        assert resp.status_code == 200
+        assert len(render.calls) == 1
+    else:
+        assert resp.status_code == 304
+        assert resp.get_data() == b""
+        assert resp.headers["ETag"] == (
+            '"10-abc-gzip"' if encoding else '"10-abc"'
+        )
+        assert resp.headers["X-PyPI-Last-Serial"] == "10"
+        assert resp.headers["Vary"] == "Accept, Accept-Encoding"
+        assert render.calls == []
+
+    assert app.models.packaging.get_last_serial.calls == [pretend.call()]
+
+
+def test_index_not_modified_cached(monkeypatch):
+    pages = LRUCache(10)
+    pages.set(simple.INDEX_KEY, simple.CachedPage(
+        name=None,
+        serial=10,
+        checked=0,
+        data=b"cached index",
+        headers=[("X-PyPI-Last-Serial", "10"), ("ETag", '"10-abc"')],
+        variants={},
+    ))
+    app = _index_app(pages=pages)
+    request = Request(create_environ(headers={"If-None-Match": '"10-abc"'}))
+
+    resp = simple.index(app, request)
+
+    assert resp.status_code == 304
+    assert resp.headers["ETag"] == '"10-abc"'
+    assert resp.headers["Vary"] == "Accept"
+
+    # The cached page is only trusted after we check its serial
+    assert app.models.packaging.get_last_serial.calls == [pretend.call(None)]
+
+
+@pytest.mark.parametrize(("accept", "expected"), [
+    (None, "html"),
+    ("text/html", "html"),
+    ("*/*", "html"),
+    ("application/json", "json"),
+    ("application/vnd.pypi.simple.v1+json", "json"),
+    ("application/vnd.pypi.simple.v1+html", "html"),
+    ("text/html;q=0.5, application/json", "json"),
+    ("text/html, application/json", "html"),
+    ("image/png", "html"),
+])
+def test_negotiate_format(accept, expected):
+    headers = {"Accept": accept} if accept is not None else {}
+    request = Request(create_environ(headers=headers))
+
+    assert simple._negotiate_format(request) == expected
+
+
+@pytest.mark.parametrize(("key", "fmt", "expected"), [
+    (simple.INDEX_KEY, "html", simple.INDEX_KEY),
+    (simple.INDEX_KEY, "json", "~json"),
+    ("foo-bar", "html", "foo-bar"),
+    ("foo-bar", "json", "foo-bar~json"),
+])
+def test_page_key(key, fmt, expected):
+    assert simple.page_key(key, fmt) == expected
+
+
+def test_index_json(monkeypatch):
+    render = pretend.call_recorder(lambda *a, **k: None)
+    monkeypatch.setattr(simple, "render_response", render)
+
+    pages = LRUCache(10)
+    app = _index_app(pages=pages)
+    request = Request(create_environ(headers={"Accept": "application/json"}))
+
+    resp = simple.index(app, request)
+
+    assert resp.mimetype == simple.JSON_MIMETYPE
+    assert resp.headers["ETag"] == '"10-json"'
+    assert resp.headers["Vary"] == "Accept"
+    assert json.loads(resp.get_data(as_text=True)) == {
+        "meta": {"api-version": "1.0"},
+        "projects": [{"name": "foo"}],
+    }
+    assert render.calls == []
+
+    # The JSON index is cached alongside the HTML one, not in place of it
+    assert simple.INDEX_KEY not in pages
+    assert pages.get("~json").data == resp.get_data()
+
+
+@pytest.mark.parametrize(("accept", "if_none_match", "modified"), [
+    ("application/json", '"10-json"', False),
+    ("application/json", '"10-abc"', True),
+    ("text/html", '"10-json"', True),
+])
+def test_index_json_not_modified(accept, if_none_match, modified,
+                                 monkeypatch):
+    monkeypatch.setattr(
+        simple, "render_response", lambda *a, **k: Response("index"),
+    )
+
+    request = Request(create_environ(headers={
+        "Accept": accept,
+        "If-None-Match": if_none_match,
+    }))
+
+    resp = simple.index(_index_app(), request)
+
+    if modified:
+        assert resp.status_code == 200
+    else:
+        assert resp.status_code == 304
+        assert resp.headers["Vary"] == "Accept"
+
+
+def test_page_response_etag():
+    app = pretend.stub(
+        config=pretend.stub(simple=pretend.stub(compression=["gzip"])),
+        caches={"pages": LRUCache(10)},
+    )
+    page = simple.CachedPage(
+        name="foo",
+        serial=10,
+        checked=0,
+        data=b"page",
+        headers=[("ETag", '"abcdef"')],
+        variants={},
+    )
+    request = Request(create_environ(headers={"Accept-Encoding": "gzip"}))
+
+    resp = simple._page_response(app, request, page, "foo")
+
+    assert resp.headers["ETag"] == '"abcdef-gzip"'
 
 
 @pytest.mark.parametrize(
@@ -110,31 +473,38 @@ def test_project(fastly, project_name, hosting_mode, release_urls,
     monkeypatch.setattr(simple, "url_for", url_for)
 
     project = Project(project_name)
+    data = SimplePage(
+        project=project,
+        hosting_mode=hosting_mode,
+        serial=9999,
+        files=[],
+        release_urls=release_urls,
+        external_urls=[],
+    )
 
     app = pretend.stub(
         config=pretend.stub(
             fastly=fastly,
             cache=pretend.stub(browser=False, varnish=False),
+            simple=pretend.stub(compression=False, renderer="jinja2"),
         ),
+        caches={},
+        template_version="abc",
         models=pretend.stub(
             packaging=pretend.stub(
-                get_project=pretend.call_recorder(lambda p: project),
-                get_file_urls=pretend.call_recorder(lambda p: []),
-                get_hosting_mode=pretend.call_recorder(
-                    lambda p: hosting_mode,
-                ),
-                get_external_urls=pretend.call_recorder(lambda p: []),
-                get_last_serial=pretend.call_recorder(lambda p: 9999),
-                get_release_urls=pretend.call_recorder(lambda p: release_urls),
+                use_project_index=False,
+                get_simple_page_data=pretend.call_recorder(lambda p: data),
             ),
         ),
     )
-    request = pretend.stub()
+    request = Request(create_environ())
 
     resp = simple.project(app, request, project_name=project_name)
 
     assert resp is response
     assert resp.headers["Link"] == "</foo/>; rel=canonical"
+    assert resp.headers["X-PyPI-Last-Serial"] == "9999"
+    assert resp.headers["ETag"] == '"9999-abc"'
 
     if fastly:
         surrogate = "simple simple~{}".format(project_name)
@@ -151,44 +521,464 @@ def test_project(fastly, project_name, hosting_mode, release_urls,
             externals=[],
         ),
     ]
-    assert app.models.packaging.get_project.calls == [
+    assert app.models.packaging.get_simple_page_data.calls == [
         pretend.call(project_name),
     ]
-    assert app.models.packaging.get_file_urls.calls == [
-        pretend.call(project_name),
+
+
+def test_project_not_found():
+    app = pretend.stub(
+        caches={},
+        template_version="abc",
+        models=pretend.stub(
+            packaging=pretend.stub(
+                use_project_index=False,
+                get_simple_page_data=pretend.call_recorder(lambda p: None),
+            ),
+        ),
+    )
+    request = Request(create_environ())
+
+    with pytest.raises(NotFound):
+        simple.project(app, request, project_name="foo")
+
+    assert app.models.packaging.get_simple_page_data.calls == [
+        pretend.call("foo"),
     ]
-    assert app.models.packaging.get_hosting_mode.calls == [
-        pretend.call(project_name),
+
+
+def test_project_index_not_found():
+    app = pretend.stub(
+        caches={},
+        template_version="abc",
+        models=pretend.stub(
+            packaging=pretend.stub(
+                use_project_index=True,
+                get_project=pretend.call_recorder(lambda p: None),
+                get_simple_page_data=pretend.call_recorder(lambda p: None),
+                get_project_serial=pretend.call_recorder(lambda p: None),
+            ),
+        ),
+    )
+    request = Request(create_environ(headers={"If-None-Match": '"1-abc"'}))
+
+    with pytest.raises(NotFound):
+        simple.project(app, request, project_name="foo")
+
+    # Nothing else is looked up for a project which doesn't exist
+    assert app.models.packaging.get_project.calls == [pretend.call("foo")]
+    assert app.models.packaging.get_project_serial.calls == []
+    assert app.models.packaging.get_simple_page_data.calls == []
+
+
+def test_project_index_resolves_name(monkeypatch):
+    response = Response("page")
+    monkeypatch.setattr(
+        simple, "render_response", lambda *a, **k: response,
+    )
+    monkeypatch.setattr(simple, "url_for", lambda *a, **k: "/Foo_Bar/")
+
+    data = SimplePage(
+        project=Project("Foo_Bar"),
+        hosting_mode="pypi-explicit",
+        serial=10,
+        files=[],
+        release_urls={},
+        external_urls=[],
+    )
+    app = pretend.stub(
+        config=pretend.stub(
+            fastly=False,
+            cache=pretend.stub(browser=False, varnish=False),
+            simple=pretend.stub(compression=False, renderer="jinja2"),
+        ),
+        caches={},
+        template_version="abc",
+        models=pretend.stub(
+            packaging=pretend.stub(
+                use_project_index=True,
+                get_project=pretend.call_recorder(
+                    lambda p: Project("Foo_Bar"),
+                ),
+                get_simple_page_data=pretend.call_recorder(lambda p: data),
+            ),
+        ),
+    )
+    request = Request(create_environ())
+
+    resp = simple.project(app, request, project_name="foo.bar")
+
+    assert resp is response
+    assert app.models.packaging.get_project.calls == [
+        pretend.call("foo.bar"),
     ]
-    assert app.models.packaging.get_external_urls.calls == [
-        pretend.call(project_name),
+    assert app.models.packaging.get_simple_page_data.calls == [
+        pretend.call("Foo_Bar"),
     ]
-    assert app.models.packaging.get_last_serial.calls == [
-        pretend.call(project_name),
+
+
+def test_project_caches_page(monkeypatch):
+    response = Response("page", headers=[("X-Test", "yes")])
+    render = pretend.call_recorder(lambda *a, **k: response)
+    url_for = lambda *a, **k: "/foo/"
+
+    monkeypatch.setattr(simple, "render_response", render)
+    monkeypatch.setattr(simple, "url_for", url_for)
+    monkeypatch.setattr(time, "time", lambda: 1000)
+
+    pages = LRUCache(10)
+    app = pretend.stub(
+        config=pretend.stub(
+            fastly=False,
+            cache=pretend.stub(browser=False, varnish=False),
+            simple=pretend.stub(compression=False, renderer="jinja2"),
+        ),
+        caches={"pages": pages},
+        template_version="abc",
+        models=pretend.stub(
+            packaging=pretend.stub(
+                use_project_index=False,
+                get_simple_page_data=lambda p: SimplePage(
+                    project=Project("Foo_Bar"),
+                    hosting_mode="pypi-explicit",
+                    serial=9999,
+                    files=[],
+                    release_urls={},
+                    external_urls=[],
+                ),
+            ),
+        ),
+    )
+    request = Request(create_environ())
+
+    resp = simple.project(app, request, project_name="foo_bar")
+
+    assert resp.get_data() == b"page"
+    assert resp.headers["X-Test"] == "yes"
+
+    page = pages.get("foo-bar")
+    assert page.name == "Foo_Bar"
+    assert page.serial == 9999
+    assert page.checked == 1000
+    assert page.data == b"page"
+    assert ("X-Test", "yes") in page.headers
+    assert ("X-PyPI-Last-Serial", "9999") in page.headers
+    assert page.variants == {}
+
+
+@pytest.mark.parametrize(("serial", "modified"), [
+    (9999, False),
+    (10000, True),
+    (None, True),
+])
+def test_project_not_modified(serial, modified, monkeypatch):
+    render = pretend.call_recorder(lambda *a, **k: Response("page"))
+    monkeypatch.setattr(simple, "render_response", render)
+    monkeypatch.setattr(simple, "url_for", lambda *a, **k: "/foo/")
+
+    app = pretend.stub(
+        config=pretend.stub(
+            fastly=False,
+            cache=pretend.stub(browser=False, varnish=False),
+            simple=pretend.stub(compression=False, renderer="jinja2"),
+        ),
+        caches={},
+        template_version="abc",
+        models=pretend.stub(
+            packaging=pretend.stub(
+                use_project_index=False,
+                get_project_serial=pretend.call_recorder(lambda p: serial),
+                get_simple_page_data=pretend.call_recorder(
+                    lambda p: SimplePage(
+                        project=Project("foo"),
+                        hosting_mode="pypi-explicit",
+                        serial=serial,
+                        files=[],
+                        release_urls={},
+                        external_urls=[],
+                    ),
+                ),
+            ),
+        ),
+    )
+    request = Request(create_environ(headers={"If-None-Match": '"9999-abc"'}))
+
+    resp = simple.project(app, request, project_name="foo")
+
+    assert app.models.packaging.get_project_serial.calls == [
+        pretend.call("foo"),
     ]
 
-    if hosting_mode == "pypi-explicit":
-        assert app.models.packaging.get_release_urls.calls == []
+    if modified:
+        assert resp.status_code == 200
+        assert len(render.calls) == 1
     else:
-        assert app.models.packaging.get_release_urls.calls == [
-            pretend.call(project_name),
-        ]
+        assert resp.status_code == 304
+        assert resp.headers["ETag"] == '"9999-abc"'
+        assert resp.headers["X-PyPI-Last-Serial"] == "9999"
+        assert resp.headers["Vary"] == "Accept"
+        assert render.calls == []
+        assert app.models.packaging.get_simple_page_data.calls == []
 
 
-def test_project_not_found():
+@pytest.mark.parametrize(("ttl", "checked", "serial", "hit", "lookups"), [
+    (None, 0, 10, True, 1),
+    (None, 0, 11, False, 1),
+    (60, 980, 11, True, 0),
+    (60, 900, 10, True, 1),
+    (60, 900, 11, False, 1),
+])
+def test_project_cached_page(ttl, checked, serial, hit, lookups, monkeypatch):
+    monkeypatch.setattr(time, "time", lambda: 1000)
+
+    pages = LRUCache(10)
+    pages.set(
+        "foo-bar",
+        simple.CachedPage(
+            name="Foo_Bar",
+            serial=10,
+            checked=checked,
+            data=b"cached page",
+            headers=[("X-PyPI-Last-Serial", "10")],
+            variants={},
+        ),
+    )
+
+    get_last_serial = pretend.call_recorder(lambda p: serial)
     app = pretend.stub(
+        config=pretend.stub(
+            fastly=False,
+            cache=pretend.stub(
+                browser=False,
+                varnish=False,
+                pages={"size": 10, "ttl": ttl},
+            ),
+            simple=pretend.stub(compression=False),
+        ),
+        caches={"pages": pages},
+        template_version="abc",
         models=pretend.stub(
             packaging=pretend.stub(
-                get_project=pretend.call_recorder(lambda p: None),
+                use_project_index=False,
+                get_simple_page_data=pretend.call_recorder(lambda p: None),
+                get_last_serial=get_last_serial,
             ),
         ),
     )
-    request = pretend.stub()
+    request = Request(create_environ())
+
+    if hit:
+        resp = simple.project(app, request, project_name="Foo_Bar")
+
+        assert resp.data == b"cached page"
+        assert resp.headers["X-PyPI-Last-Serial"] == "10"
+        assert app.models.packaging.get_simple_page_data.calls == []
+        assert pages.get("foo-bar").checked == (1000 if lookups else checked)
+    else:
+        with pytest.raises(NotFound):
+            simple.project(app, request, project_name="Foo_Bar")
+
+        assert app.models.packaging.get_simple_page_data.calls == [
+            pretend.call("Foo_Bar"),
+        ]
+        assert "foo-bar" not in pages
+
+    assert get_last_serial.calls == [pretend.call("Foo_Bar")] * lookups
+
+
+def _project_json_app(pages=None, fastly=False, batch=None):
+    return pretend.stub(
+        config=pretend.stub(
+            fastly=fastly,
+            cache=pretend.stub(browser=False, varnish=False),
+            simple=pretend.stub(compression=False, renderer="jinja2"),
+        ),
+        caches={"pages": pages} if pages is not None else {},
+        template_version="abc",
+        models=pretend.stub(
+            packaging=pretend.stub(
+                use_project_index=False,
+                get_simple_batch=pretend.call_recorder(
+                    lambda names: batch or {}
+                ),
+                get_simple_page_data=pretend.call_recorder(lambda p: None),
+            ),
+        ),
+    )
+
+
+@pytest.mark.parametrize("fastly", [True, False])
+def test_project_json(fastly, app):
+    batch = {
+        "foo-bar": ProjectFiles(
+            project=Project("Foo_Bar"),
+            serial=20,
+            files=[
+                ReleaseFile(
+                    filename="Foo_Bar-1.0.tar.gz",
+                    url="../../packages/source/F/Foo_Bar/Foo_Bar-1.0.tar.gz"
+                        "#md5=abc",
+                    md5_digest="abc",
+                ),
+            ],
+        ),
+    }
+    pages = LRUCache(10)
+    json_app = _project_json_app(pages=pages, fastly=fastly, batch=batch)
+
+    environ = create_environ(
+        "/simple/foo.bar/",
+        headers={"Accept": "application/vnd.pypi.simple.v1+json"},
+    )
+    request = Request(environ)
+    request.url_adapter = app.urls.bind_to_environ(environ)
+
+    resp = simple.project(json_app, request, project_name="foo.bar")
+
+    assert json_app.models.packaging.get_simple_batch.calls == [
+        pretend.call(["foo.bar"]),
+    ]
+    assert json_app.models.packaging.get_simple_page_data.calls == []
+    assert resp.mimetype == simple.JSON_MIMETYPE
+    assert resp.headers["X-PyPI-Last-Serial"] == "20"
+    assert resp.headers["ETag"] == '"20-json"'
+    assert resp.headers["Vary"] == "Accept"
+    assert resp.headers["Link"] == (
+        "<http://localhost/simple/Foo_Bar/>; rel=canonical"
+    )
+    assert json.loads(resp.get_data(as_text=True)) == {
+        "meta": {"api-version": "1.0"},
+        "name": "Foo_Bar",
+        "serial": 20,
+        "files": [
+            {
+                "filename": "Foo_Bar-1.0.tar.gz",
+                "url": "/packages/source/F/Foo_Bar/Foo_Bar-1.0.tar.gz"
+                       "#md5=abc",
+                "md5_digest": "abc",
+            },
+        ],
+    }
+
+    if fastly:
+        assert resp.headers["Surrogate-Key"] == "simple simple~foo-bar"
+    else:
+        assert "Surrogate-Key" not in resp.headers
+
+    # The JSON page is cached alongside the HTML one, not in place of it
+    assert "foo-bar" not in pages
+    assert pages.get("foo-bar~json").data == resp.get_data()
+
+
+def test_project_json_not_found():
+    request = Request(create_environ(headers={"Accept": "application/json"}))
 
     with pytest.raises(NotFound):
-        simple.project(app, request, project_name="foo")
+        simple.project(_project_json_app(), request, project_name="foo")
 
-    assert app.models.packaging.get_project.calls == [pretend.call("foo")]
+
+def _batch_app(fastly=False, batch=None):
+    return pretend.stub(
+        config=pretend.stub(
+            fastly=fastly,
+            cache=pretend.stub(browser=False, varnish=False),
+            simple=pretend.stub(batch_size=3),
+        ),
+        models=pretend.stub(
+            packaging=pretend.stub(
+                get_simple_batch=pretend.call_recorder(
+                    lambda names: batch or {}
+                ),
+            ),
+        ),
+    )
+
+
+@pytest.mark.parametrize("fastly", [True, False])
+@pytest.mark.parametrize("method", ["GET", "POST"])
+def test_batch(fastly, method, app):
+    batch = {
+        "foo-bar": ProjectFiles(
+            project=Project("Foo_Bar"),
+            serial=20,
+            files=[
+                ReleaseFile(
+                    filename="Foo_Bar-1.0.tar.gz",
+                    url="../../packages/source/F/Foo_Bar/Foo_Bar-1.0.tar.gz"
+                        "#md5=abc",
+                    md5_digest="abc",
+                ),
+            ],
+        ),
+        "bar": ProjectFiles(project=Project("bar"), serial=10, files=[]),
+    }
+    batch_app = _batch_app(fastly=fastly, batch=batch)
+
+    names = MultiDict(
+        [("name", "foo.bar"), ("name", "bar"), ("name", "missing")],
+    )
+    if method == "GET":
+        environ = create_environ("/batch/simple/", query_string=names)
+    else:
+        environ = create_environ("/batch/simple/", method="POST", data=names)
+    request = Request(environ)
+    request.url_adapter = app.urls.bind_to_environ(environ)
+
+    resp = simple.batch(batch_app, request)
+
+    assert batch_app.models.packaging.get_simple_batch.calls == [
+        pretend.call(["foo.bar", "bar", "missing"]),
+    ]
+    assert resp.mimetype == "application/json"
+    assert resp.headers["X-PyPI-Last-Serial"] == "20"
+    assert json.loads(resp.get_data(as_text=True)) == {
+        "projects": {
+            "foo.bar": {
+                "name": "Foo_Bar",
+                "serial": 20,
+                "files": [
+                    {
+                        "filename": "Foo_Bar-1.0.tar.gz",
+                        "url": "/packages/source/F/Foo_Bar/Foo_Bar-1.0.tar.gz"
+                               "#md5=abc",
+                        "md5_digest": "abc",
+                    },
+                ],
+            },
+            "bar": {"name": "bar", "serial": 10, "files": []},
+        },
+        "missing": ["missing"],
+    }
+
+    if fastly:
+        assert resp.headers["Surrogate-Key"] == (
+            "simple simple~bar simple~foo-bar"
+        )
+    else:
+        assert "Surrogate-Key" not in resp.headers
+
+
+def test_batch_all_missing():
+    request = Request(create_environ("/batch/simple/?name=foo"))
+
+    resp = simple.batch(_batch_app(), request)
+
+    assert json.loads(resp.get_data(as_text=True)) == {
+        "projects": {},
+        "missing": ["foo"],
+    }
+    assert "X-PyPI-Last-Serial" not in resp.headers
+
+
+@pytest.mark.parametrize("query", ["", "?name=a&name=b&name=c&name=d"])
+def test_batch_bad_request(query):
+    app = _batch_app()
+    request = Request(create_environ("/batch/simple/" + query))
+
+    with pytest.raises(BadRequest):
+        simple.batch(app, request)
+
+    assert app.models.packaging.get_simple_batch.calls == []
 
 
 @pytest.mark.parametrize(("fastly", "serial"), [
@@ -204,34 +994,33 @@ def test_package(fastly, serial, monkeypatch):
     _fp = pretend.stub(__enter__=lambda: None, __exit__=lambda *a: None)
     _open = pretend.call_recorder(lambda *a, **k: _fp)
     wrap_file = lambda *a, **k: None
-    mtime = pretend.call_recorder(lambda f: 123457)
-    getsize = pretend.call_recorder(lambda f: 54321)
+    stat = pretend.call_recorder(
+        lambda f: pretend.stub(st_size=54321, st_mtime=123457)
+    )
 
     monkeypatch.setattr(simple, "safe_join", safe_join)
     monkeypatch.setattr(simple, "open", _open, raising=False)
     monkeypatch.setattr(simple, "wrap_file", wrap_file)
-    monkeypatch.setattr(os.path, "getmtime", mtime)
-    monkeypatch.setattr(os.path, "getsize", getsize)
+    monkeypatch.setattr(simple, "os", pretend.stub(path=os.path, stat=stat))
 
-    gpff = pretend.call_recorder(lambda p: Project("test"))
-    get_md5 = pretend.call_recorder(
-        lambda p: "d41d8cd98f00b204e9800998ecf8427f"
+    get_file_metadata = pretend.call_recorder(
+        lambda f: FileMetadata(
+            project=Project("test"),
+            md5_digest="d41d8cd98f00b204e9800998ecf8427f",
+            serial=serial,
+        )
     )
-    get_last_serial = pretend.call_recorder(lambda p: serial)
 
     app = pretend.stub(
         config=pretend.stub(
             fastly=fastly,
             cache=pretend.stub(browser=False, varnish=False),
-            paths=pretend.stub(packages="/tmp"),
+            paths=pretend.stub(packages="/tmp", packages_delivery="python"),
         ),
         models=pretend.stub(
-            packaging=pretend.stub(
-                get_project_for_filename=gpff,
-                get_filename_md5=get_md5,
-                get_last_serial=get_last_serial,
-            ),
+            packaging=pretend.stub(get_file_metadata=get_file_metadata),
         ),
+        caches={},
     )
     request = pretend.stub(environ=create_environ())
 
@@ -248,6 +1037,8 @@ def test_package(fastly, serial, monkeypatch):
         assert "Surrogate-Key" not in resp.headers
 
     assert resp.headers["Content-Length"] == "54321"
+    assert resp.headers["ETag"] == '"d41d8cd98f00b204e9800998ecf8427f"'
+    assert resp.last_modified == datetime.datetime(1970, 1, 2, 10, 17, 37)
 
     assert safe_join.calls == [
         pretend.call("/tmp", "packages/any/t/test-1.0.tar.gz"),
@@ -255,13 +1046,187 @@ def test_package(fastly, serial, monkeypatch):
     assert _open.calls == [
         pretend.call("/tmp/packages/any/t/test-1.0.tar.gz", "rb"),
     ]
-    assert mtime.calls == [pretend.call("/tmp/packages/any/t/test-1.0.tar.gz")]
-    assert getsize.calls == [
-        pretend.call("/tmp/packages/any/t/test-1.0.tar.gz"),
-    ]
-    assert gpff.calls == [pretend.call("test-1.0.tar.gz")]
-    assert get_md5.calls == [pretend.call("test-1.0.tar.gz")]
-    assert get_last_serial.calls == [pretend.call("test")]
+    assert stat.calls == [pretend.call("/tmp/packages/any/t/test-1.0.tar.gz")]
+    assert get_file_metadata.calls == [pretend.call("test-1.0.tar.gz")]
+
+
+@pytest.mark.parametrize(("ttl", "age", "lookups"), [
+    (None, 0, 1),
+    (60, 30, 0),
+    (60, 90, 1),
+])
+def test_package_cached(ttl, age, lookups, monkeypatch):
+    monkeypatch.setattr(
+        simple, "safe_join",
+        lambda *a, **k: "/tmp/packages/any/t/test-1.0.tar.gz",
+    )
+    monkeypatch.setattr(simple, "open", lambda *a, **k: None, raising=False)
+    monkeypatch.setattr(simple, "wrap_file", lambda *a, **k: None)
+    monkeypatch.setattr(simple.time, "time", lambda: 1000)
+
+    get_last_serial = pretend.call_recorder(lambda p: 1000)
+
+    files = LRUCache(10)
+    files.set("test-1.0.tar.gz", simple.CachedFile(
+        project=Project("test"),
+        md5_digest="d41d8cd98f00b204e9800998ecf8427f",
+        serial=999,
+        size=54321,
+        mtime=123457,
+        checked=1000 - age,
+    ))
+    files.set(simple.file_project_key("test"), 999)
+
+    app = pretend.stub(
+        config=pretend.stub(
+            fastly=False,
+            cache=pretend.stub(
+                browser=False,
+                varnish=False,
+                files={"size": 10, "ttl": ttl},
+            ),
+            paths=pretend.stub(packages="/tmp", packages_delivery="python"),
+        ),
+        models=pretend.stub(
+            packaging=pretend.stub(get_last_serial=get_last_serial),
+        ),
+        caches={"files": files},
+    )
+    request = pretend.stub(environ=create_environ())
+
+    resp = simple.package(app, request, path="packages/any/t/test-1.0.tar.gz")
+
+    assert resp.headers["Content-Length"] == "54321"
+    assert resp.headers["ETag"] == '"d41d8cd98f00b204e9800998ecf8427f"'
+    assert resp.headers["X-PyPI-Last-Serial"] == ("1000" if lookups else "999")
+    assert get_last_serial.calls == [pretend.call("test")] * lookups
+    checked = 1000 if lookups else 1000 - age
+    assert files.get("test-1.0.tar.gz").checked == checked
+
+
+def test_package_caches_metadata(monkeypatch):
+    monkeypatch.setattr(
+        simple, "safe_join",
+        lambda *a, **k: "/tmp/packages/any/t/test-1.0.tar.gz",
+    )
+    monkeypatch.setattr(simple, "open", lambda *a, **k: None, raising=False)
+    monkeypatch.setattr(simple, "wrap_file", lambda *a, **k: None)
+    stat = lambda f: pretend.stub(st_size=54321, st_mtime=123457)
+    monkeypatch.setattr(simple, "os", pretend.stub(path=os.path, stat=stat))
+    monkeypatch.setattr(simple.time, "time", lambda: 1000)
+
+    files = LRUCache(10)
+    app = pretend.stub(
+        config=pretend.stub(
+            fastly=False,
+            cache=pretend.stub(browser=False, varnish=False),
+            paths=pretend.stub(packages="/tmp", packages_delivery="python"),
+        ),
+        models=pretend.stub(
+            packaging=pretend.stub(
+                get_file_metadata=lambda f: FileMetadata(
+                    project=Project("test"),
+                    md5_digest="d41d8cd98f00b204e9800998ecf8427f",
+                    serial=999,
+                ),
+            ),
+        ),
+        caches={"files": files},
+    )
+    request = pretend.stub(environ=create_environ())
+
+    simple.package(app, request, path="packages/any/t/test-1.0.tar.gz")
+
+    assert files.get("test-1.0.tar.gz") == simple.CachedFile(
+        project=Project("test"),
+        md5_digest="d41d8cd98f00b204e9800998ecf8427f",
+        serial=999,
+        size=54321,
+        mtime=123457,
+        checked=1000,
+    )
+    assert files.get(simple.file_project_key("test")) == 999
+
+
+@pytest.mark.parametrize("project_serial", [None, 998])
+def test_package_cached_project_evicted(project_serial, monkeypatch):
+    monkeypatch.setattr(
+        simple, "safe_join",
+        lambda *a, **k: "/tmp/packages/any/t/test-1.0.tar.gz",
+    )
+    monkeypatch.setattr(simple, "open", lambda *a, **k: None, raising=False)
+    monkeypatch.setattr(simple, "wrap_file", lambda *a, **k: None)
+    stat = lambda f: pretend.stub(st_size=54321, st_mtime=123457)
+    monkeypatch.setattr(simple, "os", pretend.stub(path=os.path, stat=stat))
+    monkeypatch.setattr(simple.time, "time", lambda: 1000)
+
+    get_file_metadata = pretend.call_recorder(
+        lambda f: FileMetadata(
+            project=Project("test"),
+            md5_digest="d41d8cd98f00b204e9800998ecf8427f",
+            serial=1000,
+        )
+    )
+
+    files = LRUCache(10)
+    files.set("test-1.0.tar.gz", simple.CachedFile(
+        project=Project("test"),
+        md5_digest="d41d8cd98f00b204e9800998ecf8427f",
+        serial=999,
+        size=54321,
+        mtime=123457,
+        checked=1000,
+    ))
+    if project_serial is not None:
+        files.set(simple.file_project_key("test"), project_serial)
+
+    app = pretend.stub(
+        config=pretend.stub(
+            fastly=False,
+            cache=pretend.stub(
+                browser=False,
+                varnish=False,
+                files={"size": 10, "ttl": 60},
+            ),
+            paths=pretend.stub(packages="/tmp", packages_delivery="python"),
+        ),
+        models=pretend.stub(
+            packaging=pretend.stub(get_file_metadata=get_file_metadata),
+        ),
+        caches={"files": files},
+    )
+    request = pretend.stub(environ=create_environ())
+
+    resp = simple.package(app, request, path="packages/any/t/test-1.0.tar.gz")
+
+    # The project has changed since the file was cached, so it's looked up
+    #   again even though it was checked recently.
+    assert resp.headers["X-PyPI-Last-Serial"] == "1000"
+    assert get_file_metadata.calls == [pretend.call("test-1.0.tar.gz")]
+    assert files.get(simple.file_project_key("test")) == 1000
+
+
+def test_package_not_in_database(monkeypatch):
+    monkeypatch.setattr(
+        simple, "safe_join",
+        lambda *a, **k: "/tmp/packages/any/t/test-1.0.tar.gz",
+    )
+    monkeypatch.setattr(simple, "open", lambda *a, **k: None, raising=False)
+    monkeypatch.setattr(simple, "wrap_file", lambda *a, **k: None)
+
+    app = pretend.stub(
+        config=pretend.stub(
+            paths=pretend.stub(packages="/tmp", packages_delivery="python"),
+        ),
+        models=pretend.stub(
+            packaging=pretend.stub(get_file_metadata=lambda f: None),
+        ),
+        caches={},
+    )
+    request = pretend.stub(environ=create_environ())
+
+    with pytest.raises(NotFound):
+        simple.package(app, request, path="packages/any/t/test-1.0.tar.gz")
 
 
 def test_package_not_found_unsafe(monkeypatch):
@@ -270,7 +1235,7 @@ def test_package_not_found_unsafe(monkeypatch):
 
     app = pretend.stub(
         config=pretend.stub(
-            paths=pretend.stub(packages="/tmp"),
+            paths=pretend.stub(packages="/tmp", packages_delivery="python"),
         ),
     )
     request = pretend.stub()
@@ -298,7 +1263,7 @@ def test_package_not_found_unsafe_missing(monkeypatch):
 
     app = pretend.stub(
         config=pretend.stub(
-            paths=pretend.stub(packages="/tmp"),
+            paths=pretend.stub(packages="/tmp", packages_delivery="python"),
         ),
     )
     request = pretend.stub()
@@ -312,3 +1277,134 @@ def test_package_not_found_unsafe_missing(monkeypatch):
     assert _open.calls == [
         pretend.call("/tmp/packages/any/t/test-1.0.tar.gz", "rb"),
     ]
+
+
+@pytest.mark.parametrize(("delivery", "header", "value"), [
+    (
+        "x-accel-redirect",
+        "X-Accel-Redirect",
+        "/_packages/packages/any/t/test%201.0.tar.gz",
+    ),
+    (
+        "x-sendfile",
+        "X-Sendfile",
+        "/tmp/packages/any/t/test 1.0.tar.gz",
+    ),
+])
+def test_package_offload(delivery, header, value, monkeypatch):
+    safe_join = lambda *a, **k: "/tmp/packages/any/t/test 1.0.tar.gz"
+    _open = pretend.call_recorder(lambda *a, **k: None)
+    stat = pretend.call_recorder(
+        lambda f: pretend.stub(st_size=54321, st_mtime=123457)
+    )
+
+    monkeypatch.setattr(simple, "safe_join", safe_join)
+    monkeypatch.setattr(simple, "open", _open, raising=False)
+    monkeypatch.setattr(simple, "os", pretend.stub(path=os.path, stat=stat))
+
+    app = pretend.stub(
+        config=pretend.stub(
+            fastly=False,
+            cache=pretend.stub(browser=False, varnish=False),
+            paths=pretend.stub(
+                packages="/tmp",
+                packages_delivery=delivery,
+                packages_internal="/_packages/",
+            ),
+        ),
+        models=pretend.stub(
+            packaging=pretend.stub(
+                get_file_metadata=lambda f: FileMetadata(
+                    project=Project("test"),
+                    md5_digest="d41d8cd98f00b204e9800998ecf8427f",
+                    serial=999,
+                ),
+            ),
+        ),
+        caches={},
+    )
+    request = pretend.stub(environ=create_environ())
+
+    resp = simple.package(app, request, path="packages/any/t/test 1.0.tar.gz")
+
+    assert resp.headers[header] == value
+    assert resp.headers["ETag"] == '"d41d8cd98f00b204e9800998ecf8427f"'
+    assert resp.get_data() == b""
+    assert stat.calls == [
+        pretend.call("/tmp/packages/any/t/test 1.0.tar.gz"),
+    ]
+    assert _open.calls == []
+
+
+def test_package_offload_missing(monkeypatch):
+    monkeypatch.setattr(
+        simple, "safe_join",
+        lambda *a, **k: "/tmp/packages/any/t/test-1.0.tar.gz",
+    )
+
+    def raising_stat(path):
+        raise OSError
+
+    monkeypatch.setattr(
+        simple, "os", pretend.stub(path=os.path, stat=raising_stat),
+    )
+
+    app = pretend.stub(
+        config=pretend.stub(
+            paths=pretend.stub(
+                packages="/tmp",
+                packages_delivery="x-sendfile",
+            ),
+        ),
+        models=pretend.stub(
+            packaging=pretend.stub(
+                get_file_metadata=lambda f: FileMetadata(
+                    project=Project("test"),
+                    md5_digest="d41d8cd98f00b204e9800998ecf8427f",
+                    serial=999,
+                ),
+            ),
+        ),
+        caches={},
+    )
+    request = pretend.stub()
+
+    with pytest.raises(NotFound):
+        simple.package(app, request, path="packages/any/t/test-1.0.tar.gz")
+
+
+def test_package_range(tmpdir):
+    tmpdir.join("packages", "any", "t", "test-1.0.tar.gz").write_binary(
+        b"0123456789",
+        ensure=True,
+    )
+
+    app = pretend.stub(
+        config=pretend.stub(
+            fastly=False,
+            cache=pretend.stub(browser=False, varnish=False),
+            paths=pretend.stub(
+                packages=str(tmpdir),
+                packages_delivery="python",
+            ),
+        ),
+        models=pretend.stub(
+            packaging=pretend.stub(
+                get_file_metadata=lambda f: FileMetadata(
+                    project=Project("test"),
+                    md5_digest="d41d8cd98f00b204e9800998ecf8427f",
+                    serial=999,
+                ),
+            ),
+        ),
+        caches={},
+    )
+    request = Request(create_environ(headers={"Range": "bytes=2-5"}))
+
+    resp = simple.package(app, request, path="packages/any/t/test-1.0.tar.gz")
+
+    assert resp.status_code == 206
+    assert resp.headers["Content-Range"] == "bytes 2-5/10"
+    assert resp.headers["Content-Length"] == "4"
+    assert b"".join(resp.response) == b"2345"
+    assert "Content-MD5" not in resp.headers
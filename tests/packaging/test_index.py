@@ -0,0 +1,137 @@
+# Copyright 2013 Donald Stufft
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from __future__ import absolute_import, division, print_function
+from __future__ import unicode_literals
+
+import pytest
+
+from warehouse.packaging.index import ProjectIndex, index_sort_key
+from warehouse.packaging.normalization import normalize
+
+
+NAMES = ["Zope2", "foo_bar", "Foo", "bar", "ünicode", "a.b", "A-C"]
+
+
+def test_iteration_order():
+    index = ProjectIndex(NAMES, serial=10)
+
+    assert len(index) == len(NAMES)
+    assert list(index) == sorted(NAMES, key=lambda n: (n.lower(), n))
+    assert list(index) == sorted(NAMES, key=index_sort_key)
+    assert index.serial == 10
+
+
+def test_empty():
+    index = ProjectIndex()
+
+    assert len(index) == 0
+    assert list(index) == []
+    assert index.get("foo") is None
+    assert list(index.iter_prefix("f")) == []
+    assert index.serial is None
+
+
+@pytest.mark.parametrize(("lookup", "expected"), [
+    ("zope2", "Zope2"),
+    ("Foo.Bar", "foo_bar"),
+    ("foo-bar", "foo_bar"),
+    ("FOO", "Foo"),
+    ("a_b", "a.b"),
+    ("a.c", "A-C"),
+    ("ünicode", "ünicode"),
+    ("fo", None),
+    ("foo-bar-baz", None),
+    ("aaa", None),
+    ("zzz", None),
+])
+def test_get(lookup, expected):
+    index = ProjectIndex(NAMES)
+
+    assert index.get(lookup) == expected
+    assert (lookup in index) == (expected is not None)
+
+
+@pytest.mark.parametrize(("prefix", "expected"), [
+    ("foo", ["Foo", "foo_bar"]),
+    ("Foo_", ["foo_bar"]),
+    ("a", ["a.b", "A-C"]),
+    ("a-", ["a.b", "A-C"]),
+    ("z", ["Zope2"]),
+    ("", sorted(NAMES, key=lambda n: n.lower())),
+    ("x", []),
+])
+def test_iter_prefix(prefix, expected):
+    index = ProjectIndex(NAMES)
+
+    assert sorted(index.iter_prefix(prefix), key=lambda n: n.lower()) == (
+        sorted(expected, key=lambda n: n.lower())
+    )
+
+
+def test_iter_prefix_order():
+    index = ProjectIndex(["foo-b", "Foo_A", "foo.c", "fop"])
+
+    # Names come back in the order of their normalized names
+    assert list(index.iter_prefix("foo")) == ["Foo_A", "foo-b", "foo.c"]
+
+
+def test_updated():
+    index = ProjectIndex(["foo", "bar", "baz"], serial=5)
+
+    updated = index.updated(
+        removed=["bar", "baz", "missing"],
+        added=["baz", "new"],
+        serial=8,
+    )
+
+    assert list(updated) == ["baz", "foo", "new"]
+    assert updated.get("new") == "new"
+    assert updated.get("bar") is None
+    assert updated.serial == 8
+
+    # The original index is left as it was
+    assert list(index) == ["bar", "baz", "foo"]
+    assert index.serial == 5
+
+
+@pytest.mark.parametrize(("removed", "added"), [
+    ([], []),
+    (["Zope2"], []),
+    ([], ["aaa", "zzz", "Foo-Bar-Baz"]),
+    (["bar", "ünicode", "missing"], ["bar", "Ünicode2", "a.b"]),
+    # A name which another project's name normalizes to takes its place
+    ([], ["FOO", "a_c"]),
+    (NAMES, ["new"]),
+    (NAMES, []),
+])
+def test_updated_merges(removed, added):
+    index = ProjectIndex(NAMES, serial=1)
+    updated = index.updated(removed=removed, added=added, serial=2)
+
+    names = {
+        normalize(name): name for name in NAMES if name not in removed
+    }
+    names.update((normalize(name), name) for name in added)
+    expected = ProjectIndex(names.values(), serial=2)
+
+    # The merged index is exactly what building it again would have given
+    assert list(updated) == list(expected)
+    assert updated._names == expected._names
+    assert updated._name_offsets == expected._name_offsets
+    assert updated._normalized == expected._normalized
+    assert updated._normalized_offsets == expected._normalized_offsets
+    assert updated._order == expected._order
+
+    for name in names.values():
+        assert updated.get(name) == name
@@ -14,19 +14,35 @@
 from __future__ import absolute_import, division, print_function
 from __future__ import unicode_literals
 
+import datetime
+import os
+import time
+
 import pytest
 
-from warehouse.packaging.models import Project, FileURL
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.sql import select
+
+from warehouse.packaging.models import (
+    ChangelogEntry, Project, ProjectFiles, FileMetadata, FileURL,
+    ReleaseFile, _project_path,
+)
+from warehouse.packaging import snapshot
+from warehouse.packaging.normalization import normalize
 from warehouse.packaging.tables import (
     packages, releases, release_files, description_urls, journals,
+    package_serials,
 )
 
 
+@pytest.mark.parametrize("project_index", [False, True])
 @pytest.mark.parametrize("projects", [
     ["foo", "bar", "zap"],
     ["fail", "win", "YeS"],
 ])
-def test_all_projects(projects, dbapp):
+def test_all_projects(projects, project_index, dbapp):
+    dbapp.config.cache["projects"] = project_index
+
     # Insert some data into the database
     for project in projects:
         dbapp.engine.execute(packages.insert().values(name=project))
@@ -34,154 +50,525 @@ def test_all_projects(projects, dbapp):
     all_projects = [
         Project(p) for p in sorted(projects, key=lambda x: x.lower())
     ]
-    assert dbapp.models.packaging.all_projects() == all_projects
+    assert list(dbapp.models.packaging.all_projects()) == all_projects
 
 
-@pytest.mark.parametrize(("name", "normalized"), [
+@pytest.mark.parametrize("project_index", [False, True])
+@pytest.mark.parametrize(("name", "lookup"), [
     ("foo_bar", "foo-bar"),
     ("Bar", "bar"),
+    ("Foo.Bar", "foo_bar"),
+    ("Zope2", "ZOPE2"),
+    ("a-_.b", "A.b"),
 ])
-def test_get_project(name, normalized, dbapp):
+def test_get_project(name, lookup, project_index, dbapp):
+    dbapp.config.cache["projects"] = project_index
+
     # prepare database
+    dbapp.engine.execute(packages.insert().values(name=name))
+
+    assert dbapp.models.packaging.get_project(lookup) == Project(name)
+
+
+@pytest.mark.parametrize("name", [
+    "foo", "Foo_Bar", "foo.bar", "a-_.b", "A__B", "Zope2", "a.-b-_c",
+])
+def test_normalized_name_trigger(name, dbapp):
+    # The normalized name is maintained by the database, overriding anything
+    #   that is written to it.
     dbapp.engine.execute(
-        packages.insert().values(name=name, normalized_name=normalized)
+        packages.insert().values(name=name, normalized_name="wrong")
     )
 
-    assert dbapp.models.packaging.get_project(normalized) == Project(name)
+    assert dbapp.engine.execute(
+        select([packages.c.normalized_name])
+    ).scalar() == normalize(name)
 
 
-def test_get_project_missing(dbapp):
+def test_normalized_name_unique(dbapp):
+    dbapp.engine.execute(packages.insert().values(name="Foo_Bar"))
+
+    with pytest.raises(IntegrityError):
+        dbapp.engine.execute(packages.insert().values(name="foo.bar"))
+
+
+@pytest.mark.parametrize("project_index", [False, True])
+def test_get_project_missing(project_index, dbapp):
+    dbapp.config.cache["projects"] = project_index
+
     assert dbapp.models.packaging.get_project("missing") is None
 
 
-@pytest.mark.parametrize(("name", "mode"), [
-    ("foo", "pypi-explicit"),
-    ("bar", "pypi-scrape"),
-    ("wat", "pypi-scrape-crawl"),
-])
-def test_get_hosting_mode(name, mode, dbapp):
-    # prepare database
-    dbapp.engine.execute(
-        packages.insert().values(name=name, hosting_mode=mode)
-    )
+def test_all_projects_snapshot(dbapp, tmpdir):
+    path = str(tmpdir.join("simple.snapshot"))
+    dbapp.config.paths["snapshot"] = path
+    dbapp.config.cache["projects"] = True
 
-    assert dbapp.models.packaging.get_hosting_mode(name) == mode
+    for name in ["bar", "Foo_Bar", "new", "Zope2"]:
+        dbapp.engine.execute(packages.insert().values(name=name))
+    for id_, name in [(1, "bar"), (3, "gone"), (4, "new"), (5, "Zope2")]:
+        dbapp.engine.execute(journals.insert().values(id=id_, name=name))
 
+    snapshot.write(path, 2, [
+        ProjectFiles(Project(name), 1, [])
+        for name in ["bar", "Foo_Bar", "gone", "Zope2"]
+    ])
 
-@pytest.mark.parametrize(("name", "attrs"), [
-    ("foo", [
-        {"version": "1.0", "home_page": "https://example.com/v1/home/"},
-        {"version": "2.0", "download_url": "https://example.com/v2/download"},
-        {
-            "version": "3.0",
-            "home_page": "https://example.com/v3/home/",
-            "download_url": "https://example.com/v3/download",
-        },
-    ]),
-])
-def test_get_release_urls(name, attrs, dbapp):
-    # prepare database
-    dbapp.engine.execute(packages.insert().values(name=name))
-    for data in attrs:
+    # Projects which have been added or removed since the snapshot was built
+    #   are merged into the ones that were already in it.
+    assert list(dbapp.models.packaging.all_projects()) == [
+        Project("bar"), Project("Foo_Bar"), Project("new"), Project("Zope2"),
+    ]
+    assert dbapp.models.packaging._index is None
+
+
+def test_get_project_snapshot(dbapp, tmpdir):
+    path = str(tmpdir.join("simple.snapshot"))
+    dbapp.config.paths["snapshot"] = path
+
+    dbapp.engine.execute(packages.insert().values(name="new"))
+
+    snapshot.write(path, 1, [ProjectFiles(Project("Foo_Bar"), 1, [])])
+
+    model = dbapp.models.packaging
+
+    assert model.get_project("foo.bar") == Project("Foo_Bar")
+
+    # Projects which aren't in the snapshot may have been created since
+    assert model.get_project("New") == Project("new")
+    assert model.get_project("missing") is None
+
+
+@pytest.mark.parametrize("package_serials", [False, True])
+def test_get_simple_batch(package_serials, dbapp):
+    dbapp.config.database["package_serials"] = package_serials
+
+    for name in ["Foo_Bar", "bar", "other"]:
+        dbapp.engine.execute(packages.insert().values(name=name))
+        dbapp.engine.execute(
+            releases.insert().values(name=name, version="1.0")
+        )
+    for name, filename, md5_digest in [
+            ("Foo_Bar", "Foo_Bar-1.0.tar.gz", "0" * 32),
+            ("Foo_Bar", "Foo_Bar-1.0.zip", "1" * 32),
+            ("other", "other-1.0.tar.gz", "2" * 32)]:
         dbapp.engine.execute(
-            releases.insert().values(name=name, **data)
+            release_files.insert().values(
+                name=name,
+                version="1.0",
+                filename=filename,
+                python_version="source",
+                md5_digest=md5_digest,
+            )
         )
+    for id_, name in [(1, "Foo_Bar"), (2, "bar"), (3, "Foo_Bar")]:
+        dbapp.engine.execute(journals.insert().values(id=id_, name=name))
 
-    assert dbapp.models.packaging.get_release_urls(name) == {
-        a["version"]: (a.get("home_page"), a.get("download_url"))
-        for a in attrs
+    batch = dbapp.models.packaging.get_simple_batch(
+        ["foo.bar", "FOO-BAR", "bar", "missing"],
+    )
+
+    assert batch == {
+        "foo-bar": ProjectFiles(
+            project=Project("Foo_Bar"),
+            serial=3,
+            files=[
+                ReleaseFile(
+                    filename=filename,
+                    url="../../packages/source/F/Foo_Bar/{}#md5={}".format(
+                        filename, md5_digest,
+                    ),
+                    md5_digest=md5_digest,
+                )
+                for filename, md5_digest in [
+                    ("Foo_Bar-1.0.zip", "1" * 32),
+                    ("Foo_Bar-1.0.tar.gz", "0" * 32),
+                ]
+            ],
+        ),
+        "bar": ProjectFiles(project=Project("bar"), serial=2, files=[]),
     }
 
 
-@pytest.mark.parametrize(("name", "urls"), [
-    ("foo", [
-        "https://example.com/1/",
-        "https://example.com/3/",
-        "https://example.com/2/",
-        "https://example.com/5/",
-        "https://example.com/3/",
-    ]),
+def test_get_simple_batch_snapshot(dbapp, tmpdir):
+    path = str(tmpdir.join("simple.snapshot"))
+    dbapp.config.paths["snapshot"] = path
+
+    for name in ["Foo_Bar", "bar"]:
+        dbapp.engine.execute(packages.insert().values(name=name))
+    for id_, name in [(1, "bar"), (2, "Foo_Bar"), (3, "bar")]:
+        dbapp.engine.execute(journals.insert().values(id=id_, name=name))
+
+    snapshot_file = ReleaseFile("Foo_Bar-1.0.zip", "Foo_Bar-1.0.zip", "0")
+    snapshot.write(path, 2, [
+        ProjectFiles(Project("Foo_Bar"), 2, [snapshot_file]),
+        ProjectFiles(Project("bar"), 1, [snapshot_file]),
+        ProjectFiles(Project("gone"), 1, []),
+    ])
+
+    batch = dbapp.models.packaging.get_simple_batch(
+        ["foo.bar", "bar", "gone"],
+    )
+
+    # Only the projects whose serial hasn't changed are read from the snapshot
+    assert batch == {
+        "foo-bar": ProjectFiles(Project("Foo_Bar"), 2, [snapshot_file]),
+        "bar": ProjectFiles(Project("bar"), 3, []),
+    }
+
+
+def test_get_snapshot(dbapp, tmpdir):
+    model = dbapp.models.packaging
+
+    assert model.get_snapshot() is None
+
+    path = str(tmpdir.join("simple.snapshot"))
+    dbapp.config.paths["snapshot"] = path
+
+    assert model.get_snapshot() is None
+
+    snapshot.write(path, 1, [])
+    first = model.get_snapshot()
+
+    assert first.serial == 1
+    assert model.get_snapshot() is first
+
+    snapshot.write(path, 2, [])
+    second = model.get_snapshot()
+
+    assert second.serial == 2
+
+    # A snapshot that can't be read doesn't replace the one we have
+    tmpdir.join("broken").write(b"broken", mode="wb")
+    os.rename(str(tmpdir.join("broken")), path)
+
+    assert model.get_snapshot() is second
+
+
+def test_get_project_paths(dbapp):
+    def add(name, serial):
+        dbapp.engine.execute(packages.insert().values(name=name))
+        dbapp.engine.execute(journals.insert().values(id=serial, name=name))
+
+    add("foo", 1)
+    add("Foo.Bar", 2)
+
+    paths = dbapp.models.packaging.get_project_paths()
+
+    assert paths == {"foo": "foo", "Foo.Bar": "Foo.Bar"}
+
+    # Nothing has changed, so we should get the same mapping back
+    assert dbapp.models.packaging.get_project_paths() is paths
+
+    # Add a project and remove another
+    add("bar", 4)
+    dbapp.engine.execute(packages.delete().where(packages.c.name == "foo"))
+    dbapp.engine.execute(journals.insert().values(id=5, name="foo"))
+
+    assert dbapp.models.packaging.get_project_paths() == {
+        "bar": "bar",
+        "Foo.Bar": "Foo.Bar",
+    }
+
+    # The mapping that was handed out earlier shouldn't have changed
+    assert paths == {"foo": "foo", "Foo.Bar": "Foo.Bar"}
+
+
+def test_get_project_index(dbapp):
+    def add(name, serial):
+        dbapp.engine.execute(packages.insert().values(name=name))
+        dbapp.engine.execute(journals.insert().values(id=serial, name=name))
+
+    add("foo", 1)
+    add("Foo.Bar", 2)
+
+    index = dbapp.models.packaging.get_project_index()
+
+    assert list(index) == ["foo", "Foo.Bar"]
+    assert index.serial == 2
+
+    # Nothing has changed, so we should get the same index back
+    assert dbapp.models.packaging.get_project_index() is index
+
+    # Add a project and remove another
+    add("bar", 4)
+    dbapp.engine.execute(packages.delete().where(packages.c.name == "foo"))
+    dbapp.engine.execute(journals.insert().values(id=5, name="foo"))
+
+    updated = dbapp.models.packaging.get_project_index()
+
+    assert list(updated) == ["bar", "Foo.Bar"]
+    assert updated.serial == 5
+
+    # The index that was handed out earlier shouldn't have changed
+    assert list(index) == ["foo", "Foo.Bar"]
+
+
+def test_get_project_index_ttl(dbapp, monkeypatch):
+    dbapp.config.cache["projects"] = {"ttl": 60}
+    monkeypatch.setattr(time, "time", lambda: 1000)
+
+    dbapp.engine.execute(packages.insert().values(name="foo"))
+    dbapp.engine.execute(journals.insert().values(id=1, name="foo"))
+
+    index = dbapp.models.packaging.get_project_index()
+
+    # Changes aren't looked for until the index has been trusted for ttl
+    dbapp.engine.execute(packages.insert().values(name="bar"))
+    dbapp.engine.execute(journals.insert().values(id=2, name="bar"))
+
+    assert dbapp.models.packaging.get_project_index() is index
+
+    monkeypatch.setattr(time, "time", lambda: 1060)
+
+    assert list(dbapp.models.packaging.get_project_index()) == ["bar", "foo"]
+
+
+@pytest.mark.parametrize(("name", "path"), [
+    ("foo", "foo"),
+    ("Foo.Bar_baz-1", "Foo.Bar_baz-1"),
+    ("with space", "with%20space"),
+    ("ünicode", "%C3%BCnicode"),
+    (".", None),
+    ("..", None),
+    ("a/../b", None),
+    ("a..b", "a..b"),
 ])
-def test_get_external_urls(name, urls, dbapp):
+def test_project_path(name, path):
+    assert _project_path(name) == path
+
+
+@pytest.mark.parametrize("package_serials", [False, True])
+@pytest.mark.parametrize("serial", [1234567, None])
+def test_get_file_metadata(serial, package_serials, dbapp):
+    dbapp.config.database["package_serials"] = package_serials
+
     # prepare database
-    for url in urls:
+    dbapp.engine.execute(
+        release_files.insert().values(
+            name="foo",
+            filename="foo-1.0.tar.gz",
+            md5_digest="d41d8cd98f00b204e9800998ecf8427f",
+        )
+    )
+    if serial is not None:
+        dbapp.engine.execute(journals.insert().values(id=serial, name="foo"))
+        dbapp.engine.execute(journals.insert().values(id=1, name="foo"))
         dbapp.engine.execute(
-            description_urls.insert().values(name=name, url=url)
+            journals.insert().values(id=serial + 1, name="bar")
         )
 
-    assert dbapp.models.packaging.get_external_urls(name) == sorted(set(urls))
-
-
-@pytest.mark.parametrize(("name", "values", "urls"), [
-    (
-        "test-package",
-        [
-            {
-                "filename": "test-package-1.0.tar.gz",
-                "python_version": "any",
-                "md5_digest": "d41d8cd98f00b204e9800998ecf8427e",
-            },
-            {
-                "filename": "test-package-2.0.tar.gz",
-                "python_version": "any",
-                "md5_digest": "d41d8cd98f00b204e9800998ecf8427f",
-            },
-        ],
-        [
-            (
-                "test-package-1.0.tar.gz",
-                ("../../packages/any/t/test-package/test-package-1.0.tar.gz"
-                 "#md5=d41d8cd98f00b204e9800998ecf8427e"),
-            ),
-            (
-                "test-package-2.0.tar.gz",
-                ("../../packages/any/t/test-package/test-package-2.0.tar.gz"
-                 "#md5=d41d8cd98f00b204e9800998ecf8427f"),
-            ),
-        ],
-    ),
-])
-def test_get_file_urls(name, values, urls, dbapp):
-    # prepare db
-    dbapp.engine.execute(packages.insert().values(name=name))
-    for value in values:
-        dbapp.engine.execute(release_files.insert().values(name=name, **value))
+    assert dbapp.models.packaging.get_file_metadata("foo-1.0.tar.gz") == (
+        FileMetadata(
+            project=Project("foo"),
+            md5_digest="d41d8cd98f00b204e9800998ecf8427f",
+            serial=serial,
+        )
+    )
 
-    assert dbapp.models.packaging.get_file_urls(name) == [
-        FileURL(f, u) for f, u in sorted(set(urls), reverse=True)
-    ]
 
+def test_get_file_metadata_missing(dbapp):
+    assert dbapp.models.packaging.get_file_metadata("foo-1.0.tar.gz") is None
+
+
+def test_get_file_metadata_snapshot(dbapp, tmpdir):
+    path = str(tmpdir.join("simple.snapshot"))
+    dbapp.config.paths["snapshot"] = path
 
-@pytest.mark.parametrize(("name", "filename"), [
-    ("foo", "foo-1.0.tar.gz"),
-])
-def test_get_project_for_filename(name, filename, dbapp):
-    # prepare database
     dbapp.engine.execute(
-        release_files.insert().values(name=name, filename=filename)
+        release_files.insert().values(
+            name="new",
+            filename="new-1.0.tar.gz",
+            md5_digest="d41d8cd98f00b204e9800998ecf8427f",
+        )
     )
+    for id_, name in [(1, "foo"), (2, "new"), (3, "foo")]:
+        dbapp.engine.execute(journals.insert().values(id=id_, name=name))
 
-    assert (dbapp.models.packaging.get_project_for_filename(filename)
-            == Project(name))
+    snapshot.write(path, 1, [
+        ProjectFiles(
+            Project("foo"),
+            1,
+            [ReleaseFile("foo-1.0.tar.gz", "foo-1.0.tar.gz", "abc")],
+        ),
+    ])
 
+    model = dbapp.models.packaging
 
-@pytest.mark.parametrize(("filename", "md5"), [
-    ("foo-1.0.tar.gz", "d41d8cd98f00b204e9800998ecf8427f"),
-])
-def test_get_filename_md5(filename, md5, dbapp):
-    # prepare database
-    dbapp.engine.execute(
-        release_files.insert().values(filename=filename, md5_digest=md5)
+    # The serial is always the project's current one
+    assert model.get_file_metadata("foo-1.0.tar.gz") == FileMetadata(
+        project=Project("foo"),
+        md5_digest="abc",
+        serial=3,
     )
 
-    assert dbapp.models.packaging.get_filename_md5(filename) == md5
+    # Files which aren't in the snapshot may have been uploaded since
+    assert model.get_file_metadata("new-1.0.tar.gz") == FileMetadata(
+        project=Project("new"),
+        md5_digest="d41d8cd98f00b204e9800998ecf8427f",
+        serial=2,
+    )
+    assert model.get_file_metadata("missing-1.0.tar.gz") is None
 
 
 @pytest.mark.parametrize(("name", "serial"), [
     ("foo", 1234567),
     (None, 2345553),
 ])
-def test_get_last_serial(name, serial, dbapp):
+@pytest.mark.parametrize("package_serials", [False, True])
+def test_get_last_serial(name, serial, package_serials, dbapp):
+    dbapp.config.database["package_serials"] = package_serials
+
     dbapp.engine.execute(journals.insert().values(id=serial, name=name))
 
     assert dbapp.models.packaging.get_last_serial(name) == serial
+
+
+@pytest.mark.parametrize("package_serials", [False, True])
+@pytest.mark.parametrize("name", ["Foo_Bar", "foo-bar", "FOO_BAR"])
+def test_get_project_serial(name, package_serials, dbapp):
+    dbapp.config.database["package_serials"] = package_serials
+
+    dbapp.engine.execute(
+        packages.insert().values(name="Foo_Bar", normalized_name="foo-bar")
+    )
+    dbapp.engine.execute(journals.insert().values(id=1, name="Foo_Bar"))
+    dbapp.engine.execute(journals.insert().values(id=2, name="Other"))
+    dbapp.engine.execute(journals.insert().values(id=3, name="Foo_Bar"))
+
+    assert dbapp.models.packaging.get_project_serial(name) == 3
+
+
+def test_get_project_serial_missing(dbapp):
+    assert dbapp.models.packaging.get_project_serial("foo") is None
+
+
+@pytest.mark.parametrize(("since", "limit", "expected"), [
+    (0, 10, [1, 2, 5, 7]),
+    (0, 2, [1, 2]),
+    (2, 2, [5, 7]),
+    (7, 10, []),
+])
+def test_get_changelog(since, limit, expected, dbapp):
+    for id_ in [7, 1, 5, 2]:
+        dbapp.engine.execute(
+            journals.insert().values(
+                id=id_,
+                name="foo",
+                version="{}.0".format(id_),
+                action="new release",
+                submitted_date=datetime.datetime(2014, 5, 1, 0, 0, id_),
+            )
+        )
+
+    assert dbapp.models.packaging.get_changelog(since, limit) == [
+        ChangelogEntry(
+            serial=id_,
+            name="foo",
+            version="{}.0".format(id_),
+            action="new release",
+            submitted_date=datetime.datetime(2014, 5, 1, 0, 0, id_),
+        )
+        for id_ in expected
+    ]
+
+
+def test_package_serials_trigger(dbapp):
+    for id_, name in [(5, "foo"), (3, "foo"), (4, "bar"), (6, None)]:
+        dbapp.engine.execute(journals.insert().values(id=id_, name=name))
+
+    results = dbapp.engine.execute(
+        select([package_serials]).order_by(package_serials.c.name)
+    )
+
+    assert [tuple(r) for r in results] == [("bar", 4), ("foo", 5)]
+
+
+@pytest.mark.parametrize("mode", ["pypi-explicit", "pypi-scrape"])
+def test_get_simple_page_data(mode, dbapp):
+    # prepare database
+    dbapp.engine.execute(
+        packages.insert().values(
+            name="Foo_Bar",
+            normalized_name="foo-bar",
+            hosting_mode=mode,
+        )
+    )
+    for version in ["1.0", "2.0"]:
+        dbapp.engine.execute(
+            releases.insert().values(
+                name="Foo_Bar",
+                version=version,
+                home_page="https://example.com/{}/home/".format(version),
+                download_url="https://example.com/{}/dl/".format(version),
+            )
+        )
+        dbapp.engine.execute(
+            release_files.insert().values(
+                name="Foo_Bar",
+                version=version,
+                filename="Foo_Bar-{}.tar.gz".format(version),
+                python_version="source",
+                md5_digest="d41d8cd98f00b204e9800998ecf8427{}".format(
+                    version[0],
+                ),
+            )
+        )
+    for url in ["https://example.com/b/", "https://example.com/a/"] * 2:
+        dbapp.engine.execute(
+            description_urls.insert().values(
+                name="Foo_Bar",
+                version="1.0",
+                url=url,
+            )
+        )
+    dbapp.engine.execute(journals.insert().values(id=10, name="Foo_Bar"))
+    dbapp.engine.execute(journals.insert().values(id=20, name="Foo_Bar"))
+    dbapp.engine.execute(journals.insert().values(id=30, name="other"))
+
+    data = dbapp.models.packaging.get_simple_page_data("foo_bar")
+
+    assert data.project == Project("Foo_Bar")
+    assert data.hosting_mode == mode
+    assert data.serial == 20
+    assert data.files == [
+        FileURL(
+            filename="Foo_Bar-{}.tar.gz".format(version),
+            url="../../packages/source/F/Foo_Bar/Foo_Bar-{}.tar.gz"
+                "#md5=d41d8cd98f00b204e9800998ecf8427{}".format(
+                    version, version[0],
+                ),
+        )
+        for version in ["2.0", "1.0"]
+    ]
+    assert data.external_urls == [
+        "https://example.com/a/",
+        "https://example.com/b/",
+    ]
+
+    if mode == "pypi-explicit":
+        assert data.release_urls == {}
+    else:
+        assert data.release_urls == {
+            version: (
+                "https://example.com/{}/home/".format(version),
+                "https://example.com/{}/dl/".format(version),
+            )
+            for version in ["1.0", "2.0"]
+        }
+
+
+def test_get_simple_page_data_missing(dbapp):
+    assert dbapp.models.packaging.get_simple_page_data("missing") is None
+
+
+def test_get_changed_projects(dbapp):
+    for serial, name in [(1, "foo"), (2, "bar"), (3, "foo"), (4, None)]:
+        dbapp.engine.execute(journals.insert().values(id=serial, name=name))
+
+    assert dbapp.models.packaging.get_changed_projects(0) == {
+        "foo": 3,
+        "bar": 2,
+    }
+    assert dbapp.models.packaging.get_changed_projects(2) == {"foo": 3}
+    assert dbapp.models.packaging.get_changed_projects(4) == {}
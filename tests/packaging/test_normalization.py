@@ -0,0 +1,33 @@
+# Copyright 2013 Donald Stufft
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from __future__ import absolute_import, division, print_function
+from __future__ import unicode_literals
+
+import pytest
+
+from warehouse.packaging.normalization import normalize
+
+
+@pytest.mark.parametrize(("name", "expected"), [
+    ("foo", "foo"),
+    ("Foo", "foo"),
+    ("foo_bar", "foo-bar"),
+    ("a_b_c_d", "a-b-c-d"),
+    ("foo.bar", "foo-bar"),
+    ("Foo-_.Bar", "foo-bar"),
+    ("a__b", "a-b"),
+    ("Zope2", "zope2"),
+])
+def test_normalize(name, expected):
+    assert normalize(name) == expected
@@ -0,0 +1,223 @@
+# Copyright 2013 Donald Stufft
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from __future__ import absolute_import, division, print_function
+from __future__ import unicode_literals
+
+import os
+import struct
+
+import pretend
+import pytest
+
+from warehouse.packaging import snapshot
+from warehouse.packaging.models import Project, ProjectFiles, ReleaseFile
+from warehouse.packaging.snapshot import (
+    Snapshot, SnapshotFile, SnapshotFileMetadata, SnapshotProject,
+)
+
+
+PROJECTS = [
+    ProjectFiles(
+        project=Project("Foo_Bar"),
+        serial=20,
+        files=[
+            ReleaseFile(
+                filename="Foo_Bar-2.0.tar.gz",
+                url="../../packages/source/F/Foo_Bar/Foo_Bar-2.0.tar.gz"
+                    "#md5=d41d8cd98f00b204e9800998ecf8427f",
+                md5_digest="d41d8cd98f00b204e9800998ecf8427f",
+            ),
+            ReleaseFile(
+                filename="Foo_Bar-1.0.tar.gz",
+                url="../../packages/source/F/Foo_Bar/Foo_Bar-1.0.tar.gz",
+                md5_digest=None,
+            ),
+        ],
+    ),
+    ProjectFiles(project=Project("bar"), serial=None, files=[]),
+    ProjectFiles(
+        project=Project("ünicode"),
+        serial=7,
+        files=[
+            ReleaseFile(filename="ü.zip", url="ü.zip", md5_digest="abc"),
+        ],
+    ),
+    ProjectFiles(project=Project("Zope2"), serial=3, files=[]),
+]
+
+
+@pytest.fixture
+def snapshot_path(tmpdir):
+    path = str(tmpdir.join("snapshots", "simple.snapshot"))
+    snapshot.write(path, 25, PROJECTS)
+    return path
+
+
+def test_iteration(snapshot_path):
+    snap = Snapshot(snapshot_path)
+
+    assert snap.serial == 25
+    assert len(snap) == 4
+    assert list(snap) == ["bar", "Foo_Bar", "Zope2", "ünicode"]
+
+
+@pytest.mark.parametrize(("name", "expected"), [
+    (
+        "foo.bar",
+        SnapshotProject(
+            name="Foo_Bar",
+            serial=20,
+            files=[
+                SnapshotFile(
+                    filename="Foo_Bar-2.0.tar.gz",
+                    url="../../packages/source/F/Foo_Bar/Foo_Bar-2.0.tar.gz"
+                        "#md5=d41d8cd98f00b204e9800998ecf8427f",
+                    md5_digest="d41d8cd98f00b204e9800998ecf8427f",
+                ),
+                SnapshotFile(
+                    filename="Foo_Bar-1.0.tar.gz",
+                    url="../../packages/source/F/Foo_Bar/Foo_Bar-1.0.tar.gz",
+                    md5_digest=None,
+                ),
+            ],
+        ),
+    ),
+    ("BAR", SnapshotProject(name="bar", serial=None, files=[])),
+    (
+        "ünicode",
+        SnapshotProject(
+            name="ünicode",
+            serial=7,
+            files=[
+                SnapshotFile(filename="ü.zip", url="ü.zip", md5_digest="abc"),
+            ],
+        ),
+    ),
+    ("zope2", SnapshotProject(name="Zope2", serial=3, files=[])),
+    ("foo", None),
+    ("aaa", None),
+    ("zzz", None),
+])
+def test_get(name, expected, snapshot_path):
+    assert Snapshot(snapshot_path).get(name) == expected
+
+
+@pytest.mark.parametrize(("filename", "expected"), [
+    (
+        "Foo_Bar-2.0.tar.gz",
+        SnapshotFileMetadata(
+            project="Foo_Bar",
+            serial=20,
+            md5_digest="d41d8cd98f00b204e9800998ecf8427f",
+        ),
+    ),
+    (
+        "Foo_Bar-1.0.tar.gz",
+        SnapshotFileMetadata(project="Foo_Bar", serial=20, md5_digest=None),
+    ),
+    (
+        "ü.zip",
+        SnapshotFileMetadata(project="ünicode", serial=7, md5_digest="abc"),
+    ),
+    ("foo_bar-1.0.tar.gz", None),
+    ("Foo_Bar-1.5.tar.gz", None),
+    ("aaa", None),
+    ("zzz", None),
+])
+def test_get_file(filename, expected, snapshot_path):
+    assert Snapshot(snapshot_path).get_file(filename) == expected
+
+
+def test_empty(tmpdir):
+    path = str(tmpdir.join("simple.snapshot"))
+    snapshot.write(path, None, [])
+
+    snap = Snapshot(path)
+
+    assert snap.serial is None
+    assert len(snap) == 0
+    assert list(snap) == []
+    assert snap.get("foo") is None
+    assert snap.get_file("foo-1.0.tar.gz") is None
+
+
+@pytest.mark.parametrize("data", [
+    b"",
+    b"WHSNAPSH",
+    b"NOTASNAP" + snapshot.dumps(1, [])[8:],
+    # A snapshot written in an older version of the format
+    snapshot.dumps(1, [])[:8] + struct.pack(str("<I"), 1)
+    + snapshot.dumps(1, [])[12:],
+])
+def test_invalid(data, tmpdir):
+    path = tmpdir.join("simple.snapshot")
+    path.write(data, mode="wb")
+
+    with pytest.raises(ValueError):
+        Snapshot(str(path))
+
+
+def test_is_current(snapshot_path):
+    snap = Snapshot(snapshot_path)
+
+    assert snap.is_current()
+
+    snapshot.write(snapshot_path, 30, PROJECTS[:1])
+
+    # The snapshot that we have open is left as it was
+    assert not snap.is_current()
+    assert snap.serial == 25
+    assert len(snap) == 4
+
+    assert Snapshot(snapshot_path).serial == 30
+
+    # Only the snapshot itself is left in the directory
+    assert os.listdir(os.path.dirname(snapshot_path)) == ["simple.snapshot"]
+
+
+def test_is_current_missing(snapshot_path):
+    snap = Snapshot(snapshot_path)
+    os.unlink(snapshot_path)
+
+    assert snap.is_current()
+
+
+def test_build(tmpdir):
+    batches = {
+        "foo-bar": PROJECTS[0],
+        "bar": PROJECTS[1],
+        "zope2": PROJECTS[3],
+    }
+    model = pretend.stub(
+        get_last_serial=lambda: 25,
+        all_projects=lambda: [Project("bar"), Project("Foo_Bar"),
+                              Project("Zope2")],
+        get_simple_batch=pretend.call_recorder(
+            lambda names: dict(
+                (k, v) for k, v in batches.items()
+                if v.project.name in names
+            )
+        ),
+    )
+    path = str(tmpdir.join("simple.snapshot"))
+
+    assert snapshot.build(model, path, batch_size=2) == 3
+    assert model.get_simple_batch.calls == [
+        pretend.call(["bar", "Foo_Bar"]),
+        pretend.call(["Zope2"]),
+    ]
+
+    snap = Snapshot(path)
+    assert snap.serial == 25
+    assert list(snap) == ["bar", "Foo_Bar", "Zope2"]
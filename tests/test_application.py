@@ -14,18 +14,21 @@
 from __future__ import absolute_import, division, print_function
 from __future__ import unicode_literals
 
+import io
 import os.path
 
-import importlib
+import jinja2
 import mock
 import pretend
 import pytest
 
 from werkzeug.exceptions import HTTPException
 from werkzeug.test import create_environ
+from werkzeug.wsgi import wrap_file
 
-from warehouse import cli
+from warehouse import application, cli
 from warehouse.application import Warehouse
+from warehouse.http import Response
 
 
 def test_basic_instantiation():
@@ -46,6 +49,115 @@ def test_yaml_instantiation():
     )
 
 
+def test_pool_instantiation():
+    app = Warehouse.from_yaml(
+        override={
+            "database": {
+                "url": "postgresql:///test_warehouse",
+                "pool": {"size": 20, "max_overflow": 0},
+            },
+        },
+    )
+
+    assert app.engine.pool.size() == 20
+    assert app.engine.pool.stats.snapshot()["checkouts"] == 0
+
+
+def test_views(app):
+    from warehouse.legacy import changelog, simple
+
+    assert app.views == {
+        "warehouse.legacy.simple.index": simple.index,
+        "warehouse.legacy.simple.project": simple.project,
+        "warehouse.legacy.simple.batch": simple.batch,
+        "warehouse.legacy.simple.package": simple.package,
+        "warehouse.legacy.changelog.since": changelog.since,
+    }
+
+
+@pytest.mark.parametrize(("option", "directory"), [
+    (True, None),
+    ("/tmp/warehouse-templates", "/tmp/warehouse-templates"),
+])
+def test_bytecode_cache_instantiation(option, directory, monkeypatch):
+    bytecode_cache = pretend.stub()
+    fs_bytecode_cache = pretend.call_recorder(lambda d: bytecode_cache)
+    monkeypatch.setattr(jinja2, "FileSystemBytecodeCache", fs_bytecode_cache)
+
+    app = Warehouse.from_yaml(
+        override={
+            "database": {"url": "postgresql:///test_warehouse"},
+            "templates": {"bytecode_cache": option},
+        },
+    )
+
+    assert app.templates.bytecode_cache is bytecode_cache
+    assert fs_bytecode_cache.calls == [pretend.call(directory)]
+
+
+def test_bytecode_cache_disabled(app):
+    assert app.templates.bytecode_cache is None
+
+
+def test_template_version(app):
+    other = Warehouse.from_yaml(
+        override={"database": {"url": "postgres:///test_warehouse"}},
+    )
+
+    assert len(app.template_version) == 12
+    assert app.template_version == other.template_version
+
+
+def test_page_cache_instantiation():
+    app = Warehouse.from_yaml(
+        override={
+            "database": {"url": "postgres:///test_warehouse"},
+            "cache": {"pages": {"size": 100}},
+        },
+    )
+
+    assert app.caches.pages.size == 100
+
+
+def test_compression_requires_page_cache():
+    with pytest.raises(ValueError):
+        Warehouse.from_yaml(
+            override={
+                "database": {"url": "postgres:///test_warehouse"},
+                "simple": {"compression": ["gzip"]},
+            },
+        )
+
+
+def test_compression_with_page_cache():
+    app = Warehouse.from_yaml(
+        override={
+            "database": {"url": "postgres:///test_warehouse"},
+            "cache": {"pages": {"size": 100}},
+            "simple": {"compression": ["gzip"]},
+        },
+    )
+
+    assert app.caches.pages.size == 100
+
+
+def test_file_cache_instantiation():
+    app = Warehouse.from_yaml(
+        override={
+            "database": {"url": "postgres:///test_warehouse"},
+            "cache": {"files": {"size": 1000, "ttl": 300}},
+        },
+    )
+
+    assert app.caches.files.size == 1000
+    assert "pages" not in app.caches
+
+
+def test_page_cache_disabled(app):
+    assert "pages" not in app.caches
+    assert "files" not in app.caches
+
+
 def test_cli_instantiation(capsys):
     with pytest.raises(SystemExit):
         Warehouse.from_cli(["-h"])
@@ -79,61 +191,163 @@ def test_calling_application_is_wsgi_app(app):
     assert app.wsgi_app.calls == [pretend.call(environ, start_response)]
 
 
-def test_wsgi_app(app, monkeypatch):
+def test_wsgi_app(app):
     match = pretend.stub(
         match=pretend.call_recorder(lambda: ("warehouse.fake.view", {}))
     )
     urls = pretend.stub(bind_to_environ=pretend.call_recorder(lambda e: match))
-    response = pretend.call_recorder(lambda e, s: None)
+    response = pretend.call_recorder(lambda e, s: [])
     fake_view = pretend.call_recorder(lambda *a, **k: response)
-    fake_module = pretend.stub(view=fake_view)
-    import_module = pretend.call_recorder(lambda mod: fake_module)
-
-    monkeypatch.setattr(importlib, "import_module", import_module)
 
     environ = create_environ()
     start_response = pretend.stub()
 
     app.urls = urls
+    app.views = {"warehouse.fake.view": fake_view}
     app.wsgi_app(environ, start_response)
 
     assert match.match.calls == [pretend.call()]
     assert urls.bind_to_environ.calls == [pretend.call(environ)]
-    assert import_module.calls == [pretend.call("warehouse.fake")]
     assert fake_view.calls == [pretend.call(app, mock.ANY)]
     assert response.calls == [pretend.call(environ, start_response)]
 
 
-def test_wsgi_app_exception(app, monkeypatch):
+def test_wsgi_app_exception(app):
     match = pretend.stub(
         match=pretend.call_recorder(lambda: ("warehouse.fake.view", {}))
     )
     urls = pretend.stub(bind_to_environ=pretend.call_recorder(lambda e: match))
-    response = pretend.call_recorder(lambda e, s: None)
 
     class FakeException(HTTPException):
 
         #@pretend.call_recorder
         def __call__(self, *args, **kwargs):
-            return response
+            return []
 
     @pretend.call_recorder
     def fake_view(*args, **kwargs):
         raise FakeException("An error has occurred")
 
-    fake_module = pretend.stub(view=fake_view)
-    import_module = pretend.call_recorder(lambda mod: fake_module)
-
-    monkeypatch.setattr(importlib, "import_module", import_module)
-
     environ = create_environ()
     start_response = pretend.stub()
 
     app.urls = urls
+    app.views = {"warehouse.fake.view": fake_view}
 
     app.wsgi_app(environ, start_response)
 
     assert match.match.calls == [pretend.call()]
     assert urls.bind_to_environ.calls == [pretend.call(environ)]
-    assert import_module.calls == [pretend.call("warehouse.fake")]
     assert fake_view.calls == [pretend.call(app, mock.ANY)]
+
+
+def test_wsgi_app_request_scope(app, monkeypatch):
+    connection = pretend.stub(close=pretend.call_recorder(lambda: None))
+    connect = pretend.call_recorder(lambda: connection)
+    app.engine.engine = pretend.stub(connect=connect)
+
+    def view(app, request):
+        # Every connection in a request should share one from the pool
+        for _ in range(3):
+            with app.engine.connect() as conn:
+                conn.close()
+
+        return lambda e, s: [b"data"]
+
+    monkeypatch.setattr(app, "dispatch", lambda environ: view(app, None))
+
+    app_iter = app.wsgi_app(create_environ(), pretend.stub())
+
+    assert connect.calls == [pretend.call()]
+    assert connection.close.calls == []
+
+    assert list(app_iter) == [b"data"]
+    app_iter.close()
+
+    assert connection.close.calls == [pretend.call()]
+
+    # Outside of a request we get a new connection each time
+    app.engine.connect()
+    assert connect.calls == [pretend.call(), pretend.call()]
+
+
+def test_wsgi_app_request_scope_error(app, monkeypatch):
+    connection = pretend.stub(close=pretend.call_recorder(lambda: None))
+    app.engine.engine = pretend.stub(connect=lambda: connection)
+
+    def dispatch(environ):
+        app.engine.connect()
+        raise ValueError
+
+    monkeypatch.setattr(app, "dispatch", dispatch)
+
+    with pytest.raises(ValueError):
+        app.wsgi_app(create_environ(), pretend.stub())
+
+    assert connection.close.calls == [pretend.call()]
+
+
+def test_wsgi_app_file_wrapper(app, monkeypatch):
+    connection = pretend.stub(close=pretend.call_recorder(lambda: None))
+    app.engine.engine = pretend.stub(connect=lambda: connection)
+
+    class FileWrapper(object):
+
+        def __init__(self, fp, block_size=8192):
+            self.fp = fp
+
+        def __iter__(self):
+            return iter([self.fp.read()])
+
+    environ = create_environ()
+    environ["wsgi.file_wrapper"] = FileWrapper
+
+    def dispatch(environ):
+        app.engine.connect()
+        return Response(
+            wrap_file(environ, io.BytesIO(b"data")),
+            direct_passthrough=True,
+        )
+
+    monkeypatch.setattr(app, "dispatch", dispatch)
+
+    app_iter = app.wsgi_app(environ, lambda *a, **k: None)
+
+    # The server needs its own wrapper back to be able to use sendfile()
+    assert isinstance(app_iter, FileWrapper)
+    assert connection.close.calls == [pretend.call()]
+    assert list(app_iter) == [b"data"]
+
+
+@pytest.mark.parametrize(("listen", "pages", "started"), [
+    (True, {"size": 10}, True),
+    (True, False, False),
+    (False, {"size": 10}, False),
+])
+def test_wsgi_app_starts_listener(listen, pages, started, monkeypatch):
+    listener = pretend.stub(start=pretend.call_recorder(lambda: None))
+    listener_class = pretend.call_recorder(lambda app, callback: listener)
+    monkeypatch.setattr(application, "Listener", listener_class)
+
+    app = Warehouse.from_yaml(
+        override={
+            "database": {"url": "postgres:///test_warehouse"},
+            "cache": {"pages": pages, "listen": listen},
+        },
+        engine=pretend.stub(),
+    )
+    app.dispatch = lambda environ: lambda environ, start_response: []
+
+    for _ in range(2):
+        app.wsgi_app(create_environ(), pretend.stub())
+
+    if started:
+        # Only the first request in a process starts the listener
+        assert listener_class.calls == [
+            pretend.call(app, application.evict),
+        ]
+        assert listener.start.calls == [pretend.call()]
+        assert app.listener is listener
+    else:
+        assert listener_class.calls == []
+        assert app.listener is None
@@ -0,0 +1,175 @@
+# Copyright 2013 Donald Stufft
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from __future__ import absolute_import, division, print_function
+from __future__ import unicode_literals
+
+import pickle
+
+import pretend
+import pytest
+
+from warehouse import caching
+from warehouse.caching import LRUCache, RedisCache, create_cache
+
+
+def test_lru_cache_get_set():
+    cache = LRUCache(2)
+    cache.set("foo", 1)
+
+    assert "foo" in cache
+    assert len(cache) == 1
+    assert cache.get("foo") == 1
+    assert cache.get("bar") is None
+    assert cache.get("bar", 2) == 2
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(2)
+    cache.set("foo", 1)
+    cache.set("bar", 2)
+
+    # Touch foo so that bar becomes the least recently used item
+    cache.get("foo")
+    cache.set("wat", 3)
+
+    assert "foo" in cache
+    assert "bar" not in cache
+    assert "wat" in cache
+    assert len(cache) == 2
+
+
+def test_lru_cache_replace():
+    cache = LRUCache(2)
+    cache.set("foo", 1)
+    cache.set("foo", 2)
+
+    assert cache.get("foo") == 2
+    assert len(cache) == 1
+
+
+def test_lru_cache_delete_clear():
+    cache = LRUCache(2)
+    cache.set("foo", 1)
+    cache.set("bar", 2)
+
+    cache.delete("foo")
+    cache.delete("missing")
+
+    assert "foo" not in cache
+    assert "bar" in cache
+
+    cache.clear()
+
+    assert len(cache) == 0
+
+
+class FakeRedis(object):
+
+    def __init__(self):
+        self.data = {}
+        self.expires = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value
+        self.expires[key] = ex
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+    def scan_iter(self, match):
+        return [k for k in list(self.data) if k.startswith(match[:-1])]
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    client = FakeRedis()
+    from_url = pretend.call_recorder(lambda url: client)
+    monkeypatch.setattr(
+        caching, "redis",
+        pretend.stub(StrictRedis=pretend.stub(from_url=from_url)),
+    )
+    return client, from_url
+
+
+def test_redis_cache_requires_redis(monkeypatch):
+    monkeypatch.setattr(caching, "redis", None)
+
+    with pytest.raises(RuntimeError):
+        RedisCache("redis://localhost/")
+
+
+def test_redis_cache(fake_redis):
+    client, from_url = fake_redis
+    cache = RedisCache("redis://localhost/", prefix="test:", timeout=30)
+
+    cache.set("foo", (1, b"bar"))
+
+    assert from_url.calls == [pretend.call("redis://localhost/")]
+    assert pickle.loads(client.data["test:foo"]) == (1, b"bar")
+    assert client.expires["test:foo"] == 30
+    assert cache.get("foo") == (1, b"bar")
+    assert cache.get("missing") is None
+    assert cache.get("missing", 2) == 2
+
+
+def test_redis_cache_delete_clear(fake_redis):
+    client, _ = fake_redis
+    client.data["other"] = b"wat"
+    cache = RedisCache("redis://localhost/", prefix="test:")
+
+    cache.set("foo", 1)
+    cache.set("bar", 2)
+    cache.delete("foo")
+
+    assert cache.get("foo") is None
+    assert cache.get("bar") == 2
+
+    cache.clear()
+
+    assert client.data == {"other": b"wat"}
+
+
+def test_create_cache_default():
+    cache = create_cache({"size": 10, "ttl": 60})
+
+    assert isinstance(cache, LRUCache)
+    assert cache.size == 10
+
+
+def test_create_cache_backend(fake_redis):
+    cache = create_cache({
+        "backend": "warehouse.caching:RedisCache",
+        "url": "redis://localhost/",
+        "ttl": 60,
+    })
+
+    assert isinstance(cache, RedisCache)
+    assert cache.prefix == "warehouse:"
+
+
+@pytest.mark.parametrize(("config", "prefix"), [
+    ({}, "warehouse:pages:"),
+    ({"prefix": "custom:"}, "custom:"),
+])
+def test_create_cache_prefix(config, prefix, fake_redis):
+    config = dict(config, backend="warehouse.caching:RedisCache")
+    config["url"] = "redis://localhost/"
+
+    assert create_cache(config, "pages").prefix == prefix
+    assert create_cache(config, "files").prefix == (
+        "warehouse:files:" if "prefix" not in config else prefix
+    )
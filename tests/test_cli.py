@@ -15,19 +15,37 @@ from __future__ import absolute_import, division, print_function
 from __future__ import unicode_literals
 
 import pretend
+import pytest
 import werkzeug.serving
 
-from warehouse.cli import ServeCommand
+from warehouse import cli
+from warehouse.application import Warehouse
+from warehouse.cli import (
+    BuildSnapshotCommand, CompileTemplatesCommand, ListenCommand, ServeCommand,
+)
+from warehouse.invalidation import Notification
+from warehouse.packaging import snapshot
+from warehouse.serving import SendfileRequestHandler
 
 
-def test_serve(monkeypatch):
+@pytest.mark.parametrize(("delivery", "handler"), [
+    ("python", None),
+    ("sendfile", SendfileRequestHandler),
+])
+def test_serve(delivery, handler, monkeypatch):
     run_simple = pretend.call_recorder(
-        lambda host, port, app, use_reloader, use_debugger: None,
+        lambda host, port, app, use_reloader, use_debugger, request_handler:
+            None,
     )
     monkeypatch.setattr(werkzeug.serving, "run_simple", run_simple)
 
-    host, port, app, use_reloader, use_debugger = (
-        pretend.stub() for x in range(5)
+    host, port, use_reloader, use_debugger = (
+        pretend.stub() for x in range(4)
+    )
+    app = pretend.stub(
+        config=pretend.stub(
+            paths=pretend.stub(packages_delivery=delivery),
+        ),
     )
     ServeCommand()(
         app, host, port,
@@ -40,5 +58,201 @@ def test_serve(monkeypatch):
             host, port, app,
             use_reloader=use_reloader,
             use_debugger=use_debugger,
+            request_handler=handler,
+        ),
+    ]
+
+
+@pytest.mark.parametrize("configured", [True, False])
+def test_compile_templates(configured, tmpdir, capsys):
+    directory = str(tmpdir.join("compiled"))
+
+    app = Warehouse.from_yaml(
+        override={
+            "database": {"url": "postgresql:///nonexistant"},
+            "templates": {"compiled": directory if configured else False},
+        },
+        engine=pretend.stub(),
+    )
+
+    CompileTemplatesCommand()(app, None if configured else directory)
+
+    out, _ = capsys.readouterr()
+    assert out == "Compiled templates to {}\n".format(directory)
+    assert len(tmpdir.join("compiled").listdir()) == len(
+        app.template_loader.list_templates()
+    ) + 1
+    assert (tmpdir.join("compiled", ".template_version").read() ==
+            app.template_version)
+
+    # The compiled templates should be used instead of the sources
+    compiled = Warehouse.from_yaml(
+        override={
+            "database": {"url": "postgresql:///nonexistant"},
+            "templates": {"compiled": directory},
+        },
+        engine=pretend.stub(),
+    )
+    template = compiled.templates.get_template("legacy/simple/index.html")
+
+    assert template.filename.startswith(directory)
+    assert (template.render(projects=[]) ==
+            app.templates.get_template("legacy/simple/index.html").render(
+                projects=[],
+            ))
+
+
+def test_compile_templates_stale(tmpdir):
+    directory = str(tmpdir.join("compiled"))
+
+    app = Warehouse.from_yaml(
+        override={
+            "database": {"url": "postgresql:///nonexistant"},
+            "templates": {"compiled": directory},
+        },
+        engine=pretend.stub(),
+    )
+
+    CompileTemplatesCommand()(app, None)
+
+    # Compiled from templates which have changed since
+    tmpdir.join("compiled", ".template_version").write("abc")
+
+    stale = Warehouse.from_yaml(
+        override={
+            "database": {"url": "postgresql:///nonexistant"},
+            "templates": {"compiled": directory},
+        },
+        engine=pretend.stub(),
+    )
+    template = stale.templates.get_template("legacy/simple/index.html")
+
+    assert stale.templates.loader is stale.template_loader
+    assert not template.filename.startswith(directory)
+
+
+def test_compile_templates_no_directory(app):
+    with pytest.raises(SystemExit):
+        CompileTemplatesCommand()(app, None)
+
+
+@pytest.mark.parametrize(("fastly", "purged"), [
+    (False, False),
+    (True, False),
+    ({"service_id": "service", "api_key": "secret"}, True),
+])
+def test_listen(fastly, purged, monkeypatch, capsys):
+    evict = pretend.call_recorder(lambda app, notification: None)
+    monkeypatch.setattr(cli, "evict", evict)
+
+    queues = []
+
+    class FakePurgeQueue(object):
+
+        def __init__(self, config):
+            self.config = config
+            self.keys = []
+            self.started = self.stopped = False
+            queues.append(self)
+
+        def start(self):
+            self.started = True
+
+        def add(self, *keys):
+            self.keys.extend(keys)
+
+        def stop(self):
+            self.stopped = True
+
+    monkeypatch.setattr(cli, "PurgeQueue", FakePurgeQueue)
+
+    notification = Notification(10, "foo", "create")
+
+    class FakeListener(object):
+
+        def __init__(self, app, callback):
+            self.app, self.callback = app, callback
+
+        def run(self):
+            self.callback(self.app, notification)
+            raise KeyboardInterrupt
+
+    monkeypatch.setattr(cli, "Listener", FakeListener)
+
+    app = pretend.stub(config=pretend.stub(fastly=fastly))
+
+    with pytest.raises(KeyboardInterrupt):
+        ListenCommand()(app)
+
+    out, _ = capsys.readouterr()
+    assert out.startswith("Listening for journal changes")
+    assert evict.calls == [pretend.call(app, notification)]
+
+    if purged:
+        queue, = queues
+        assert queue.config is fastly
+        assert queue.started and queue.stopped
+        assert queue.keys == ["simple~foo", "package~foo", "simple-index"]
+    else:
+        assert queues == []
+
+
+def _snapshot_app(path=None, serial=10):
+    return pretend.stub(
+        config=pretend.stub(paths={"snapshot": path} if path else {}),
+        models=pretend.stub(
+            packaging=pretend.stub(get_last_serial=lambda: serial),
         ),
+    )
+
+
+@pytest.mark.parametrize("configured", [True, False])
+def test_build_snapshot(configured, tmpdir, monkeypatch, capsys):
+    path = str(tmpdir.join("simple.snapshot"))
+    build = pretend.call_recorder(lambda model, path, batch_size: 3)
+    monkeypatch.setattr(cli, "build", build)
+
+    app = _snapshot_app(path if configured else None)
+
+    BuildSnapshotCommand()(
+        app, None if configured else path,
+        force=False,
+        batch_size=100,
+    )
+
+    out, _ = capsys.readouterr()
+    assert out == "Wrote 3 projects to {}\n".format(path)
+    assert build.calls == [
+        pretend.call(app.models.packaging, path, batch_size=100),
     ]
+
+
+@pytest.mark.parametrize(("serial", "force", "built"), [
+    (10, False, False),
+    (10, True, True),
+    (11, False, True),
+])
+def test_build_snapshot_up_to_date(serial, force, built, tmpdir, monkeypatch,
+                                   capsys):
+    path = str(tmpdir.join("simple.snapshot"))
+    snapshot.write(path, 10, [])
+
+    build = pretend.call_recorder(lambda model, path, batch_size: 0)
+    monkeypatch.setattr(cli, "build", build)
+
+    BuildSnapshotCommand()(
+        _snapshot_app(path, serial=serial), None,
+        force=force,
+        batch_size=100,
+    )
+
+    out, _ = capsys.readouterr()
+    assert bool(build.calls) == built
+
+    if not built:
+        assert out == "{} is already up to date\n".format(path)
+
+
+def test_build_snapshot_no_path():
+    with pytest.raises(SystemExit):
+        BuildSnapshotCommand()(_snapshot_app(), None, False, 100)
@@ -0,0 +1,88 @@
+# Copyright 2013 Donald Stufft
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from __future__ import absolute_import, division, print_function
+from __future__ import unicode_literals
+
+import gzip
+import io
+
+import pretend
+import pytest
+
+from werkzeug.test import create_environ
+
+from warehouse import compression
+from warehouse.http import Request
+
+
+def test_gzip():
+    data = b"<a href='/simple/foo/'>foo</a>\n" * 100
+    compressed = compression.compress(data, "gzip")
+
+    assert len(compressed) < len(data)
+    assert gzip.GzipFile(fileobj=io.BytesIO(compressed)).read() == data
+
+    # The same data should always compress to the same bytes
+    assert compression.compress(data, "gzip") == compressed
+
+
+def test_brotli(monkeypatch):
+    brotli = pretend.stub(
+        MODE_TEXT=1,
+        compress=pretend.call_recorder(lambda data, mode: b"compressed"),
+    )
+    monkeypatch.setattr(compression, "brotli", brotli)
+    monkeypatch.setitem(compression.COMPRESSORS, "br", compression._brotli)
+
+    assert compression.compress(b"data", "br") == b"compressed"
+    assert brotli.compress.calls == [pretend.call(b"data", mode=1)]
+
+
+@pytest.mark.parametrize(("compressors", "encodings", "expected"), [
+    (["gzip"], False, []),
+    (["gzip"], None, []),
+    (["gzip"], ["br", "gzip"], ["gzip"]),
+    (["br", "gzip"], ["br", "gzip"], ["br", "gzip"]),
+    (["br", "gzip"], ["gzip", "br"], ["gzip", "br"]),
+])
+def test_available(compressors, encodings, expected, monkeypatch):
+    monkeypatch.setattr(
+        compression, "COMPRESSORS", {c: None for c in compressors},
+    )
+
+    assert compression.available(encodings) == expected
+
+
+@pytest.mark.parametrize(("accept", "expected"), [
+    (None, None),
+    ("identity", None),
+    ("gzip", "gzip"),
+    ("gzip, deflate", "gzip"),
+    ("br, gzip", "br"),
+    ("gzip, br", "br"),
+    ("br;q=0.5, gzip", "gzip"),
+    ("br;q=0, gzip;q=0", None),
+    ("*", "br"),
+    ("*;q=0.5, gzip", "gzip"),
+    ("*, br;q=0", "gzip"),
+    ("GZIP", "gzip"),
+])
+def test_negotiate(accept, expected):
+    headers = {"Accept-Encoding": accept} if accept is not None else {}
+    request = Request(create_environ(headers=headers))
+
+    assert compression.negotiate(
+        request.accept_encodings,
+        ["br", "gzip"],
+    ) == expected
@@ -0,0 +1,117 @@
+# Copyright 2013 Donald Stufft
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from __future__ import absolute_import, division, print_function
+from __future__ import unicode_literals
+
+import pretend
+import pytest
+
+from sqlalchemy import exc
+
+from warehouse import db
+from warehouse.db import InstrumentedQueuePool, PoolStats, create_engine
+
+
+def test_create_engine_pool_options():
+    engine = create_engine(
+        "sqlite://",
+        pool={
+            "size": 3,
+            "max_overflow": 2,
+            "timeout": 5,
+            "recycle": 60,
+            "pre_ping": False,
+        },
+    )
+
+    assert isinstance(engine.pool, InstrumentedQueuePool)
+    assert isinstance(engine.pool.stats, PoolStats)
+    assert engine.pool.size() == 3
+    assert engine.pool._max_overflow == 2
+    assert engine.pool._timeout == 5
+    assert engine.pool._recycle == 60
+
+
+def test_create_engine_defaults(monkeypatch):
+    engine = pretend.stub(pool=pretend.stub())
+    sa_create_engine = pretend.call_recorder(lambda *a, **k: engine)
+    listen = pretend.call_recorder(lambda *a, **k: None)
+
+    monkeypatch.setattr(db.sqlalchemy, "create_engine", sa_create_engine)
+    monkeypatch.setattr(db.event, "listen", listen)
+
+    assert create_engine("postgresql:///test", pool={"size": None}) is engine
+    assert sa_create_engine.calls == [
+        pretend.call("postgresql:///test", poolclass=InstrumentedQueuePool),
+    ]
+    assert db._ping_connection not in [c.args[2] for c in listen.calls]
+
+
+def test_pool_stats():
+    engine = create_engine("sqlite://", pool={"size": 1, "max_overflow": 1})
+    stats = engine.pool.stats
+
+    first = engine.connect()
+    second = engine.connect()
+
+    assert stats.snapshot()["checked_out"] == 2
+    assert stats.snapshot()["overflow"] == 1
+
+    second.invalidate()
+    second.close()
+    first.close()
+
+    snapshot = stats.snapshot()
+    assert snapshot["size"] == 1
+    assert snapshot["checked_out"] == 0
+    assert snapshot["connects"] == 2
+    assert snapshot["checkouts"] == 2
+    assert snapshot["checkins"] == 2
+    assert snapshot["invalidations"] == 1
+    assert snapshot["peak_overflow"] == 1
+    assert snapshot["wait_time"] >= snapshot["max_wait_time"] >= 0
+
+
+def test_pool_stats_survive_dispose():
+    engine = create_engine("sqlite://")
+    stats = engine.pool.stats
+
+    engine.dispose()
+    engine.connect().close()
+
+    assert engine.pool.stats is stats
+    assert stats.checkouts == 1
+
+
+def test_pre_ping():
+    engine = create_engine("sqlite://", pool={"pre_ping": True})
+
+    with engine.connect() as conn:
+        assert conn.execute("SELECT 1").scalar() == 1
+
+
+def test_ping_connection_disconnected():
+    def execute(query):
+        raise Exception("server closed the connection unexpectedly")
+
+    cursor = pretend.stub(
+        execute=execute,
+        close=pretend.call_recorder(lambda: None),
+    )
+    dbapi_connection = pretend.stub(cursor=lambda: cursor)
+
+    with pytest.raises(exc.DisconnectionError):
+        db._ping_connection(dbapi_connection, None, None)
+
+    assert cursor.close.calls == [pretend.call()]
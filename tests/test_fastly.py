@@ -0,0 +1,253 @@
+# Copyright 2013 Donald Stufft
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from __future__ import absolute_import, division, print_function
+from __future__ import unicode_literals
+
+import threading
+import time
+
+import pretend
+import pytest
+
+from six.moves import BaseHTTPServer
+
+from warehouse import fastly
+from warehouse.fastly import PurgeQueue
+
+
+class StubFastly(BaseHTTPServer.HTTPServer):
+    """
+    A local stand in for the Fastly API which records every purge request,
+    responding with each of ``statuses`` in turn and then with 200.
+    """
+
+    def __init__(self, statuses=()):
+        BaseHTTPServer.HTTPServer.__init__(
+            self, ("127.0.0.1", 0), StubFastlyHandler,
+        )
+        self.statuses = list(statuses)
+        self.requests = []
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return "http://127.0.0.1:{}".format(self.server_address[1])
+
+
+class StubFastlyHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    def do_POST(self):
+        headers = {k.lower(): v for k, v in self.headers.items()}
+
+        with self.server.lock:
+            self.server.requests.append((self.path, headers))
+            statuses = self.server.statuses
+            status = statuses.pop(0) if statuses else 200
+
+        self.send_response(status)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"{}")
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_fastly(request):
+    def make(statuses=()):
+        server = StubFastly(statuses)
+        thread = threading.Thread(
+            target=server.serve_forever,
+            kwargs={"poll_interval": 0.01},
+        )
+        thread.daemon = True
+        thread.start()
+
+        def stop():
+            server.shutdown()
+            server.server_close()
+        request.addfinalizer(stop)
+
+        return server
+    return make
+
+
+def _config(server, **kwargs):
+    config = {
+        "service_id": "service",
+        "api_key": "secret",
+        "api_url": server.url,
+        "purge_retry_delay": 0,
+    }
+    config.update(kwargs)
+    return config
+
+
+def _surrogate_keys(server):
+    return [headers["surrogate-key"] for _, headers in server.requests]
+
+
+@pytest.mark.parametrize("status", [200, 404, 503])
+def test_urllib_client(status, stub_fastly):
+    server = stub_fastly([status])
+
+    assert fastly.urllib_client(
+        server.url + "/service/service/purge",
+        {"Fastly-Key": "secret"},
+        5,
+    ) == status
+
+    (path, headers), = server.requests
+    assert path == "/service/service/purge"
+
+
+def test_send(stub_fastly):
+    server = stub_fastly()
+    purges = PurgeQueue(_config(server))
+
+    assert purges.send(["simple~foo", "package~foo"]) == 200
+
+    (path, headers), = server.requests
+    assert path == "/service/service/purge"
+    assert headers["fastly-key"] == "secret"
+    assert headers["surrogate-key"] == "simple~foo package~foo"
+
+
+@pytest.mark.parametrize(("statuses", "expected", "requests"), [
+    ([503, 429], 200, 3),
+    ([500, 500, 500, 500], 500, 4),
+    ([400], 400, 1),
+])
+def test_send_retries(statuses, expected, requests, stub_fastly, monkeypatch):
+    sleep = pretend.call_recorder(lambda seconds: None)
+    monkeypatch.setattr(time, "sleep", sleep)
+
+    server = stub_fastly(statuses)
+    purges = PurgeQueue(_config(server, purge_retry_delay=1))
+
+    assert purges.send(["simple~foo"]) == expected
+    assert len(server.requests) == requests
+
+    # Each retry waits twice as long as the last one
+    assert sleep.calls == [pretend.call(2 ** i) for i in range(requests - 1)]
+
+
+def test_send_client_errors():
+    def client(url, headers, timeout):
+        raise IOError
+
+    purges = PurgeQueue(
+        {"service_id": "s", "api_key": "k", "purge_retry_delay": 0},
+        client=client,
+    )
+
+    assert purges.send(["simple~foo"]) is None
+
+
+def test_flush_deduplicates_and_batches():
+    purges = PurgeQueue(
+        {"service_id": "s", "api_key": "k", "purge_batch_size": 2},
+    )
+
+    purges.add("simple~foo", "package~foo")
+    purges.add("simple~foo", "simple-index")
+
+    assert purges.flush() == 2
+    assert purges.flush() == 0
+
+    batches = [purges._batches.get_nowait() for _ in range(2)]
+    assert batches == [["package~foo", "simple-index"], ["simple~foo"]]
+
+
+def test_batch_size_limit():
+    purges = PurgeQueue(
+        {"service_id": "s", "api_key": "k", "purge_batch_size": 1000},
+    )
+
+    assert purges.batch_size == fastly.MAX_BATCH_SIZE
+
+
+def test_queue(stub_fastly):
+    server = stub_fastly()
+    purges = PurgeQueue(_config(server, purge_window=60, purge_batch_size=3))
+    purges.start()
+
+    # A burst of changes to a few projects
+    for _ in range(100):
+        for name in ["foo", "bar"]:
+            purges.add("simple~{}".format(name), "package~{}".format(name))
+
+    purges.flush()
+    purges.join()
+
+    assert sorted(_surrogate_keys(server)) == [
+        "package~bar package~foo simple~bar",
+        "simple~foo",
+    ]
+
+    # Stopping sends whatever is still pending
+    purges.add("simple-index")
+    purges.stop()
+
+    assert _surrogate_keys(server)[-1] == "simple-index"
+
+
+def test_queue_bounded_concurrency():
+    lock = threading.Lock()
+    active, seen = [0], []
+
+    def client(url, headers, timeout):
+        with lock:
+            active[0] += 1
+            seen.append(active[0])
+        time.sleep(0.01)
+        with lock:
+            active[0] -= 1
+        return 200
+
+    purges = PurgeQueue(
+        {
+            "service_id": "s",
+            "api_key": "k",
+            "purge_batch_size": 1,
+            "purge_concurrency": 2,
+            "purge_window": 60,
+        },
+        client=client,
+    )
+    purges.start()
+
+    purges.add(*["simple~{}".format(i) for i in range(10)])
+    purges.flush()
+    purges.stop()
+
+    assert len(seen) == 10
+    assert max(seen) <= 2
+
+
+def test_queue_window(stub_fastly):
+    server = stub_fastly()
+    purges = PurgeQueue(_config(server, purge_window=0.01))
+    purges.start()
+
+    purges.add("simple~foo")
+
+    deadline = time.time() + 5
+    while not server.requests and time.time() < deadline:
+        time.sleep(0.01)
+
+    purges.stop()
+
+    assert _surrogate_keys(server) == ["simple~foo"]
@@ -13,9 +13,13 @@
 # limitations under the License.
 from __future__ import absolute_import, division, print_function
 from __future__ import unicode_literals
+import io
 
+import pytest
 
-from warehouse.http import Response
+from werkzeug.test import create_environ
+
+from warehouse.http import Request, Response
 
 
 def test_response_surrogate_control():
@@ -40,3 +44,166 @@ def test_response_surrogate_control_remove():
     resp.surrogate_control.max_age = None
 
     assert "Surrogate-Control" not in resp.headers
+
+
+CONTENT = b"0123456789" * 10
+
+
+def _ranged(headers, content=CONTENT):
+    request = Request(create_environ(headers=headers))
+    fp = io.BytesIO(content)
+
+    resp = Response(fp, mimetype="application/x-tar", direct_passthrough=True)
+    resp.set_etag("abc")
+    resp.last_modified = 1000
+    resp.content_md5 = "0123456789abcdef0123456789abcdef"
+    resp.make_ranged(request, fp, len(content), blksize=7)
+
+    return resp, fp
+
+
+def test_response_make_ranged_no_range():
+    resp, fp = _ranged({})
+
+    assert resp.status_code == 200
+    assert resp.headers["Accept-Ranges"] == "bytes"
+    assert resp.response is fp
+    assert "Content-Range" not in resp.headers
+    assert resp.content_md5 == "0123456789abcdef0123456789abcdef"
+
+
+@pytest.mark.parametrize("headers", [
+    {"Range": "bytes=garbage"},
+    {"Range": "bytes=-a"},
+    {"Range": "items=0-10"},
+    {"Range": "bytes=0-10", "If-Range": '"def"'},
+    {"Range": "bytes=0-10", "If-Range": 'W/"abc"'},
+    {"Range": "bytes=0-10", "If-Range": "Thu, 01 Jan 1970 00:00:01 GMT"},
+])
+def test_response_make_ranged_ignored(headers):
+    resp, fp = _ranged(headers)
+
+    assert resp.status_code == 200
+    assert resp.response is fp
+    assert "Content-Range" not in resp.headers
+    assert "Content-MD5" in resp.headers
+
+
+def test_response_make_ranged_not_ok():
+    request = Request(create_environ(headers={"Range": "bytes=0-10"}))
+    fp = io.BytesIO(CONTENT)
+
+    resp = Response(fp, status=304, direct_passthrough=True)
+    resp.make_ranged(request, fp, len(CONTENT))
+
+    assert resp.status_code == 304
+    assert "Content-Range" not in resp.headers
+
+
+@pytest.mark.parametrize(("headers", "content_range", "expected"), [
+    ({"Range": "bytes=0-9"}, "bytes 0-9/100", CONTENT[:10]),
+    ({"Range": "bytes=95-"}, "bytes 95-99/100", CONTENT[95:]),
+    ({"Range": "bytes=-3"}, "bytes 97-99/100", CONTENT[97:]),
+    ({"Range": "bytes=-500"}, "bytes 0-99/100", CONTENT),
+    ({"Range": "bytes=90-500"}, "bytes 90-99/100", CONTENT[90:]),
+    (
+        {"Range": "bytes=10-29", "If-Range": '"abc"'},
+        "bytes 10-29/100",
+        CONTENT[10:30],
+    ),
+    (
+        {
+            "Range": "bytes=10-29",
+            "If-Range": "Thu, 01 Jan 1970 00:16:40 GMT",
+        },
+        "bytes 10-29/100",
+        CONTENT[10:30],
+    ),
+    # Unsatisfiable ranges are dropped when others can be satisfied
+    ({"Range": "bytes=0-9,200-300"}, "bytes 0-9/100", CONTENT[:10]),
+])
+def test_response_make_ranged_single(headers, content_range, expected):
+    resp, fp = _ranged(headers)
+
+    assert resp.status_code == 206
+    assert resp.headers["Content-Range"] == content_range
+    assert resp.headers["Content-Type"] == "application/x-tar"
+    assert resp.content_length == len(expected)
+    assert b"".join(resp.response) == expected
+    assert "Content-MD5" not in resp.headers
+    assert fp.closed
+
+
+def test_response_make_ranged_unsatisfiable():
+    resp, fp = _ranged({"Range": "bytes=200-300"})
+
+    assert resp.status_code == 416
+    assert resp.headers["Content-Range"] == "bytes */100"
+    assert resp.content_length == 0
+    assert resp.get_data() == b""
+    assert "Content-MD5" not in resp.headers
+    assert fp.closed
+
+
+def test_response_make_ranged_multiple():
+    resp, fp = _ranged({"Range": "bytes=0-4,10-14,-2"})
+
+    assert resp.status_code == 206
+    assert "Content-Range" not in resp.headers
+    assert "Content-MD5" not in resp.headers
+
+    mimetype, boundary = resp.headers["Content-Type"].split("; boundary=")
+    assert mimetype == "multipart/byteranges"
+
+    body = b"".join(resp.response)
+
+    assert resp.content_length == len(body)
+    assert body == "".join([
+        "--{b}\r\n"
+        "Content-Type: application/x-tar\r\n"
+        "Content-Range: bytes 0-4/100\r\n"
+        "\r\n"
+        "01234\r\n"
+        "--{b}\r\n"
+        "Content-Type: application/x-tar\r\n"
+        "Content-Range: bytes 10-14/100\r\n"
+        "\r\n"
+        "01234\r\n"
+        "--{b}\r\n"
+        "Content-Type: application/x-tar\r\n"
+        "Content-Range: bytes 98-99/100\r\n"
+        "\r\n"
+        "89\r\n"
+        "--{b}--\r\n",
+    ]).format(b=boundary).encode("ascii")
+    assert fp.closed
+
+
+def test_response_make_ranged_too_many():
+    ranges = ",".join("{0}-{0}".format(i) for i in range(0, 40, 2))
+    resp, fp = _ranged({"Range": "bytes=" + ranges})
+
+    # Far too many ranges to send, so the client gets the entire file
+    assert resp.status_code == 200
+    assert resp.response is fp
+    assert "Content-Range" not in resp.headers
+    assert "Content-MD5" in resp.headers
+
+
+def test_response_make_ranged_too_many_coalesced():
+    # These all touch each other, so they're merged into one
+    ranges = ",".join("{}-{}".format(i, i + 1) for i in range(2, 42, 2))
+    resp, fp = _ranged({"Range": "bytes=" + ranges})
+
+    assert resp.status_code == 206
+    assert resp.headers["Content-Range"] == "bytes 2-41/100"
+    assert b"".join(resp.response) == CONTENT[2:42]
+
+
+def test_response_make_ranged_max_ranges():
+    ranges = ",".join("{0}-{0}".format(i) for i in range(0, 32, 2))
+    resp, fp = _ranged({"Range": "bytes=" + ranges})
+
+    assert resp.status_code == 206
+    assert resp.headers["Content-Type"].startswith("multipart/byteranges")
+    assert b"".join(resp.response).count(b"Content-Range") == 16
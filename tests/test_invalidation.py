@@ -0,0 +1,262 @@
+# Copyright 2013 Donald Stufft
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from __future__ import absolute_import, division, print_function
+from __future__ import unicode_literals
+
+import pretend
+import pytest
+import sqlalchemy
+import sqlalchemy.pool
+
+from warehouse import invalidation
+from warehouse.caching import LRUCache
+from warehouse.invalidation import Listener, Notification
+from warehouse.legacy.simple import INDEX_KEY, file_project_key
+from warehouse.packaging.tables import journals
+
+
+def test_parse():
+    assert invalidation.parse(
+        '{"serial": 10, "name": "Foo_Bar", "action": "new release"}'
+    ) == Notification(serial=10, name="Foo_Bar", action="new release")
+
+
+@pytest.mark.parametrize(("action", "index"), [
+    ("new release", False),
+    ("create", True),
+    ("remove", True),
+    (None, True),
+])
+def test_evict(action, index):
+    pages, files = LRUCache(10), LRUCache(10)
+    for key in [INDEX_KEY, "~json", "foo-bar", "foo-bar~json", "other"]:
+        pages.set(key, pretend.stub())
+    for key in [file_project_key("Foo_Bar"), file_project_key("Other")]:
+        files.set(key, 5)
+    app = pretend.stub(caches={"pages": pages, "files": files})
+
+    invalidation.evict(app, Notification(10, "Foo_Bar", action))
+
+    assert "foo-bar" not in pages
+    assert "foo-bar~json" not in pages
+    assert "other" in pages
+    assert (INDEX_KEY not in pages) == index
+    assert ("~json" not in pages) == index
+    assert file_project_key("Foo_Bar") not in files
+    assert file_project_key("Other") in files
+
+
+def test_evict_without_caches():
+    app = pretend.stub(caches={})
+    invalidation.evict(app, Notification(10, "foo", None))
+
+
+def test_evict_without_name():
+    pages = LRUCache(10)
+    pages.set(INDEX_KEY, pretend.stub())
+    app = pretend.stub(caches={"pages": pages})
+
+    invalidation.evict(app, Notification(10, None, "create"))
+
+    assert INDEX_KEY in pages
+
+
+@pytest.mark.parametrize(("notification", "keys"), [
+    (
+        Notification(10, "Foo_Bar", "new release"),
+        ["simple~foo-bar", "package~foo-bar"],
+    ),
+    (
+        Notification(10, "Foo_Bar", "create"),
+        ["simple~foo-bar", "package~foo-bar", "simple-index"],
+    ),
+    (
+        Notification(10, "Foo.Bar", "new release"),
+        ["simple~foo-bar", "package~foo-bar"],
+    ),
+    (Notification(10, None, "create"), []),
+])
+def test_surrogate_keys(notification, keys):
+    assert invalidation.surrogate_keys(notification) == keys
+
+
+def _listener_app(last_serial=5, changed=None):
+    return pretend.stub(
+        models=pretend.stub(
+            packaging=pretend.stub(
+                get_last_serial=pretend.call_recorder(lambda: last_serial),
+                get_changed_projects=pretend.call_recorder(
+                    lambda since: changed or {}
+                ),
+            ),
+        ),
+    )
+
+
+def test_listener_catch_up():
+    app = _listener_app(changed={"foo": 8, "bar": 7})
+    callback = pretend.call_recorder(lambda app, notification: None)
+    listener = Listener(app, callback)
+
+    # The first time we connect there's nothing that we could have missed
+    listener.catch_up()
+
+    assert listener.serial == 5
+    assert callback.calls == []
+
+    listener.catch_up()
+
+    assert listener.serial == 8
+    assert app.models.packaging.get_changed_projects.calls == [
+        pretend.call(5),
+    ]
+    assert callback.calls == [
+        pretend.call(app, Notification(7, "bar", None)),
+        pretend.call(app, Notification(8, "foo", None)),
+    ]
+
+
+def test_listener_handle_failure():
+    def callback(app, notification):
+        raise ValueError
+
+    listener = Listener(_listener_app(), callback)
+    listener.serial = 5
+
+    with pytest.raises(ValueError):
+        listener.handle(Notification(10, "foo", None))
+
+    # We'll see it again when we catch up
+    assert listener.serial == 5
+
+
+@pytest.mark.parametrize("ready", [True, False])
+def test_listener_poll(ready, monkeypatch):
+    connection = pretend.stub(
+        poll=pretend.call_recorder(lambda: None),
+        notifies=[
+            pretend.stub(payload='{"serial": 6, "name": "foo"}'),
+            pretend.stub(payload='{"serial": 7, "name": "bar"}'),
+        ],
+    )
+    select = pretend.call_recorder(
+        lambda r, w, x, timeout: (r, [], []) if ready else ([], [], [])
+    )
+    monkeypatch.setattr(invalidation.select, "select", select)
+
+    callback = pretend.call_recorder(lambda app, notification: None)
+    listener = Listener(_listener_app(), callback, timeout=3)
+    listener.serial = 5
+
+    listener.poll(connection)
+
+    assert select.calls == [pretend.call([connection], [], [], 3)]
+
+    if ready:
+        assert connection.poll.calls == [pretend.call()]
+        assert connection.notifies == []
+        assert [c.args[1].name for c in callback.calls] == ["foo", "bar"]
+        assert listener.serial == 7
+    else:
+        assert connection.poll.calls == []
+        assert callback.calls == []
+
+
+def test_listener_run_reconnects(monkeypatch):
+    connections = []
+
+    def connect():
+        connection = pretend.stub(close=pretend.call_recorder(lambda: None))
+        connections.append(connection)
+        return connection
+
+    def poll(connection):
+        if len(connections) == 1:
+            raise ValueError
+        listener.stop()
+
+    listener = Listener(_listener_app(), None, retry_delay=0)
+    listener.connect = connect
+    listener.catch_up = pretend.call_recorder(lambda: None)
+    listener.poll = poll
+
+    listener.run()
+
+    assert len(connections) == 2
+    assert listener.catch_up.calls == [pretend.call(), pretend.call()]
+    for connection in connections:
+        assert connection.close.calls == [pretend.call()]
+
+
+def test_listener_start_stop():
+    listener = Listener(_listener_app(last_serial=5), None)
+    listener.run = pretend.call_recorder(lambda: None)
+
+    listener.start()
+    listener.stop()
+
+    assert listener.run.calls == [pretend.call()]
+
+    # The serial is recorded before the thread starts
+    assert listener.serial == 5
+
+
+def test_listener_catches_up_from_start():
+    app = _listener_app(last_serial=5, changed={"foo": 6})
+    callback = pretend.call_recorder(lambda app, notification: None)
+    listener = Listener(app, callback)
+    listener.run = lambda: None
+
+    listener.start()
+    listener.stop()
+
+    # Anything committed before the connection was listening is handled
+    listener.catch_up()
+
+    assert app.models.packaging.get_changed_projects.calls == [
+        pretend.call(5),
+    ]
+    assert callback.calls == [pretend.call(app, Notification(6, "foo", None))]
+    assert listener.serial == 6
+
+
+def test_listener_receives_notifications(_database):
+    engine = sqlalchemy.create_engine(
+        _database,
+        poolclass=sqlalchemy.pool.NullPool,
+    )
+    app = pretend.stub(engine=engine)
+    callback = pretend.call_recorder(lambda app, notification: None)
+    listener = Listener(app, callback, timeout=5)
+    listener.serial = 0
+
+    connection = listener.connect()
+    try:
+        with engine.begin() as conn:
+            conn.execute(
+                journals.insert().values(
+                    id=987654, name="foo", action="create",
+                )
+            )
+
+        listener.poll(connection)
+    finally:
+        connection.close()
+        engine.execute(journals.delete().where(journals.c.id == 987654))
+        engine.execute("DELETE FROM package_serials WHERE name = 'foo'")
+
+    assert callback.calls == [
+        pretend.call(app, Notification(987654, "foo", "create")),
+    ]
+    assert listener.serial == 987654
@@ -23,3 +23,11 @@ def test_model_basic():
 
     assert m.metadata is metadata
     assert m.engine is engine
+    assert m.config is None
+
+
+def test_model_config():
+    config = {"database": {}}
+    m = models.Model(object(), object(), config=config)
+
+    assert m.config is config
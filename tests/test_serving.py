@@ -0,0 +1,98 @@
+# Copyright 2013 Donald Stufft
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from __future__ import absolute_import, division, print_function
+from __future__ import unicode_literals
+
+import io
+import os
+import socket
+
+import pretend
+import pytest
+
+from warehouse.serving import SendfileWrapper, SendfileRequestHandler
+
+
+@pytest.mark.skipif(
+    not hasattr(os, "sendfile"),
+    reason="os.sendfile is not available",
+)
+def test_sendfile_wrapper(tmpdir):
+    path = tmpdir.join("test.tar.gz")
+    path.write_binary(b"x" * 100000)
+
+    ours, theirs = socket.socketpair()
+    try:
+        with open(str(path), "rb") as fp:
+            fp.seek(10)
+            wrapper = SendfileWrapper(ours, fp, blksize=1024)
+
+            # The only thing that passes through Python is an empty chunk to
+            #   flush the headers.
+            assert list(wrapper) == [b""]
+
+        ours.shutdown(socket.SHUT_WR)
+
+        received = b""
+        while True:
+            data = theirs.recv(65536)
+            if not data:
+                break
+            received += data
+
+        assert received == b"x" * 99990
+    finally:
+        ours.close()
+        theirs.close()
+
+
+@pytest.mark.parametrize("connection", [
+    # A socket with a timeout
+    pretend.stub(fileno=lambda: 5, gettimeout=lambda: 30),
+    # Something that isn't a real socket
+    pretend.stub(),
+])
+def test_sendfile_wrapper_fallback(connection):
+    fp = io.BytesIO(b"foobarwat")
+    wrapper = SendfileWrapper(connection, fp, blksize=3)
+
+    assert list(wrapper) == [b"foo", b"bar", b"wat"]
+
+    wrapper.close()
+
+    assert fp.closed
+
+
+@pytest.mark.parametrize("ssl_context", [None, pretend.stub()])
+def test_sendfile_request_handler(ssl_context, monkeypatch):
+    handler = SendfileRequestHandler.__new__(SendfileRequestHandler)
+    handler.connection = pretend.stub()
+    handler.server = pretend.stub(ssl_context=ssl_context)
+
+    monkeypatch.setattr(
+        SendfileRequestHandler.__bases__[0],
+        "make_environ",
+        lambda self: {},
+    )
+
+    environ = handler.make_environ()
+
+    if ssl_context is None:
+        wrapper = environ["wsgi.file_wrapper"](io.BytesIO(), 1024)
+
+        assert isinstance(wrapper, SendfileWrapper)
+        assert wrapper.connection is handler.connection
+        assert wrapper.blksize == 1024
+    else:
+        assert "wsgi.file_wrapper" not in environ
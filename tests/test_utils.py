@@ -19,8 +19,8 @@ import pretend
 import pytest
 
 from warehouse.utils import (
-    AttributeDict, convert_to_attr_dict, merge_dict, render_response, cache,
-    get_wsgi_application, get_mimetype,
+    AttributeDict, convert_to_attr_dict, merge_dict, render_response,
+    stream_response, cache, get_wsgi_application, get_mimetype,
 )
 
 
@@ -79,6 +79,28 @@ def test_render_response():
     assert template.render.calls == [pretend.call(foo="bar", url_for=mock.ANY)]
 
 
+def test_stream_response():
+    stream = pretend.stub(
+        enable_buffering=pretend.call_recorder(lambda size: None),
+        __iter__=lambda: iter(["te", "st"]),
+    )
+    template = pretend.stub(stream=pretend.call_recorder(lambda **k: stream))
+    app = pretend.stub(
+        templates=pretend.stub(
+            get_template=pretend.call_recorder(lambda t: template),
+        ),
+    )
+    request = pretend.stub()
+
+    resp = stream_response(app, request, "template.html", foo="bar")
+
+    assert resp.is_streamed
+    assert resp.data == b"test"
+    assert app.templates.get_template.calls == [pretend.call("template.html")]
+    assert template.stream.calls == [pretend.call(foo="bar", url_for=mock.ANY)]
+    assert stream.enable_buffering.calls == [pretend.call(size=mock.ANY)]
+
+
 @pytest.mark.parametrize(("browser", "varnish"), [
     ({}, {}),
     ({"test": 120}, {}),
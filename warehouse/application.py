@@ -16,8 +16,11 @@ from __future__ import unicode_literals
 
 import argparse
 import collections
+import hashlib
 import importlib
+import os
 import os.path
+import threading
 
 import jinja2
 import six
@@ -26,12 +29,15 @@ import yaml
 
 from werkzeug.exceptions import HTTPException
 from werkzeug.routing import Map
-from werkzeug.wsgi import responder
+from werkzeug.wsgi import ClosingIterator
 
 import warehouse
 import warehouse.cli
 
+from warehouse.caching import create_cache
+from warehouse.db import ScopedEngine, create_engine
 from warehouse.http import Request
+from warehouse.invalidation import Listener, evict
 from warehouse.utils import AttributeDict, merge_dict, convert_to_attr_dict
 
 
@@ -47,21 +53,63 @@ class Warehouse(object):
         "warehouse.legacy.urls",
     ]
 
+    template_names = {
+        "legacy": "warehouse.legacy",
+    }
+
+    cache_names = [
+        "files",
+        "pages",
+    ]
+
+    compiled_version_file = ".template_version"
+
     def __init__(self, config, engine=None):
         self.config = convert_to_attr_dict(config)
 
         # Connect to the database
         if engine is None:
-            engine = sqlalchemy.create_engine(self.config.database.url)
+            engine = create_engine(
+                self.config.database.url,
+                pool=self.config.database.get("pool"),
+            )
 
-        self.engine = engine
+        # Share a single connection between everything that happens in a
+        #   request instead of checking one out of the pool for every query.
+        self.engine = ScopedEngine(engine)
 
         # Create our Store instance and associate our store modules with it
         self.models = AttributeDict()
         for name, mod_path in six.iteritems(self.model_names):
             mod_name, klass = mod_path.rsplit(":", 1)
             mod = importlib.import_module(mod_name)
-            self.models[name] = getattr(mod, klass)(self.metadata, self.engine)
+            self.models[name] = getattr(mod, klass)(
+                self.metadata, self.engine,
+                config=self.config,
+            )
+
+        # Setup our in process caches
+        self.caches = AttributeDict()
+        cache_config = self.config.get("cache", {})
+        for name in self.cache_names:
+            if cache_config.get(name):
+                self.caches[name] = create_cache(cache_config[name], name)
+
+        # Compressing a page is only worth it when the result is kept, which
+        #   the simple pages do in the pages cache. Without it every response
+        #   would be compressed all over again.
+        if (self.config.get("simple", {}).get("compression")
+                and "pages" not in self.caches):
+            raise ValueError(
+                "simple.compression requires cache.pages to be configured"
+            )
+
+        # Evict projects from our caches as soon as the journals change
+        #   instead of waiting for them to be checked.
+        self.listen = bool(cache_config.get("listen") and self.caches)
+        self.listener = None
+        self._listener_pid = None
+        self._listener_lock = threading.Lock()
 
         # Setup our URL routing
         url_rules = []
@@ -70,14 +118,73 @@ class Warehouse(object):
             url_rules.extend(getattr(mod, "__urls__"))
         self.urls = Map(url_rules)
 
+        # Resolve every endpoint to its view function up front so that
+        #   dispatching a request only needs a dictionary lookup.
+        self.views = {}
+        for rule in self.urls.iter_rules():
+            if rule.endpoint not in self.views:
+                modname, viewname = rule.endpoint.rsplit(".", 1)
+                mod = importlib.import_module(modname)
+                self.views[rule.endpoint] = getattr(mod, viewname)
+
         # Setup our Jinja2 Environment
+        self.template_loader = jinja2.PrefixLoader({
+            prefix: jinja2.PackageLoader(mod_name)
+            for prefix, mod_name in six.iteritems(self.template_names)
+        })
+
+        templates_config = self.config.get("templates", {})
+
+        # Cache compiled templates on disk so that new processes don't need
+        #   to compile them again, using a temporary directory unless we've
+        #   been given one.
+        bytecode_cache = templates_config.get("bytecode_cache")
+        if bytecode_cache:
+            bytecode_cache = jinja2.FileSystemBytecodeCache(
+                bytecode_cache
+                if isinstance(bytecode_cache, six.string_types)
+                else None
+            )
+        else:
+            bytecode_cache = None
+
         self.templates = jinja2.Environment(
             auto_reload=self.config.debug,
-            loader=jinja2.PrefixLoader({
-                "legacy": jinja2.PackageLoader("warehouse.legacy"),
-            }),
+            loader=self.template_loader,
+            bytecode_cache=bytecode_cache,
         )
 
+        # A digest of all of our templates, anything which has been rendered
+        #   from them may change whenever this does.
+        digest = hashlib.sha1()
+        for name in sorted(self.template_loader.list_templates()):
+            source, _, _ = self.template_loader.get_source(
+                self.templates, name,
+            )
+            digest.update(name.encode("utf8") + b"\0")
+            digest.update(source.encode("utf8") + b"\0")
+        self.template_version = digest.hexdigest()[:12]
+
+        # Prefer templates that have been precompiled with compile-templates,
+        #   falling back to compiling them from source. They're only used if
+        #   they were compiled from the templates that we have now, otherwise
+        #   we'd be rendering whatever the templates used to be.
+        compiled = templates_config.get("compiled")
+        if (compiled and
+                self._compiled_version(compiled) == self.template_version):
+            self.templates.loader = jinja2.ChoiceLoader([
+                jinja2.ModuleLoader(compiled),
+                self.template_loader,
+            ])
+
+    def _compiled_version(self, directory):
+        path = os.path.join(directory, self.compiled_version_file)
+        try:
+            with open(path) as fp:
+                return fp.read().strip()
+        except (IOError, OSError):
+            return None
+
     def __call__(self, environ, start_response):
         """
         Shortcut for :attr:`wsgi_app`.
@@ -142,7 +249,6 @@ class Warehouse(object):
             **{k: v for k, v in args._get_kwargs() if not k.startswith("_")}
         )
 
-    @responder
     def wsgi_app(self, environ, start_response):
         """
         The actual WSGI application.  This is not implemented in
@@ -163,15 +269,49 @@ class Warehouse(object):
                                a list of headers and an optional
                                exception context to start the response
         """
+        # Threads don't survive forking, so each process starts its own
+        #   listener when it handles its first request.
+        if self.listen and self._listener_pid != os.getpid():
+            self.start_listener()
+
+        self.engine.begin_scope()
+
+        try:
+            resp = self.dispatch(environ)
+            app_iter = resp(environ, start_response)
+        except Exception:
+            self.engine.end_scope()
+            raise
+
+        # Servers only send a file with sendfile() when they get back the
+        #   very wrapper that they gave us, and a file has nothing left to do
+        #   with the database, so let go of the connection now.
+        file_wrapper = environ.get("wsgi.file_wrapper")
+        if getattr(resp, "direct_passthrough", False) or (
+                isinstance(file_wrapper, type)
+                and isinstance(app_iter, file_wrapper)):
+            self.engine.end_scope()
+            return app_iter
+
+        # Hold onto the request's connection until the response has been
+        #   sent, some responses are rendered while they are being sent.
+        return ClosingIterator(app_iter, self.engine.end_scope)
+
+    def start_listener(self):
+        with self._listener_lock:
+            if self._listener_pid != os.getpid():
+                self.listener = Listener(self, evict)
+                self.listener.start()
+                self._listener_pid = os.getpid()
+
+    def dispatch(self, environ):
         try:
             # Figure out what endpoint to call
             urls = self.urls.bind_to_environ(environ)
             endpoint, kwargs = urls.match()
 
             # Load our view function
-            modname, viewname = endpoint.rsplit(".", 1)
-            module = importlib.import_module(modname)
-            view = getattr(module, viewname)
+            view = self.views[endpoint]
 
             # Create our request object
             request = Request(environ)
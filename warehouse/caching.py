@@ -0,0 +1,136 @@
+# Copyright 2013 Donald Stufft
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from __future__ import absolute_import, division, print_function
+from __future__ import unicode_literals
+
+import collections
+import importlib
+import pickle
+import threading
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+
+class LRUCache(object):
+    """
+    A bounded, thread safe, in process cache which discards the least
+    recently used item once it has grown past ``size`` items.
+    """
+
+    def __init__(self, size):
+        self.size = size
+
+        self._data = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._data.pop(key)
+            except KeyError:
+                return default
+
+            # Reinsert the value so that it is now the most recently used
+            self._data[key] = value
+
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = value
+
+            # Discard the least recently used items until we fit
+            while len(self._data) > self.size:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class RedisCache(object):
+    """
+    A cache which is shared between processes by storing pickled values in
+    Redis, optionally expiring them after ``timeout`` seconds.
+    """
+
+    # Every cache that uses the same Redis server shares its keys, so each of
+    #   them is given a prefix of its own by create_cache().
+    namespaced = True
+
+    def __init__(self, url, prefix="warehouse:", timeout=None):
+        if redis is None:
+            raise RuntimeError("RedisCache requires the redis library")
+
+        self.client = redis.StrictRedis.from_url(url)
+        self.prefix = prefix
+        self.timeout = timeout
+
+    def get(self, key, default=None):
+        value = self.client.get(self.prefix + key)
+
+        if value is None:
+            return default
+
+        return pickle.loads(value)
+
+    def set(self, key, value):
+        self.client.set(
+            self.prefix + key,
+            pickle.dumps(value, pickle.HIGHEST_PROTOCOL),
+            ex=self.timeout,
+        )
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def clear(self):
+        for key in self.client.scan_iter(match=self.prefix + "*"):
+            self.client.delete(key)
+
+
+def create_cache(config, name=None):
+    """
+    Creates a cache from its configuration. The ``backend`` key selects the
+    cache class as a ``module:Class`` path, defaulting to :class:`LRUCache`,
+    and every other key except for ``ttl`` is passed to that class. Caches
+    which share their keys with other caches are prefixed with ``name``
+    unless the configuration gives a prefix.
+    """
+    options = dict(config)
+    options.pop("ttl", None)
+    backend = options.pop("backend", "warehouse.caching:LRUCache")
+
+    mod_name, klass = backend.rsplit(":", 1)
+    mod = importlib.import_module(mod_name)
+    cls = getattr(mod, klass)
+
+    if name is not None and getattr(cls, "namespaced", False):
+        options.setdefault("prefix", "warehouse:{}:".format(name))
+
+    return cls(**options)
@@ -14,18 +14,33 @@
 from __future__ import absolute_import, division, print_function
 from __future__ import unicode_literals
 
+import os.path
+
 import werkzeug.serving
 
+import warehouse.legacy.cli
 import warehouse.migrations.cli
 
+from warehouse.fastly import PurgeQueue
+from warehouse.invalidation import Listener, evict, surrogate_keys
+from warehouse.packaging.snapshot import Snapshot, build
+from warehouse.serving import SendfileRequestHandler
+
 
 class ServeCommand(object):
 
     def __call__(self, app, host, port, reloader, debugger):
+        # Serve package files with sendfile() if we've been configured to
+        if app.config.paths.packages_delivery == "sendfile":
+            request_handler = SendfileRequestHandler
+        else:
+            request_handler = None
+
         werkzeug.serving.run_simple(
             host, port, app,
             use_reloader=reloader,
             use_debugger=debugger,
+            request_handler=request_handler,
         )
 
     def create_parser(self, parser):
@@ -56,7 +71,132 @@ class ServeCommand(object):
         )
 
 
+class CompileTemplatesCommand(object):
+
+    def __call__(self, app, directory):
+        if directory is None:
+            directory = app.config.templates.get("compiled")
+
+        if not directory:
+            raise SystemExit(
+                "No directory given and templates.compiled is not configured"
+            )
+
+        # Compile from the template sources, not from any templates that
+        #   have already been compiled.
+        templates = app.templates.overlay(loader=app.template_loader)
+        templates.compile_templates(directory, zip=None, ignore_errors=False)
+
+        # Record which templates these were compiled from, so that they're
+        #   ignored once the templates change.
+        path = os.path.join(directory, app.compiled_version_file)
+        with open(path, "w") as fp:
+            fp.write(app.template_version)
+
+        print("Compiled templates to {}".format(directory))
+
+    def create_parser(self, parser):
+        parser.add_argument(
+            "directory",
+            nargs="?",
+            default=None,
+            help="The directory to write the compiled templates into, "
+                 "defaults to templates.compiled",
+        )
+
+
+class ListenCommand(object):
+
+    def __call__(self, app):
+        # Purging requires the credentials for the Fastly API, and not just
+        #   fastly: true
+        purges = None
+        if isinstance(app.config.fastly, dict):
+            purges = PurgeQueue(app.config.fastly)
+            purges.start()
+
+        def invalidate(app, notification):
+            # Shared caches only need to be evicted from once, so we do that
+            #   here as well.
+            evict(app, notification)
+
+            if purges is not None:
+                purges.add(*surrogate_keys(notification))
+
+        print("Listening for journal changes{}".format(
+            ", purging Fastly" if purges is not None else "",
+        ))
+
+        try:
+            Listener(app, invalidate).run()
+        finally:
+            if purges is not None:
+                purges.stop()
+
+
+class BuildSnapshotCommand(object):
+
+    def __call__(self, app, path, force, batch_size):
+        if path is None:
+            path = app.config.paths.get("snapshot")
+
+        if not path:
+            raise SystemExit(
+                "No path given and paths.snapshot is not configured"
+            )
+
+        # Only replace the snapshot once the journals have moved on from it,
+        #   so that this can be run as often as we like.
+        if not force:
+            try:
+                current = Snapshot(path)
+            except (IOError, OSError, ValueError):
+                current = None
+
+            if current is not None:
+                try:
+                    serial = app.models.packaging.get_last_serial()
+                    up_to_date = current.serial == serial
+                finally:
+                    current.close()
+
+                if up_to_date:
+                    print("{} is already up to date".format(path))
+                    return
+
+        built = build(app.models.packaging, path, batch_size=batch_size)
+
+        print("Wrote {} projects to {}".format(built, path))
+
+    def create_parser(self, parser):
+        parser.add_argument(
+            "path",
+            nargs="?",
+            default=None,
+            help="The file to write the snapshot to, defaults to "
+                 "paths.snapshot",
+        )
+        parser.add_argument(
+            "-f", "--force",
+            default=False,
+            action="store_true",
+            help="Write a new snapshot even if the current one is up to date",
+        )
+        parser.add_argument(
+            "-b", "--batch-size",
+            default=1000,
+            type=int,
+            dest="batch_size",
+            help="The number of projects to fetch at a time",
+        )
+
+
 __commands__ = {
+    "build-snapshot": BuildSnapshotCommand(),
+    "compile-templates": CompileTemplatesCommand(),
+    "export-simple": warehouse.legacy.cli.ExportSimpleCommand(),
+    "listen": ListenCommand(),
     "migrate": warehouse.migrations.cli.__commands__,
     "serve": ServeCommand(),
+    "sync-simple": warehouse.legacy.cli.SyncSimpleCommand(),
 }
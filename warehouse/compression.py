@@ -0,0 +1,79 @@
+# Copyright 2013 Donald Stufft
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from __future__ import absolute_import, division, print_function
+from __future__ import unicode_literals
+
+import gzip
+import io
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def _gzip(data):
+    buf = io.BytesIO()
+
+    # Leave the modification time out of the header so that compressing the
+    #   same data always gives us the same bytes.
+    with gzip.GzipFile(fileobj=buf, mode="wb", compresslevel=9, mtime=0) as fp:
+        fp.write(data)
+
+    return buf.getvalue()
+
+
+def _brotli(data):
+    return brotli.compress(data, mode=brotli.MODE_TEXT)
+
+
+COMPRESSORS = {
+    "gzip": _gzip,
+}
+
+if brotli is not None:
+    COMPRESSORS["br"] = _brotli
+
+
+def available(encodings):
+    """
+    Returns the encodings out of ``encodings`` that we are able to compress
+    with, in the same order.
+    """
+    if not encodings:
+        return []
+
+    return [e for e in encodings if e in COMPRESSORS]
+
+
+def negotiate(accept_encodings, encodings):
+    """
+    Picks the encoding out of ``encodings`` that the client most prefers
+    according to its ``Accept-Encoding``, preferring the earlier encodings
+    when the client doesn't mind which. Returns None if the client doesn't
+    accept any of them.
+    """
+    qualities = dict((value.lower(), q) for value, q in accept_encodings)
+
+    best, best_quality = None, 0
+    for encoding in encodings:
+        quality = qualities.get(encoding, qualities.get("*", 0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+
+    return best
+
+
+def compress(data, encoding):
+    return COMPRESSORS[encoding](data)
@@ -0,0 +1,232 @@
+# Copyright 2013 Donald Stufft
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from __future__ import absolute_import, division, print_function
+from __future__ import unicode_literals
+
+import threading
+import time
+
+import sqlalchemy
+
+from sqlalchemy import event, exc
+from sqlalchemy.pool import QueuePool
+from werkzeug.local import Local
+
+
+# Maps the keys of the database.pool configuration onto the arguments of
+#   sqlalchemy.create_engine()
+POOL_OPTIONS = {
+    "size": "pool_size",
+    "max_overflow": "max_overflow",
+    "timeout": "pool_timeout",
+    "recycle": "pool_recycle",
+}
+
+
+class InstrumentedQueuePool(QueuePool):
+    """
+    A :class:`~sqlalchemy.pool.QueuePool` which records how long it takes to
+    get a connection out of the pool into its :class:`PoolStats`.
+    """
+
+    stats = None
+
+    def _do_get(self):
+        start = time.time()
+        try:
+            return super(InstrumentedQueuePool, self)._do_get()
+        finally:
+            if self.stats is not None:
+                self.stats.waited(time.time() - start)
+
+    def recreate(self):
+        # Disposing of the engine replaces its pool, make sure that we keep
+        #   counting into the same place afterwards.
+        pool = super(InstrumentedQueuePool, self).recreate()
+        pool.stats = self.stats
+        return pool
+
+
+class PoolStats(object):
+    """
+    Counts what the connection pool of an engine is doing using the pool
+    events.
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+
+        self.connects = 0
+        self.checkouts = 0
+        self.checkins = 0
+        self.invalidations = 0
+        self.peak_overflow = 0
+        self.wait_time = 0.0
+        self.max_wait_time = 0.0
+
+        self._lock = threading.Lock()
+
+        event.listen(engine, "connect", self._on_connect)
+        event.listen(engine, "checkout", self._on_checkout)
+        event.listen(engine, "checkin", self._on_checkin)
+        event.listen(engine, "invalidate", self._on_invalidate)
+
+        engine.pool.stats = self
+
+    def _overflow(self):
+        # QueuePool counts its overflow up from -pool_size
+        return max(self.engine.pool.overflow(), 0)
+
+    def _on_connect(self, dbapi_connection, connection_record):
+        with self._lock:
+            self.connects += 1
+
+    def _on_checkout(self, dbapi_connection, connection_record,
+                     connection_proxy):
+        overflow = self._overflow()
+
+        with self._lock:
+            self.checkouts += 1
+            self.peak_overflow = max(self.peak_overflow, overflow)
+
+    def _on_checkin(self, dbapi_connection, connection_record):
+        with self._lock:
+            self.checkins += 1
+
+    def _on_invalidate(self, dbapi_connection, connection_record, exception):
+        with self._lock:
+            self.invalidations += 1
+
+    def waited(self, duration):
+        with self._lock:
+            self.wait_time += duration
+            self.max_wait_time = max(self.max_wait_time, duration)
+
+    def snapshot(self):
+        pool = self.engine.pool
+
+        with self._lock:
+            return {
+                "size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "overflow": self._overflow(),
+                "connects": self.connects,
+                "checkouts": self.checkouts,
+                "checkins": self.checkins,
+                "invalidations": self.invalidations,
+                "peak_overflow": self.peak_overflow,
+                "wait_time": self.wait_time,
+                "max_wait_time": self.max_wait_time,
+            }
+
+
+class _ScopedConnection(object):
+    """
+    Stands in for the connection of a scope so that code which closes its
+    connection when it is done with it leaves the scope's connection open.
+    """
+
+    def __init__(self, connection):
+        self._connection = connection
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def close(self):
+        pass
+
+
+class ScopedEngine(object):
+    """
+    Wraps an engine so that while a scope is active, such as for the length
+    of a request, every call to :meth:`connect` in the same thread shares one
+    connection. That connection is checked out of the pool the first time it
+    is used and is returned to it once the scope ends.
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self._local = Local()
+
+    def __getattr__(self, name):
+        return getattr(self.engine, name)
+
+    def begin_scope(self):
+        # Don't carry a connection over from a scope that was never ended
+        self.end_scope()
+        self._local.active = True
+
+    def end_scope(self):
+        connection = getattr(self._local, "connection", None)
+        self._local.__release_local__()
+
+        if connection is not None:
+            connection.close()
+
+    def connect(self):
+        if not getattr(self._local, "active", False):
+            return self.engine.connect()
+
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._local.connection = self.engine.connect()
+
+        return _ScopedConnection(connection)
+
+
+def _ping_connection(dbapi_connection, connection_record, connection_proxy):
+    # Make sure the connection is still alive before handing it out, raising
+    #   DisconnectionError causes the pool to replace it with a new one.
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute("SELECT 1")
+    except Exception:
+        raise exc.DisconnectionError()
+    finally:
+        cursor.close()
+
+
+def create_engine(url, pool=None):
+    """
+    Creates an engine for ``url`` with its connection pool configured from
+    the ``database.pool`` section of the configuration and instrumented
+    with a :class:`PoolStats`, which is available as ``engine.pool.stats``.
+    """
+    if pool is None:
+        pool = {}
+
+    options = {
+        arg: pool[key]
+        for key, arg in POOL_OPTIONS.items()
+        if pool.get(key) is not None
+    }
+
+    engine = sqlalchemy.create_engine(
+        url,
+        poolclass=InstrumentedQueuePool,
+        **options
+    )
+
+    if pool.get("pre_ping"):
+        event.listen(engine, "checkout", _ping_connection)
+
+    PoolStats(engine)
+
+    return engine
@@ -0,0 +1,195 @@
+# Copyright 2013 Donald Stufft
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from __future__ import absolute_import, division, print_function
+from __future__ import unicode_literals
+
+import logging
+import threading
+import time
+
+from six.moves import queue, urllib
+from werkzeug.urls import url_quote
+
+
+API_URL = "https://api.fastly.com"
+
+# The most surrogate keys Fastly will purge in a single request
+MAX_BATCH_SIZE = 256
+
+
+logger = logging.getLogger(__name__)
+
+
+def urllib_client(url, headers, timeout):
+    """
+    Sends an empty POST request to ``url`` and returns the status code of the
+    response.
+    """
+    request = urllib.request.Request(url, data=b"", headers=headers)
+
+    try:
+        resp = urllib.request.urlopen(request, timeout=timeout)
+    except urllib.error.HTTPError as exc:
+        exc.close()
+        return exc.code
+
+    try:
+        return resp.getcode()
+    finally:
+        resp.close()
+
+
+def _should_retry(status):
+    return status == 429 or status >= 500
+
+
+class PurgeQueue(object):
+    """
+    Collects surrogate keys to purge from the Fastly service given by the
+    ``service_id`` and ``api_key`` in ``config``.
+
+    Keys which are added within ``purge_window`` seconds of each other are
+    deduplicated and purged together, in batches of ``purge_batch_size`` keys
+    sent by ``purge_concurrency`` threads. A batch which fails is retried up to
+    ``purge_retries`` times, waiting twice as long before each retry.
+
+    ``client`` sends the requests, see :func:`urllib_client`.
+    """
+
+    def __init__(self, config, client=urllib_client):
+        self.config = config
+        self.client = client
+
+        self.window = config.get("purge_window", 1)
+        self.batch_size = min(
+            config.get("purge_batch_size", MAX_BATCH_SIZE),
+            MAX_BATCH_SIZE,
+        )
+        self.concurrency = config.get("purge_concurrency", 4)
+        self.retries = config.get("purge_retries", 3)
+        self.retry_delay = config.get("purge_retry_delay", 1)
+        self.timeout = config.get("timeout", 10)
+
+        self._pending = set()
+        self._lock = threading.Lock()
+
+        self._batches = queue.Queue()
+        self._stopped = threading.Event()
+        self._collector = None
+        self._workers = []
+
+    def add(self, *keys):
+        with self._lock:
+            self._pending.update(keys)
+
+    def flush(self):
+        """
+        Queues every pending key to be purged, returning how many batches
+        they were split into.
+        """
+        with self._lock:
+            keys, self._pending = sorted(self._pending), set()
+
+        batches = 0
+        for i in range(0, len(keys), self.batch_size):
+            self._batches.put(keys[i:i + self.batch_size])
+            batches += 1
+
+        return batches
+
+    def send(self, keys):
+        """
+        Purges ``keys`` in a single request, retrying it if it fails. Returns
+        the status code of the last response, or None if we never got one.
+        """
+        url = "{}/service/{}/purge".format(
+            self.config.get("api_url", API_URL),
+            url_quote(self.config["service_id"]),
+        )
+        headers = {
+            "Fastly-Key": self.config["api_key"],
+            "Surrogate-Key": " ".join(keys),
+            "Accept": "application/json",
+        }
+
+        status = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                time.sleep(self.retry_delay * 2 ** (attempt - 1))
+
+            try:
+                status = self.client(url, headers, self.timeout)
+            except Exception:
+                logger.exception("Error purging %d keys", len(keys))
+                continue
+
+            if not _should_retry(status):
+                break
+
+        if status is None or status >= 400:
+            logger.error(
+                "Could not purge %d keys, last status was %s",
+                len(keys), status,
+            )
+
+        return status
+
+    def _collect(self):
+        while not self._stopped.wait(self.window):
+            self.flush()
+
+    def _work(self):
+        while True:
+            keys = self._batches.get()
+            try:
+                if keys is None:
+                    return
+                self.send(keys)
+            finally:
+                self._batches.task_done()
+
+    def start(self):
+        for _ in range(self.concurrency):
+            worker = threading.Thread(target=self._work, name="purger")
+            worker.daemon = True
+            worker.start()
+            self._workers.append(worker)
+
+        self._collector = threading.Thread(
+            target=self._collect,
+            name="purge-collector",
+        )
+        self._collector.daemon = True
+        self._collector.start()
+
+    def join(self):
+        """
+        Waits for every batch which has been queued to be sent.
+        """
+        self._batches.join()
+
+    def stop(self):
+        """
+        Purges every key which is still pending and stops our threads.
+        """
+        self._stopped.set()
+        if self._collector is not None:
+            self._collector.join()
+
+        self.flush()
+
+        for _ in self._workers:
+            self._batches.put(None)
+        for worker in self._workers:
+            worker.join()
@@ -14,8 +14,11 @@
 from __future__ import absolute_import, division, print_function
 from __future__ import unicode_literals
 
+import binascii
+import os
+
 from werkzeug.datastructures import ResponseCacheControl
-from werkzeug.http import parse_cache_control_header
+from werkzeug.http import parse_cache_control_header, parse_range_header
 from werkzeug.wrappers import (
     BaseRequest, AcceptMixin, ETagRequestMixin, UserAgentMixin,
     AuthorizationMixin, CommonRequestDescriptorsMixin,
@@ -24,6 +27,70 @@ from werkzeug.wrappers import (
 )
 
 
+# The most ranges that we'll send in a single response. Every range is read
+#   from the file separately and sent with headers of its own, so any more
+#   than this and the client gets the entire file instead.
+MAX_RANGES = 16
+
+
+def _coalesce_ranges(ranges):
+    coalesced = []
+    for start, stop in sorted(ranges):
+        if coalesced and start <= coalesced[-1][1]:
+            coalesced[-1] = (coalesced[-1][0], max(coalesced[-1][1], stop))
+        else:
+            coalesced.append((start, stop))
+
+    return coalesced
+
+
+def _satisfiable_ranges(ranges, length):
+    satisfiable = []
+    for start, stop in ranges:
+        # Suffix ranges select the final bytes of the file
+        if start < 0:
+            start, stop = max(length + start, 0), length
+        elif stop is None or stop > length:
+            stop = length
+
+        if start < stop:
+            satisfiable.append((start, stop))
+
+    return satisfiable
+
+
+def _iter_file_range(fp, start, stop, blksize):
+    fp.seek(start)
+    remaining = stop - start
+
+    while remaining > 0:
+        data = fp.read(min(blksize, remaining))
+        if not data:
+            break
+        remaining -= len(data)
+        yield data
+
+
+def _iter_single_range(fp, start, stop, blksize):
+    try:
+        for data in _iter_file_range(fp, start, stop, blksize):
+            yield data
+    finally:
+        fp.close()
+
+
+def _iter_multiple_ranges(fp, parts, closing, blksize):
+    try:
+        for header, start, stop in parts:
+            yield header
+            for data in _iter_file_range(fp, start, stop, blksize):
+                yield data
+            yield b"\r\n"
+        yield closing
+    finally:
+        fp.close()
+
+
 class Request(BaseRequest, AcceptMixin, ETagRequestMixin,
               UserAgentMixin, AuthorizationMixin,
               CommonRequestDescriptorsMixin):
@@ -68,3 +135,102 @@ class Response(BaseResponse, ETagResponseMixin, ResponseStreamMixin,
             on_update,
             ResponseCacheControl,
         )
+
+    def make_ranged(self, request, fp, length, blksize=8192):
+        """
+        Turn this response into a partial response if the request asked for
+        one or more byte ranges of it. ``fp`` must be a seekable file object
+        containing the ``length`` bytes of the full response body, the
+        requested ranges are read from it lazily.
+
+        This should be called after :meth:`make_conditional`.
+        """
+        self.accept_ranges = "bytes"
+
+        if self.status_code != 200:
+            return self
+
+        try:
+            rng = parse_range_header(request.environ.get("HTTP_RANGE"))
+        except ValueError:
+            rng = None
+
+        if rng is None or rng.units != "bytes":
+            return self
+
+        # If the client gave us a validator for the ranges and it no longer
+        #   matches then they need the entire response instead.
+        if_range = request.if_range
+        if if_range.date is not None:
+            if self.last_modified != if_range.date:
+                return self
+        elif if_range.etag is not None:
+            # Ranges can only be validated with strong ETags, but the parsed
+            #   If-Range header doesn't tell us if the client sent a weak one.
+            etag, weak = self.get_etag()
+            sent_weak = request.environ["HTTP_IF_RANGE"].startswith("W/")
+            if weak or sent_weak or etag != if_range.etag:
+                return self
+
+        ranges = _satisfiable_ranges(rng.ranges, length)
+
+        # Too many ranges are merged where they overlap or touch, and if that
+        #   doesn't bring them under the limit then we ignore them.
+        if len(ranges) > MAX_RANGES:
+            ranges = _coalesce_ranges(ranges)
+            if len(ranges) > MAX_RANGES:
+                return self
+
+        # Content-MD5 is the digest of the entire body, which isn't what we're
+        #   going to be sending anymore.
+        self.headers.pop("Content-MD5", None)
+
+        # None of the ranges overlap the file, so there's nothing we can send
+        if not ranges:
+            if hasattr(self.response, "close"):
+                self.response.close()
+
+            self.status_code = 416
+            self.response = []
+            self.headers["Content-Range"] = "bytes */{}".format(length)
+            self.content_length = 0
+
+            return self
+
+        self.status_code = 206
+
+        if len(ranges) == 1:
+            start, stop = ranges[0]
+
+            self.headers["Content-Range"] = "bytes {}-{}/{}".format(
+                start, stop - 1, length,
+            )
+            self.content_length = stop - start
+            self.response = _iter_single_range(fp, start, stop, blksize)
+
+            return self
+
+        boundary = binascii.hexlify(os.urandom(16)).decode("ascii")
+        content_type = self.headers.get("Content-Type")
+
+        parts = []
+        for start, stop in ranges:
+            header = "--{}\r\n".format(boundary)
+            if content_type:
+                header += "Content-Type: {}\r\n".format(content_type)
+            header += "Content-Range: bytes {}-{}/{}\r\n\r\n".format(
+                start, stop - 1, length,
+            )
+            parts.append((header.encode("ascii"), start, stop))
+
+        closing = "--{}--\r\n".format(boundary).encode("ascii")
+
+        self.headers["Content-Type"] = (
+            "multipart/byteranges; boundary={}".format(boundary)
+        )
+        self.content_length = sum(
+            len(header) + (stop - start) + 2 for header, start, stop in parts
+        ) + len(closing)
+        self.response = _iter_multiple_ranges(fp, parts, closing, blksize)
+
+        return self
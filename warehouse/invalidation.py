@@ -0,0 +1,216 @@
+# Copyright 2013 Donald Stufft
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Invalidates cached pages as soon as the journals change.
+
+A trigger on the journals table sends a notification on the ``journals``
+channel for every new entry. A :class:`Listener` receives them on its own
+connection and hands each one to a callback, which either evicts the project
+from this process' caches with :func:`evict` or queues its
+:func:`surrogate_keys` to be purged from Fastly. This lets the caches keep
+pages for a long time without serving them once they're stale.
+"""
+from __future__ import absolute_import, division, print_function
+from __future__ import unicode_literals
+
+import json
+import logging
+import select
+import threading
+
+from collections import namedtuple
+
+from warehouse.legacy.simple import (
+    FORMATS, INDEX_KEY, file_project_key, page_key,
+)
+from warehouse.packaging.normalization import normalize
+
+
+CHANNEL = "journals"
+
+# Journal actions which add a project to or remove it from the index
+INDEX_ACTIONS = {"create", "remove"}
+
+
+logger = logging.getLogger(__name__)
+
+
+Notification = namedtuple("Notification", ["serial", "name", "action"])
+
+
+def parse(payload):
+    data = json.loads(payload)
+    return Notification(
+        serial=data.get("serial"),
+        name=data.get("name"),
+        action=data.get("action"),
+    )
+
+
+def _changes_index(notification):
+    # We don't know what the missed entries were, so assume the worst
+    return notification.action is None or notification.action in INDEX_ACTIONS
+
+
+def evict(app, notification):
+    """
+    Removes everything that the journal entry may have changed from the
+    application's caches.
+    """
+    if notification.name is None:
+        return
+
+    pages = app.caches.get("pages")
+    if pages is not None:
+        # Every format of a page is cached separately
+        for fmt in FORMATS:
+            pages.delete(page_key(normalize(notification.name), fmt))
+
+            if _changes_index(notification):
+                pages.delete(page_key(INDEX_KEY, fmt))
+
+    # Every file of the project is checked against the serial under this key
+    #   before it is trusted, so this is all it takes to evict them.
+    files = app.caches.get("files")
+    if files is not None:
+        files.delete(file_project_key(notification.name))
+
+
+def surrogate_keys(notification):
+    """
+    Returns the Fastly surrogate keys of the responses which the journal entry
+    may have changed.
+    """
+    if notification.name is None:
+        return []
+
+    normalized = normalize(notification.name)
+    keys = ["simple~{}".format(normalized), "package~{}".format(normalized)]
+
+    if _changes_index(notification):
+        keys.append("simple-index")
+
+    return keys
+
+
+class Listener(object):
+    """
+    Listens for journal notifications and calls ``callback(app, notification)``
+    with each of them. Whenever the connection has to be replaced the journal
+    entries which were missed in the meantime are passed along as well, with
+    their action set to None.
+    """
+
+    def __init__(self, app, callback, channel=CHANNEL, timeout=5,
+                 retry_delay=1):
+        self.app = app
+        self.callback = callback
+        self.channel = channel
+        self.timeout = timeout
+        self.retry_delay = retry_delay
+
+        # The last serial that we've handled
+        self.serial = None
+
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def connect(self):
+        # Use a connection of our own instead of one from the pool, since we
+        #   hold onto it for as long as we're listening.
+        engine = self.app.engine
+        cargs, cparams = engine.dialect.create_connect_args(engine.url)
+        connection = engine.dialect.connect(*cargs, **cparams)
+
+        connection.autocommit = True
+        cursor = connection.cursor()
+        try:
+            cursor.execute("LISTEN {}".format(self.channel))
+        finally:
+            cursor.close()
+
+        return connection
+
+    def handle(self, notification):
+        self.callback(self.app, notification)
+
+        # Only move past an entry once it has been handled, so that it is
+        #   handled again if we fail and have to catch up.
+        if notification.serial is not None:
+            self.serial = max(self.serial, notification.serial)
+
+    def catch_up(self):
+        """
+        Handles every journal entry since the last serial that we've handled.
+        This must only be called once we're listening, so that nothing can
+        slip in between.
+        """
+        packaging = self.app.models.packaging
+
+        if self.serial is None:
+            self.serial = packaging.get_last_serial() or 0
+            return
+
+        changed = packaging.get_changed_projects(self.serial)
+        for name, serial in sorted(changed.items(), key=lambda i: i[1]):
+            self.handle(Notification(serial=serial, name=name, action=None))
+
+    def poll(self, connection):
+        """
+        Waits up to ``timeout`` seconds for notifications and handles each
+        one that arrives.
+        """
+        if select.select([connection], [], [], self.timeout) == ([], [], []):
+            return
+
+        connection.poll()
+        while connection.notifies:
+            notify = connection.notifies.pop(0)
+            self.handle(parse(notify.payload))
+
+    def run(self):
+        while not self._stopped.is_set():
+            connection = None
+            try:
+                connection = self.connect()
+                self.catch_up()
+
+                while not self._stopped.is_set():
+                    self.poll(connection)
+            except Exception:
+                logger.exception("Error listening for journal notifications")
+                self._stopped.wait(self.retry_delay)
+            finally:
+                if connection is not None:
+                    try:
+                        connection.close()
+                    except Exception:
+                        pass
+
+    def start(self):
+        # Note where the journals are before this process can cache anything,
+        #   so that whatever is committed before we're listening is caught up
+        #   on once we are.
+        if self.serial is None:
+            self.serial = self.app.models.packaging.get_last_serial() or 0
+
+        self._thread = threading.Thread(target=self.run, name="listener")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+        if self._thread is not None:
+            self._thread.join()
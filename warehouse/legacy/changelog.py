@@ -0,0 +1,73 @@
+# Copyright 2013 Donald Stufft
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from __future__ import absolute_import, division, print_function
+from __future__ import unicode_literals
+
+import json
+
+from warehouse.helpers import url_for
+from warehouse.http import Response
+from warehouse.utils import cache
+
+
+def _serialize(entry):
+    submitted_date = entry.submitted_date
+    if submitted_date is not None:
+        submitted_date = submitted_date.isoformat()
+
+    return json.dumps(
+        {
+            "serial": entry.serial,
+            "name": entry.name,
+            "version": entry.version,
+            "action": entry.action,
+            "submitted_date": submitted_date,
+        },
+        sort_keys=True,
+    ) + "\n"
+
+
+@cache("changelog")
+def since(app, request, serial):
+    config = app.config.changelog
+
+    # Never hand out more than a bounded page, however many were asked for
+    limit = request.args.get("limit", config.page_size, type=int)
+    limit = max(1, min(limit, config.max_page_size))
+
+    entries = app.models.packaging.get_changelog(serial, limit)
+
+    # Encode the entries as they're sent instead of building one big body
+    resp = Response(
+        (_serialize(e) for e in entries),
+        mimetype="application/x-ndjson",
+    )
+
+    # A full page means there may be more, so point at the page which starts
+    #   after the last entry we've sent.
+    if len(entries) == limit:
+        next_url = url_for(
+            request, "warehouse.legacy.changelog.since",
+            serial=entries[-1].serial,
+            limit=limit,
+        )
+        resp.headers.add("Link", "<" + next_url + ">", rel="next")
+
+    # Add a header that points to the last serial
+    resp.headers.add(
+        "X-PyPI-Last-Serial",
+        app.models.packaging.get_last_serial(),
+    )
+
+    return resp
@@ -0,0 +1,327 @@
+# Copyright 2013 Donald Stufft
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from __future__ import absolute_import, division, print_function
+from __future__ import unicode_literals
+
+import errno
+import multiprocessing
+import os
+import os.path
+import tempfile
+
+from six.moves import map
+from werkzeug.exceptions import NotFound
+from werkzeug.test import create_environ
+
+from warehouse.http import Request
+from warehouse.legacy import simple
+from warehouse.packaging.normalization import normalize
+
+
+# The application used by the render functions, this is set in each worker
+#   process when it is started.
+_app = None
+
+
+def _init_worker(app):
+    global _app
+    _app = app
+
+
+def _make_request(app, path):
+    environ = create_environ(path)
+
+    request = Request(environ)
+    request.url_adapter = app.urls.bind_to_environ(environ)
+
+    return request
+
+
+def _write_atomic(path, chunks):
+    directory = os.path.dirname(path)
+
+    try:
+        os.makedirs(directory)
+    except OSError as exc:
+        if exc.errno != errno.EEXIST:
+            raise
+
+    # Write to a temporary file in the same directory and then rename it over
+    #   the final path so that readers never see a partially written file.
+    fd, tmppath = tempfile.mkstemp(dir=directory, prefix=".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as fp:
+            for chunk in chunks:
+                fp.write(chunk)
+
+        os.chmod(tmppath, 0o644)
+        os.rename(tmppath, path)
+    finally:
+        if os.path.exists(tmppath):
+            os.unlink(tmppath)
+
+
+def _index_path(directory):
+    return os.path.join(directory, "simple", "index.html")
+
+
+def _project_path(directory, name):
+    # Pages are written under the normalized name, which is the name that
+    #   installers ask for no matter how the project's name is spelled.
+    return os.path.join(directory, "simple", normalize(name), "index.html")
+
+
+def _alias_path(directory, name):
+    return os.path.join(directory, "simple", name)
+
+
+def _remove_page(path):
+    try:
+        os.unlink(path)
+        os.rmdir(os.path.dirname(path))
+    except OSError as exc:
+        if exc.errno != errno.ENOENT:
+            raise
+
+
+def _write_alias(directory, name):
+    # The index links to each project by its real name, so that has to lead
+    #   to the same page as the normalized one.
+    normalized = normalize(name)
+    if name == normalized:
+        return
+
+    path = _alias_path(directory, name)
+    if os.path.islink(path) and os.readlink(path) == normalized:
+        return
+
+    # Exports made before pages were written under their normalized names
+    #   have a page of their own here.
+    if not os.path.islink(path) and os.path.isdir(path):
+        _remove_page(os.path.join(path, "index.html"))
+
+    # Swap the link into place the same way that pages are written
+    tmppath = os.path.join(
+        os.path.dirname(path),
+        ".{}.{}.tmp".format(normalized, os.getpid()),
+    )
+    os.symlink(normalized, tmppath)
+    try:
+        os.rename(tmppath, path)
+    finally:
+        if os.path.lexists(tmppath):
+            os.unlink(tmppath)
+
+
+def render_index(app, directory):
+    request = _make_request(app, "/simple/")
+    resp = simple.index(app, request)
+
+    _write_atomic(_index_path(directory), resp.iter_encoded())
+
+
+def render_project(app, directory, name):
+    request = _make_request(app, "/simple/{}/".format(name))
+
+    try:
+        resp = simple.project(app, request, project_name=name)
+    except NotFound:
+        # The project has been removed since we started
+        return False
+
+    _write_atomic(_project_path(directory, name), resp.iter_encoded())
+    _write_alias(directory, name)
+
+    return True
+
+
+def _render_project(args):
+    directory, name = args
+    return name, render_project(_app, directory, name)
+
+
+def render_projects(app, directory, names, processes=None, batch_size=100):
+    """
+    Renders the simple page for each of ``names`` into ``directory``, using a
+    pool of worker processes unless ``processes`` is 1, yielding a
+    ``(name, written)`` pair for each project as it is rendered.
+    """
+    tasks = ((directory, name) for name in names)
+
+    if processes == 1:
+        _init_worker(app)
+        for result in map(_render_project, tasks):
+            yield result
+        return
+
+    # Make sure that none of our pooled connections are shared with the
+    #   worker processes, they'll each open their own.
+    app.engine.dispose()
+
+    pool = multiprocessing.Pool(
+        processes,
+        initializer=_init_worker,
+        initargs=(app,),
+    )
+    try:
+        for result in pool.imap_unordered(
+                _render_project, tasks, chunksize=batch_size):
+            yield result
+    finally:
+        pool.close()
+        pool.join()
+
+
+def remove_project(directory, name):
+    _remove_page(_project_path(directory, name))
+
+    if name != normalize(name):
+        path = _alias_path(directory, name)
+        if os.path.islink(path):
+            os.unlink(path)
+        else:
+            _remove_page(os.path.join(path, "index.html"))
+
+
+def _serial_path(directory):
+    return os.path.join(directory, ".last-serial")
+
+
+def _read_serial(directory):
+    try:
+        with open(_serial_path(directory), "rb") as fp:
+            return int(fp.read().strip())
+    except IOError as exc:
+        if exc.errno != errno.ENOENT:
+            raise
+
+
+def _write_serial(directory, serial):
+    _write_atomic(
+        _serial_path(directory),
+        ["{}\n".format(serial).encode("ascii")],
+    )
+
+
+def export_simple(app, directory, processes=None, batch_size=100):
+    # Look up the serial first so that a sync afterwards picks up any changes
+    #   which happen while we're exporting.
+    serial = app.models.packaging.get_last_serial()
+
+    names = (p.name for p in app.models.packaging.all_projects())
+    written = sum(
+        1 for _, w in render_projects(
+            app, directory, names,
+            processes=processes,
+            batch_size=batch_size,
+        )
+        if w
+    )
+
+    # Render the index last so that it never links to a missing page
+    render_index(app, directory)
+
+    _write_serial(directory, serial if serial is not None else 0)
+
+    return written
+
+
+def sync_simple(app, directory, processes=None, batch_size=100):
+    """
+    Brings the rendered /simple/ tree in ``directory`` up to date with the
+    journals, re-rendering only the projects that have changed since the
+    last sync, and returns the number of projects that were processed.
+    """
+    since = _read_serial(directory)
+
+    # If this directory has never been exported then we need all of it
+    if since is None:
+        return export_simple(
+            app, directory,
+            processes=processes,
+            batch_size=batch_size,
+        )
+
+    changed = app.models.packaging.get_changed_projects(since)
+
+    if not changed:
+        return 0
+
+    existed = {
+        name: os.path.exists(_project_path(directory, name))
+        for name in changed
+    }
+
+    update_index = False
+    for name, written in render_projects(
+            app, directory, changed,
+            processes=processes,
+            batch_size=batch_size):
+        if not written:
+            remove_project(directory, name)
+
+        # The index only needs to be re-rendered if a project has been added
+        #   or removed.
+        if written != existed[name]:
+            update_index = True
+
+    if update_index:
+        render_index(app, directory)
+
+    _write_serial(directory, max(changed.values()))
+
+    return len(changed)
+
+
+class ExportSimpleCommand(object):
+
+    def __call__(self, app, directory, processes, batch_size):
+        written = export_simple(
+            app, directory,
+            processes=processes,
+            batch_size=batch_size,
+        )
+
+        print("Exported {} projects to {}".format(written, directory))
+
+    def create_parser(self, parser):
+        parser.add_argument(
+            "directory",
+            help="The directory to write the /simple/ tree into",
+        )
+        parser.add_argument(
+            "-p", "--processes",
+            default=None,
+            type=int,
+            help="The number of worker processes, defaults to the CPU count",
+        )
+        parser.add_argument(
+            "-b", "--batch-size",
+            default=100,
+            type=int,
+            dest="batch_size",
+            help="The number of projects handed to a worker at a time",
+        )
+
+
+class SyncSimpleCommand(ExportSimpleCommand):
+
+    def __call__(self, app, directory, processes, batch_size):
+        synced = sync_simple(
+            app, directory,
+            processes=processes,
+            batch_size=batch_size,
+        )
+
+        print("Synced {} projects to {}".format(synced, directory))
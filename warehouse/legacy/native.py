@@ -0,0 +1,142 @@
+# Copyright 2013 Donald Stufft
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Renders the legacy simple pages without going through Jinja2.
+
+The output of these renderers must stay byte for byte identical to the output
+of the templates in ``templates/simple/``, any change to those templates needs
+to be made here as well.
+"""
+from __future__ import absolute_import, division, print_function
+from __future__ import unicode_literals
+
+import re
+
+from werkzeug.urls import url_quote
+
+from warehouse.helpers import url_for
+from warehouse.http import Response
+from warehouse.utils import STREAM_BUFFER_SIZE
+
+
+# simple/base.html, split around its title and content blocks
+BASE_HEADER = "<!DOCTYPE html>\n<html>\n  <head>\n    <title>"
+BASE_TITLE_END = (
+    "</title>\n"
+    "    <meta name=\"api-version\" value=\"2\" />\n"
+    "    <style>a { display: block; }</style>\n"
+    "  </head>\n"
+    "  <body>\n"
+    "    "
+)
+BASE_FOOTER = "\n\n  </body>\n</html>"
+
+# simple/index.html
+INDEX_HEADER = BASE_HEADER + "Simple Index" + BASE_TITLE_END + "\n  "
+INDEX_PROJECT = "<a href=\"%s\">\n      %s\n    </a>\n  "
+
+# simple/detail.html
+DETAIL_HEADING = "\n  <h1>Links for %s</h1>\n\n  "
+DETAIL_FILE = "<a rel=\"internal\" href=\"%s\">%s</a>\n  "
+DETAIL_PROJECT_URL = "<a rel=\"%s\" href=\"%s\">%s</a>\n  "
+DETAIL_EXTERNAL_URL = "<a rel=\"external\" href=\"%s\">%s</a>\n  "
+DETAIL_SECTION_END = "\n\n  "
+
+# Names which url_quote() would return unchanged
+_SAFE_NAME = re.compile(r"^[A-Za-z0-9_\-]+(\.[A-Za-z0-9_\-]+)*$")
+
+
+def _project_url(request, prefix, name):
+    # Nearly every name is made up of characters that don't need quoting
+    if _SAFE_NAME.match(name):
+        return prefix + name + "/"
+
+    # Werkzeug resolves any dot segments in the URLs that it builds, so let
+    #   it build those few itself.
+    segments = name.split("/")
+    if "." in segments or ".." in segments:
+        return url_for(
+            request, "warehouse.legacy.simple.project",
+            project_name=name,
+        )
+
+    return prefix + url_quote(name) + "/"
+
+
+def render_index(request, projects, project_paths=None):
+    prefix = url_for(request, "warehouse.legacy.simple.index")
+
+    if project_paths is None:
+        project_paths = {}
+
+    yield INDEX_HEADER
+
+    batch = []
+    for project in projects:
+        name = project.name
+
+        # Use the precomputed path for this project if we have one
+        path = project_paths.get(name)
+        if path is not None:
+            url = prefix + path + "/"
+        else:
+            url = _project_url(request, prefix, name)
+
+        batch.append(INDEX_PROJECT % (url, name))
+
+        if len(batch) >= STREAM_BUFFER_SIZE:
+            yield "".join(batch)
+            batch = []
+
+    if batch:
+        yield "".join(batch)
+
+    yield BASE_FOOTER
+
+
+def render_detail(request, project, files, project_urls, external_urls=(),
+                  **variables):
+    # The detail view passes the external urls as externals, which the
+    #   template ignores, so we do as well.
+    yield "".join([
+        BASE_HEADER,
+        "Links for %s" % project.name,
+        BASE_TITLE_END,
+        DETAIL_HEADING % project.name,
+        "".join([DETAIL_FILE % (f.url, f.filename) for f in files]),
+        DETAIL_SECTION_END,
+        "".join([
+            DETAIL_PROJECT_URL % (u["rel"], u["url"], u["name"])
+            for u in project_urls
+        ]),
+        DETAIL_SECTION_END,
+        "".join([DETAIL_EXTERNAL_URL % (u, u) for u in external_urls]),
+        BASE_FOOTER,
+    ])
+
+
+RENDERERS = {
+    "legacy/simple/index.html": render_index,
+    "legacy/simple/detail.html": render_detail,
+}
+
+
+def render_response(app, request, template, **variables):
+    output = "".join(RENDERERS[template](request, **variables))
+    return Response(output, mimetype="text/html")
+
+
+def stream_response(app, request, template, **variables):
+    output = RENDERERS[template](request, **variables)
+    return Response(output, mimetype="text/html")
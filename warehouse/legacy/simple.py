@@ -14,64 +14,327 @@
 from __future__ import absolute_import, division, print_function
 from __future__ import unicode_literals
 
+import json
 import os.path
-import re
+import time
+
+from collections import namedtuple
 
 import six
 
-from werkzeug.exceptions import NotFound
+from werkzeug.exceptions import BadRequest, NotFound
+from werkzeug.http import quote_etag
 from werkzeug.security import safe_join
+from werkzeug.urls import url_join, url_quote
 from werkzeug.wsgi import wrap_file
 
+from warehouse import compression
 from warehouse.helpers import url_for
 from warehouse.http import Response
-from warehouse.utils import cache, get_mimetype, render_response
+from warehouse.legacy import native
+from warehouse.packaging.normalization import normalize
+from warehouse.utils import (
+    cache, get_mimetype, render_response, stream_response,
+)
+
+
+CachedPage = namedtuple(
+    "CachedPage",
+    ["name", "serial", "checked", "data", "headers", "variants"],
+)
+
+# The key that the index page is cached under, project names can't be empty
+#   so this can't clash with a project's page.
+INDEX_KEY = ""
+
+# The representations that each simple page can be sent as, the first of
+#   which is sent when the client doesn't prefer either of them.
+FORMATS = ["html", "json"]
+
+JSON_MIMETYPE = "application/vnd.pypi.simple.v1+json"
+
+# The media types that a client can ask for and the format that they get
+MEDIA_TYPES = [
+    ("text/html", "html"),
+    ("application/vnd.pypi.simple.v1+html", "html"),
+    (JSON_MIMETYPE, "json"),
+    ("application/json", "json"),
+]
+
+JSON_META = {"api-version": "1.0"}
+
+# Tells a missing value apart from a cached None
+_MISSING = object()
+
+CachedFile = namedtuple(
+    "CachedFile",
+    ["project", "md5_digest", "serial", "size", "mtime", "checked"],
+)
+
+
+def _get_renderer(app, stream=False):
+    # The native renderer produces exactly the same output as the templates
+    #   without the overhead of Jinja2.
+    if app.config.simple.renderer == "native":
+        return native.stream_response if stream else native.render_response
+
+    return stream_response if stream else render_response
+
+
+def page_key(key, fmt="html"):
+    # Project names can't contain a "~", so the other formats of a page can
+    #   be cached alongside it without clashing with another project's page.
+    if fmt == "html":
+        return key
+
+    return "{}~{}".format(key, fmt)
+
+
+def _negotiate_format(request):
+    # Clients which don't tell us what they accept get the HTML pages that
+    #   they have always gotten.
+    if "Accept" not in request.headers:
+        return FORMATS[0]
+
+    best, best_quality = FORMATS[0], 0
+    for mimetype, fmt in MEDIA_TYPES:
+        quality = request.accept_mimetypes[mimetype]
+        if quality > best_quality:
+            best, best_quality = fmt, quality
+
+    return best
+
+
+def _json_response(data):
+    # The stdlib encoder is implemented in C as long as we don't ask it to
+    #   indent or sort anything, and the separators keep the output compact.
+    return Response(
+        json.dumps(data, separators=(",", ":")),
+        mimetype=JSON_MIMETYPE,
+    )
+
+
+def _negotiate_encoding(app, request):
+    encodings = compression.available(app.config.simple.compression)
+
+    if not encodings:
+        return
+
+    return compression.negotiate(request.accept_encodings, encodings)
+
+
+def _page_response(app, request, page, key):
+    resp = Response(page.data, headers=page.headers)
+
+    if not app.config.simple.compression:
+        return resp
+
+    # The body of this response depends on the client's Accept-Encoding
+    resp.vary.add("Accept-Encoding")
+
+    encoding = _negotiate_encoding(app, request)
+    if encoding is None:
+        return resp
+
+    # Compress the page the first time each encoding is asked for, and keep
+    #   the result alongside the cached page so that we can reuse it until
+    #   the page changes.
+    data = page.variants.get(encoding)
+    if data is None:
+        data = compression.compress(page.data, encoding)
+
+        variants = dict(page.variants)
+        variants[encoding] = data
+        app.caches["pages"].set(key, page._replace(variants=variants))
+
+    resp.set_data(data)
+    resp.headers["Content-Encoding"] = encoding
+
+    # Each encoding is a different representation so it needs its own ETag
+    etag, weak = resp.get_etag()
+    if etag is not None:
+        resp.set_etag("{}-{}".format(etag, encoding), weak)
+
+    return resp
+
+
+def _store_page(app, request, key, name, serial, resp):
+    pages = app.caches.get("pages")
+
+    # There's nowhere to store the page, so send the response as is. Pages
+    #   are only ever compressed once they're cached, which the application
+    #   makes sure of when compression is turned on.
+    if pages is None:
+        return resp
+
+    page = CachedPage(
+        name=name,
+        serial=serial,
+        checked=time.time(),
+        data=resp.get_data(),
+        headers=list(resp.headers),
+        variants={},
+    )
+
+    # Store the rendered page so that later requests can skip rendering it
+    pages.set(key, page)
+
+    return _page_response(app, request, page, key)
+
+
+def _make_etag(app, serial, fmt="html"):
+    if serial is None:
+        return
+
+    # A page only changes when its serial does, or when our templates do
+    if fmt == "html":
+        return "{}-{}".format(serial, app.template_version)
+
+    # The other formats don't use the templates, but they still need an ETag
+    #   of their own.
+    return "{}-{}".format(serial, fmt)
+
+
+def _not_modified(app, request, serial, fmt="html"):
+    etag = _make_etag(app, serial, fmt)
+
+    if etag is None or "If-None-Match" not in request.headers:
+        return
+
+    # The client may be holding onto a compressed variant of the page
+    encoding = _negotiate_encoding(app, request)
+    if encoding is not None:
+        etag = "{}-{}".format(etag, encoding)
+
+    if not request.if_none_match.contains_weak(etag):
+        return
+
+    resp = Response(status=304)
+    resp.set_etag(etag)
+    resp.headers["X-PyPI-Last-Serial"] = serial
+    resp.headers.add("Vary", "Accept")
+
+    if app.config.simple.compression:
+        resp.vary.add("Accept-Encoding")
+
+    return resp
+
+
+def _render_index(app, request, fmt):
+    projects = app.models.packaging.all_projects()
+
+    if fmt == "json":
+        return _json_response({
+            "meta": JSON_META,
+            "projects": [{"name": project.name} for project in projects],
+        })
+
+    # The index is large enough that we'd rather send it as it's rendered
+    #   than build the entire page in memory, if we've been configured to and
+    #   we aren't going to need the entire page anyways.
+    stream = app.config.simple.stream and app.caches.get("pages") is None
+    render = _get_renderer(app, stream=stream)
+
+    variables = {"projects": projects}
+
+    # The native renderer can link to each project using the paths that the
+    #   model keeps instead of building a URL for each one.
+    if app.config.simple.renderer == "native":
+        variables["project_paths"] = app.models.packaging.get_project_paths()
+
+    return render(app, request, "legacy/simple/index.html", **variables)
 
 
 @cache("simple")
 def index(app, request):
-    projects = app.models.packaging.all_projects()
-    resp = render_response(
-        app, request, "legacy/simple/index.html",
-        projects=projects,
-    )
+    fmt = _negotiate_format(request)
+    key = page_key(INDEX_KEY, fmt)
+
+    page = _get_cached_page(app, key)
+
+    # Look up the serial before we render so that the page we store is never
+    #   newer than the serial it is stored with.
+    if page is not None:
+        serial = page.serial
+    else:
+        serial = app.models.packaging.get_last_serial()
+
+    # If the client already has this version of the index then we're done
+    resp = _not_modified(app, request, serial, fmt)
+    if resp is not None:
+        return resp
+
+    # Return our cached copy of the index if it is still up to date
+    if page is not None:
+        return _page_response(app, request, page, key)
+
+    resp = _render_index(app, request, fmt)
 
     # Add our surrogate key headers for Fastly
     if app.config.fastly:
         resp.headers.add("Surrogate-Key", "simple-index")
 
     # Add a header that points to the last serial
-    serial = app.models.packaging.get_last_serial()
     resp.headers.add("X-PyPI-Last-Serial", serial)
 
-    return resp
+    etag = _make_etag(app, serial, fmt)
+    if etag is not None:
+        resp.headers["ETag"] = quote_etag(etag)
 
+    # The same URL serves every format, so caches need to tell them apart
+    resp.headers.add("Vary", "Accept")
 
-@cache("simple")
-def project(app, request, project_name):
-    # Get the real project name for this project
-    project = app.models.packaging.get_project(project_name)
+    return _store_page(app, request, key, None, serial, resp)
 
-    if project is None:
-        raise NotFound("{} does not exist".format(project_name))
 
-    # Normalize the project name
-    normalized = re.sub("_", "-", project.name, re.I).lower()
+def _get_cached_page(app, key):
+    pages = app.caches.get("pages")
+
+    if pages is None:
+        return
 
-    # Generate the Package URLs for the packages we've hosted
-    file_urls = app.models.packaging.get_file_urls(project.name)
+    page = pages.get(key)
 
-    # Determine what the hosting mode is for this package
-    hosting_mode = app.models.packaging.get_hosting_mode(project.name)
+    if page is None:
+        return
+
+    # If we've checked this page recently enough then trust it without going
+    #   back to the database at all.
+    now = time.time()
+    ttl = app.config.cache.pages.get("ttl")
+    if ttl and now - page.checked < ttl:
+        return page
+
+    # Otherwise make sure that nothing has changed for this project since we
+    #   cached the page.
+    serial = app.models.packaging.get_last_serial(page.name)
+    if serial != page.serial:
+        pages.delete(key)
+        return
+
+    page = page._replace(checked=now)
+    pages.set(key, page)
+
+    return page
+
+
+def _render_project(app, request, project_name):
+    # Fetch everything we need to render this page in a single query
+    data = app.models.packaging.get_simple_page_data(project_name)
+
+    if data is None:
+        raise NotFound("{} does not exist".format(project_name))
 
     project_urls = []
-    if hosting_mode in {"pypi-scrape-crawl", "pypi-scrape"}:
-        rel_prefix = "" if hosting_mode == "pypi-scrape-crawl" else "ext-"
+    if data.hosting_mode in {"pypi-scrape-crawl", "pypi-scrape"}:
+        rel_prefix = (
+            "" if data.hosting_mode == "pypi-scrape-crawl" else "ext-"
+        )
         home_rel = "{}homepage".format(rel_prefix)
         download_rel = "{}download".format(rel_prefix)
 
         # Generate the Homepage and Download URL links
-        release_urls = app.models.packaging.get_release_urls(project.name)
+        release_urls = data.release_urls
         for version, (home_page, download_url) in six.iteritems(release_urls):
             if home_page and home_page != "UNKNOWN":
                 project_urls.append({
@@ -87,29 +350,113 @@ def project(app, request, project_name):
                     "name": "{} download_url".format(version),
                 })
 
-    # Fetch the explicitly provided URLs
-    external_urls = app.models.packaging.get_external_urls(project.name)
+    render = _get_renderer(app)
 
-    resp = render_response(
+    resp = render(
         app, request,
         "legacy/simple/detail.html",
-        project=project,
-        files=file_urls,
+        project=data.project,
+        files=data.files,
         project_urls=project_urls,
-        externals=external_urls,
+        externals=data.external_urls,
     )
 
+    return data.project, data.serial, resp
+
+
+def _project_json(request, data):
+    # The file urls are relative to the project's simple page
+    project_url = url_for(
+        request, "warehouse.legacy.simple.project",
+        project_name=data.project.name,
+    )
+
+    return {
+        "name": data.project.name,
+        "serial": data.serial,
+        "files": [
+            {
+                "filename": f.filename,
+                "url": url_join(project_url, f.url),
+                "md5_digest": f.md5_digest,
+            }
+            for f in data.files
+        ],
+    }
+
+
+def _render_project_json(app, request, project_name):
+    # The batch query already fetches everything that the JSON page needs,
+    #   including the md5 digests which the HTML only has in its urls.
+    data = app.models.packaging.get_simple_batch([project_name]).get(
+        normalize(project_name),
+    )
+
+    if data is None:
+        raise NotFound("{} does not exist".format(project_name))
+
+    page = _project_json(request, data)
+    page["meta"] = JSON_META
+
+    return data.project, data.serial, _json_response(page)
+
+
+@cache("simple")
+def project(app, request, project_name):
+    fmt = _negotiate_format(request)
+
+    # Pages are cached under the same normalization the database uses to
+    #   look up the real project name.
+    key = page_key(normalize(project_name), fmt)
+
+    page = _get_cached_page(app, key)
+
+    # Projects which don't exist can be turned away without rendering
+    #   anything when every project name is kept in memory, which only needs
+    #   the last serial unless cache.projects has a ttl.
+    if page is None and app.models.packaging.use_project_index:
+        project = app.models.packaging.get_project(project_name)
+        if project is None:
+            raise NotFound("{} does not exist".format(project_name))
+        project_name = project.name
+
+    # If the client already has this version of the page then we're done,
+    #   which we can tell with just the project's serial.
+    if page is not None or "If-None-Match" in request.headers:
+        if page is not None:
+            serial = page.serial
+        else:
+            serial = app.models.packaging.get_project_serial(project_name)
+
+        resp = _not_modified(app, request, serial, fmt)
+        if resp is not None:
+            return resp
+
+    # Return our cached copy of this page if it is still up to date
+    if page is not None:
+        return _page_response(app, request, page, key)
+
+    if fmt == "json":
+        project, serial, resp = _render_project_json(
+            app, request, project_name,
+        )
+    else:
+        project, serial, resp = _render_project(app, request, project_name)
+
     # Add our surrogate key headers for Fastly
     if app.config.fastly:
         resp.headers.add(
             "Surrogate-Key",
-            " ".join(["simple", "simple~{}".format(normalized)]),
+            " ".join(["simple", "simple~{}".format(normalize(project.name))]),
         )
 
     # Add a header that points to the last serial
-    serial = app.models.packaging.get_last_serial(project.name)
     resp.headers.add("X-PyPI-Last-Serial", serial)
 
+    etag = _make_etag(app, serial, fmt)
+    if etag is not None:
+        resp.headers["ETag"] = quote_etag(etag)
+
     # Add a Link header to point at the canonical URL
     can_url = url_for(
         request, "warehouse.legacy.simple.project",
@@ -118,9 +465,113 @@ def project(app, request, project_name):
     )
     resp.headers.add("Link", "<" + can_url + ">", rel="canonical")
 
+    # The same URL serves every format, so caches need to tell them apart
+    resp.headers.add("Vary", "Accept")
+
+    return _store_page(app, request, key, project.name, serial, resp)
+
+
+@cache("simple")
+def batch(app, request):
+    names = request.values.getlist("name")
+
+    if not names:
+        raise BadRequest("No projects were given")
+
+    if len(names) > app.config.simple.batch_size:
+        raise BadRequest(
+            "No more than {} projects may be requested at once".format(
+                app.config.simple.batch_size,
+            )
+        )
+
+    # Fetch every project in a single set of queries instead of one per name
+    results = app.models.packaging.get_simple_batch(names)
+
+    projects, missing, keys = {}, [], ["simple"]
+    for name in names:
+        data = results.get(normalize(name))
+        if data is None:
+            missing.append(name)
+            continue
+
+        projects[name] = _project_json(request, data)
+        keys.append("simple~{}".format(normalize(data.project.name)))
+
+    resp = Response(
+        json.dumps({"projects": projects, "missing": missing}, sort_keys=True),
+        mimetype="application/json",
+    )
+
+    # Add our surrogate key headers for Fastly
+    if app.config.fastly:
+        resp.headers.add("Surrogate-Key", " ".join(sorted(set(keys))))
+
+    # Add a header that points to the last serial of any of the projects
+    serials = [p["serial"] for p in projects.values() if p["serial"]]
+    if serials:
+        resp.headers.add("X-PyPI-Last-Serial", max(serials))
+
     return resp
 
 
+def file_project_key(name):
+    # Filenames can't contain a "/", so this can't clash with any file's key
+    return "/{}".format(normalize(name))
+
+
+def _get_file_metadata(app, filename, filepath):
+    files = app.caches.get("files")
+    now = time.time()
+
+    meta = files.get(filename) if files is not None else None
+
+    # The serial of each project is kept under a key of its own as well, and
+    #   evicting a project only deletes that key. Any file whose serial no
+    #   longer matches it has to be looked up again.
+    if meta is not None:
+        serial = files.get(file_project_key(meta.project.name), _MISSING)
+        if serial != meta.serial:
+            meta = None
+
+    if meta is not None:
+        # Files never change once they've been uploaded, so the only thing
+        #   that can be out of date is the serial of their project.
+        ttl = app.config.cache.files.get("ttl")
+        if ttl and now - meta.checked < ttl:
+            return meta
+
+        meta = meta._replace(
+            serial=app.models.packaging.get_last_serial(meta.project.name),
+            checked=now,
+        )
+    else:
+        data = app.models.packaging.get_file_metadata(filename)
+
+        if data is None:
+            raise NotFound("{} was not found".format(filename))
+
+        try:
+            stat = os.stat(filepath)
+        except OSError:
+            raise NotFound("{} was not found".format(filename))
+
+        meta = CachedFile(
+            project=data.project,
+            md5_digest=data.md5_digest,
+            serial=data.serial,
+            size=stat.st_size,
+            mtime=stat.st_mtime,
+            checked=now,
+        )
+
+    if files is not None:
+        files.set(filename, meta)
+        files.set(file_project_key(meta.project.name), meta.serial)
+
+    return meta
+
+
 @cache("packages")
 def package(app, request, path):
     # Get our filename and filepath from the request path
@@ -135,22 +586,38 @@ def package(app, request, path):
     if filepath is None:
         raise NotFound("{} was not found".format(filename))
 
-    # Open the file and attempt to wrap in the wsgi.file_wrapper if it's
-    #   available, otherwise read it directly.
-    try:
-        fp = open(filepath, "rb")
-        data = wrap_file(request.environ, fp)
-    except IOError:
-        raise NotFound("{} was not found".format(filename))
-
-    # Get the project name and normalize it
-    project = app.models.packaging.get_project_for_filename(filename)
-    normalized = re.sub("_", "-", project.name, re.I).lower()
+    headers = {}
 
-    # Get the MD5 hash of the file
-    content_md5 = app.models.packaging.get_filename_md5(filename)
+    # Determine if the front end server is going to be sending the file
+    delivery = app.config.paths.packages_delivery
+    offload = delivery in {"x-accel-redirect", "x-sendfile"}
+
+    if offload:
+        # Leave actually sending the file to the front end server, we'll make
+        #   sure the file exists when we look up its metadata.
+        data = []
+
+        if delivery == "x-accel-redirect":
+            headers["X-Accel-Redirect"] = "/".join([
+                app.config.paths.packages_internal.rstrip("/"),
+                url_quote(path),
+            ])
+        else:
+            headers["X-Sendfile"] = filepath
+    else:
+        # Open the file and attempt to wrap in the wsgi.file_wrapper if it's
+        #   available, otherwise read it directly.
+        try:
+            fp = open(filepath, "rb")
+            data = wrap_file(request.environ, fp)
+        except IOError:
+            raise NotFound("{} was not found".format(filename))
+
+    # Get the project, MD5 hash, size, and mtime of the file
+    meta = _get_file_metadata(app, filename, filepath)
 
-    headers = {}
+    # Normalize the project name
+    normalized = normalize(meta.project.name)
 
     # Add in additional headers if we're using Fastly
     if app.config.fastly:
@@ -161,10 +628,9 @@ def package(app, request, path):
             ]),
         })
 
-    # Look up the last serial for this file
-    serial = app.models.packaging.get_last_serial(project.name)
-    if serial is not None:
-        headers["X-PyPI-Last-Serial"] = serial
+    # Add a header that points to the last serial for this file
+    if meta.serial is not None:
+        headers["X-PyPI-Last-Serial"] = meta.serial
 
     # Pass through the data directly to the response object
     resp = Response(
@@ -175,16 +641,23 @@ def package(app, request, path):
     )
 
     # Setup the Last-Modified header
-    resp.last_modified = os.path.getmtime(filepath)
+    resp.last_modified = meta.mtime
 
-    # Setup the Content-Length header
-    resp.content_length = os.path.getsize(filepath)
+    # Setup the Content-Length header, unless the front end server is going
+    #   to be sending the file in which case it will set it.
+    if not offload:
+        resp.content_length = meta.size
 
     # Setup the Content-MD5 headers
-    resp.content_md5 = content_md5
+    resp.content_md5 = meta.md5_digest
 
     # Setup Conditional Responses
-    resp.set_etag(content_md5)
+    resp.set_etag(meta.md5_digest)
     resp.make_conditional(request)
 
+    # Setup Partial Responses, the front end server handles these itself when
+    #   it is sending the file.
+    if not offload:
+        resp.make_ranged(request, fp, resp.content_length)
+
     return resp
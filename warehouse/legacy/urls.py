@@ -22,6 +22,18 @@ __urls__ = [
             Rule("/", methods=["GET"], endpoint="index"),
             Rule("/<project_name>/", methods=["GET"], endpoint="project"),
         ]),
+        Rule(
+            "/batch/simple/",
+            methods=["GET", "POST"],
+            endpoint="batch",
+        ),
         Rule("/packages/<path:path>", methods=["GET"], endpoint="package"),
     ]),
+    EndpointPrefix("warehouse.legacy.changelog.", [
+        Rule(
+            "/changelog/since/<int:serial>",
+            methods=["GET"],
+            endpoint="since",
+        ),
+    ]),
 ]
@@ -0,0 +1,77 @@
+# Copyright 2013 Donald Stufft
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Maintain a PEP 503 normalized name for every project
+
+Revision ID: 2f4c9e7a1b05
+Revises: 4c1e5b1a9f3d
+Create Date: 2014-05-26 20:14:37.880142
+"""
+from __future__ import absolute_import, division, print_function
+
+# revision identifiers, used by Alembic.
+revision = "2f4c9e7a1b05"
+down_revision = "4c1e5b1a9f3d"
+
+from alembic import op
+
+
+def upgrade():
+    # This must match warehouse.packaging.normalization.normalize()
+    op.execute(
+        """ CREATE FUNCTION normalize_project_name(text) RETURNS text AS $$
+                SELECT lower(regexp_replace($1, '[-_.]+', '-', 'g'))
+            $$ LANGUAGE SQL IMMUTABLE RETURNS NULL ON NULL INPUT
+        """
+    )
+
+    op.execute(
+        "UPDATE packages SET normalized_name = normalize_project_name(name)"
+    )
+
+    # Keep the normalized name up to date, even when the project is written
+    #   by something other than us.
+    op.execute(
+        """ CREATE FUNCTION update_normalized_name() RETURNS trigger AS $$
+            BEGIN
+                NEW.normalized_name := normalize_project_name(NEW.name);
+                RETURN NEW;
+            END;
+            $$ LANGUAGE plpgsql
+        """
+    )
+    op.execute(
+        """ CREATE TRIGGER packages_normalized_name
+            BEFORE INSERT OR UPDATE OF name, normalized_name ON packages
+            FOR EACH ROW EXECUTE PROCEDURE update_normalized_name()
+        """
+    )
+
+    # This will fail if there are projects whose names only differ in their
+    #   separators, those must be resolved by hand first.
+    op.alter_column("packages", "normalized_name", nullable=False)
+    op.create_index(
+        "packages_normalized_name_idx",
+        "packages",
+        ["normalized_name"],
+        unique=True,
+    )
+
+
+def downgrade():
+    op.drop_index("packages_normalized_name_idx", "packages")
+    op.alter_column("packages", "normalized_name", nullable=True)
+    op.execute("DROP TRIGGER packages_normalized_name ON packages")
+    op.execute("DROP FUNCTION update_normalized_name()")
+    op.execute("DROP FUNCTION normalize_project_name(text)")
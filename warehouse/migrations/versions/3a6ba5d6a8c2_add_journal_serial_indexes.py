@@ -0,0 +1,99 @@
+# Copyright 2013 Donald Stufft
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Add indexes and a maintained table for the last serial of each project
+
+Revision ID: 3a6ba5d6a8c2
+Revises: 77e04097be5
+Create Date: 2014-05-12 21:08:44.512306
+"""
+from __future__ import absolute_import, division, print_function
+
+# revision identifiers, used by Alembic.
+revision = "3a6ba5d6a8c2"
+down_revision = "77e04097be5"
+
+import sqlalchemy as sa
+
+from alembic import op
+
+
+def upgrade():
+    # Lets max(id) be answered from the end of an index, both for the whole
+    #   journal and for a single project.
+    op.create_index("journals_id_idx", "journals", ["id"])
+    op.create_index("journals_name_id_idx", "journals", ["name", "id"])
+
+    op.create_table("package_serials",
+        sa.Column("name", sa.TEXT(), primary_key=True, nullable=False),
+        sa.Column("last_serial", sa.Integer(), nullable=False),
+    )
+
+    op.execute(
+        """ INSERT INTO package_serials (name, last_serial)
+            SELECT name, max(id)
+            FROM journals
+            WHERE name IS NOT NULL
+            GROUP BY name
+        """
+    )
+
+    # Journals are only ever appended to, so keeping the table up to date
+    #   only requires looking at new rows. This is the update or insert loop
+    #   from the PostgreSQL documentation, since we support servers which
+    #   predate INSERT ... ON CONFLICT.
+    op.execute(
+        """ CREATE FUNCTION update_package_serial() RETURNS trigger AS $$
+            BEGIN
+                IF NEW.name IS NULL THEN
+                    RETURN NULL;
+                END IF;
+
+                LOOP
+                    UPDATE package_serials
+                    SET last_serial = GREATEST(last_serial, NEW.id)
+                    WHERE name = NEW.name;
+
+                    IF FOUND THEN
+                        RETURN NULL;
+                    END IF;
+
+                    -- Another transaction may add the same project before
+                    --   we do, in which case we go back and update it.
+                    BEGIN
+                        INSERT INTO package_serials (name, last_serial)
+                        VALUES (NEW.name, NEW.id);
+                        RETURN NULL;
+                    EXCEPTION WHEN unique_violation THEN
+                        -- Loop around and try the update again
+                    END;
+                END LOOP;
+            END;
+            $$ LANGUAGE plpgsql
+        """
+    )
+    op.execute(
+        """ CREATE TRIGGER journals_package_serial
+            AFTER INSERT ON journals
+            FOR EACH ROW EXECUTE PROCEDURE update_package_serial()
+        """
+    )
+
+
+def downgrade():
+    op.execute("DROP TRIGGER journals_package_serial ON journals")
+    op.execute("DROP FUNCTION update_package_serial()")
+    op.drop_table("package_serials")
+    op.drop_index("journals_name_id_idx", "journals")
+    op.drop_index("journals_id_idx", "journals")
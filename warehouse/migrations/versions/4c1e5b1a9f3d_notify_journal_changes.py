@@ -0,0 +1,65 @@
+# Copyright 2013 Donald Stufft
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Notify listeners of new journal entries
+
+Revision ID: 4c1e5b1a9f3d
+Revises: 3a6ba5d6a8c2
+Create Date: 2014-05-19 18:42:10.204718
+"""
+from __future__ import absolute_import, division, print_function
+
+# revision identifiers, used by Alembic.
+revision = "4c1e5b1a9f3d"
+down_revision = "3a6ba5d6a8c2"
+
+from alembic import op
+
+
+def upgrade():
+    # Notifications are only delivered once the transaction that inserted
+    #   the journal entry commits, so listeners never see uncommitted data.
+    op.execute(
+        """ CREATE FUNCTION notify_journal() RETURNS trigger AS $$
+            BEGIN
+                -- row_to_json() is the only way to build JSON that
+                --   PostgreSQL 9.2 has.
+                PERFORM pg_notify(
+                    'journals',
+                    (
+                        SELECT row_to_json(payload)::text
+                        FROM (
+                            SELECT
+                                NEW.id AS serial,
+                                NEW.name AS name,
+                                NEW.action AS action
+                        ) AS payload
+                    )
+                );
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql
+        """
+    )
+    op.execute(
+        """ CREATE TRIGGER journals_notify
+            AFTER INSERT ON journals
+            FOR EACH ROW EXECUTE PROCEDURE notify_journal()
+        """
+    )
+
+
+def downgrade():
+    op.execute("DROP TRIGGER journals_notify ON journals")
+    op.execute("DROP FUNCTION notify_journal()")
@@ -0,0 +1,245 @@
+# Copyright 2013 Donald Stufft
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Keeps the name of every project in memory without an object per project.
+
+The names are encoded into a single buffer with an ``array`` of offsets into
+it, which takes a few bytes per project on top of the names themselves, where
+a list of :class:`~warehouse.packaging.models.Project` takes around a hundred.
+"""
+from __future__ import absolute_import, division, print_function
+from __future__ import unicode_literals
+
+from array import array
+
+from warehouse.packaging.normalization import normalize
+
+
+# Python 2's array only accepts a native string as its typecode
+OFFSET_TYPECODE = str("I")
+
+
+def _pack(values):
+    offsets = array(OFFSET_TYPECODE, [0])
+    for value in values:
+        offsets.append(offsets[-1] + len(value))
+
+    return b"".join(values), offsets
+
+
+def _splice(data, offsets, removed, inserted):
+    # Copies the runs between the positions that change a slice at a time,
+    #   so that only the offsets need to be touched one by one. Returns the
+    #   new data and offsets along with the new position of each of the old
+    #   values, and of each of the ``inserted`` ones.
+    removed = set(removed)
+    inserts = {}
+    for position, value in inserted:
+        inserts.setdefault(position, []).append(value)
+
+    chunks = []
+    new_offsets = array(OFFSET_TYPECODE, [0])
+    moved = array(OFFSET_TYPECODE)
+    placed = []
+
+    points = sorted(removed.union(inserts, [len(offsets) - 1]))
+
+    start = 0
+    for point in points:
+        if point > start:
+            shift = new_offsets[-1] - offsets[start]
+            moved.extend(range(
+                len(new_offsets) - 1,
+                len(new_offsets) - 1 + point - start,
+            ))
+            chunks.append(data[offsets[start]:offsets[point]])
+            new_offsets.extend(
+                [offset + shift for offset in offsets[start + 1:point + 1]]
+            )
+
+        for value in inserts.get(point, []):
+            placed.append(len(new_offsets) - 1)
+            chunks.append(value)
+            new_offsets.append(new_offsets[-1] + len(value))
+
+        if point in removed:
+            # Nothing refers to a removed value anymore
+            moved.append(0)
+            start = point + 1
+        else:
+            start = point
+
+    return b"".join(chunks), new_offsets, moved, placed
+
+
+def index_sort_key(name):
+    """
+    The key that sorts project names into the order that the index page has
+    always listed them in.
+    """
+    return name.lower(), name
+
+
+class ProjectIndex(object):
+    """
+    An immutable, sorted collection of project names as of the journal entry
+    ``serial``. Iterating over it gives each name in the order of the index
+    page, and names can be looked up by any name which normalizes to the same
+    thing.
+    """
+
+    def __init__(self, names=(), serial=None):
+        # Projects can't share a normalized name, so neither can these
+        names = sorted(set(names), key=index_sort_key)
+        normalized = [normalize(name).encode("utf-8") for name in names]
+
+        self._names, self._name_offsets = _pack(
+            [name.encode("utf-8") for name in names]
+        )
+
+        # Lookups binary search a second buffer of the normalized names in
+        #   their own order, which maps back to the position of each name.
+        order = sorted(range(len(names)), key=normalized.__getitem__)
+        self._normalized, self._normalized_offsets = _pack(
+            [normalized[i] for i in order]
+        )
+        self._order = array(OFFSET_TYPECODE, order)
+
+        self.serial = serial
+
+    def __len__(self):
+        return len(self._order)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self._name(i)
+
+    def __contains__(self, name):
+        return self.get(name) is not None
+
+    def _name(self, i):
+        offsets = self._name_offsets
+        return self._names[offsets[i]:offsets[i + 1]].decode("utf-8")
+
+    def _normalized_name(self, i):
+        offsets = self._normalized_offsets
+        return self._normalized[offsets[i]:offsets[i + 1]]
+
+    def _bisect(self, key):
+        lo, hi = 0, len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._normalized_name(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+
+        return lo
+
+    def get(self, name):
+        """
+        Returns the real name of the project which ``name`` refers to, or None
+        if there isn't one.
+        """
+        i = self._position(name)
+        if i is not None:
+            return self._name(self._order[i])
+
+    def iter_prefix(self, prefix):
+        """
+        Yields the name of every project whose normalized name starts with
+        the normalized ``prefix``, ordered by their normalized names.
+        """
+        key = normalize(prefix).encode("utf-8")
+
+        for i in range(self._bisect(key), len(self)):
+            if not self._normalized_name(i).startswith(key):
+                break
+            yield self._name(self._order[i])
+
+    def updated(self, removed=(), added=(), serial=None):
+        """
+        Returns a new index without the names in ``removed`` and with the
+        names in ``added``, as of the journal entry ``serial``.
+        """
+        # Look up the position of every name that is going away by its
+        #   normalized name, which also finds any project that an added name
+        #   has taken the place of.
+        dropped = {}
+        for name in removed:
+            i = self._position(name)
+            if i is not None and self._name(self._order[i]) == name:
+                dropped[i] = self._order[i]
+
+        new = {}
+        for name in set(added):
+            i = self._position(name)
+            if i is not None and i not in dropped:
+                if self._name(self._order[i]) == name:
+                    continue
+                dropped[i] = self._order[i]
+            new[normalize(name).encode("utf-8")] = name
+
+        # The names which stay are already in order, so the new ones only
+        #   need to be merged in where they belong.
+        names = sorted(new.values(), key=index_sort_key)
+        name_data, name_offsets, name_moved, name_placed = _splice(
+            self._names, self._name_offsets,
+            dropped.values(),
+            [(self._name_position(name), name.encode("utf-8"))
+             for name in names],
+        )
+        name_positions = dict(zip(names, name_placed))
+
+        keys = sorted(new)
+        normalized, normalized_offsets, moved, placed = _splice(
+            self._normalized, self._normalized_offsets,
+            dropped,
+            [(self._bisect(key), key) for key in keys],
+        )
+
+        order = array(OFFSET_TYPECODE, [0]) * (len(normalized_offsets) - 1)
+        for i, position in enumerate(self._order):
+            if i not in dropped:
+                order[moved[i]] = name_moved[position]
+        for i, key in zip(placed, keys):
+            order[i] = name_positions[new[key]]
+
+        index = ProjectIndex(serial=serial)
+        index._names, index._name_offsets = name_data, name_offsets
+        index._normalized = normalized
+        index._normalized_offsets = normalized_offsets
+        index._order = order
+
+        return index
+
+    def _position(self, name):
+        key = normalize(name).encode("utf-8")
+
+        i = self._bisect(key)
+        if i < len(self) and self._normalized_name(i) == key:
+            return i
+
+    def _name_position(self, name):
+        key = index_sort_key(name)
+
+        lo, hi = 0, len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if index_sort_key(self._name(mid)) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+
+        return lo
@@ -14,14 +14,30 @@
 from __future__ import absolute_import, division, print_function
 from __future__ import unicode_literals
 
+import heapq
+import threading
+import time
+
 from collections import namedtuple
 
+import six
+
 from six.moves import urllib_parse
-from sqlalchemy.sql import select, func
+from sqlalchemy import Integer, UnicodeText
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.sql import (
+    any_, bindparam, select, cast, func, literal, literal_column, null,
+    union_all,
+)
+from werkzeug.urls import url_quote
 
 from warehouse import models
+from warehouse.packaging.index import ProjectIndex, index_sort_key
+from warehouse.packaging.normalization import normalize
+from warehouse.packaging.snapshot import Snapshot
 from warehouse.packaging.tables import (
     packages, releases, release_files, description_urls, journals,
+    package_serials,
 )
 
 
@@ -29,23 +45,159 @@ Project = namedtuple("Project", ["name"])
 
 FileURL = namedtuple("FileURL", ["filename", "url"])
 
+FileMetadata = namedtuple("FileMetadata", ["project", "md5_digest", "serial"])
+
+ChangelogEntry = namedtuple(
+    "ChangelogEntry",
+    ["serial", "name", "version", "action", "submitted_date"],
+)
+
+ReleaseFile = namedtuple("ReleaseFile", ["filename", "url", "md5_digest"])
+
+ProjectFiles = namedtuple("ProjectFiles", ["project", "serial", "files"])
+
+SimplePage = namedtuple(
+    "SimplePage",
+    [
+        "project", "hosting_mode", "serial", "files", "release_urls",
+        "external_urls",
+    ],
+)
+
+
+def _file_url(name, python_version, filename, md5_digest):
+    return FileURL(
+        filename=filename,
+        url=urllib_parse.urljoin(
+            "/".join([
+                "../../packages",
+                python_version,
+                name[0],
+                name,
+                filename,
+            ]),
+            "#md5={}".format(md5_digest),
+        ),
+    )
+
+
+def _project_path(name):
+    # Werkzeug resolves any dot segments in the URLs that it builds, so these
+    #   can't be used as is.
+    segments = name.split("/")
+    if "." in segments or ".." in segments:
+        return
+
+    return url_quote(name)
+
 
 class Model(models.Model):
 
+    def __init__(self, *args, **kwargs):
+        super(Model, self).__init__(*args, **kwargs)
+
+        self._paths = None
+        self._paths_serial = None
+        self._paths_lock = threading.Lock()
+
+        self._index = None
+        self._index_checked = None
+        self._index_lock = threading.Lock()
+
+        self._snapshot = None
+        self._snapshot_lock = threading.Lock()
+
+    @property
+    def use_package_serials(self):
+        # Reading the serials which the journals trigger maintains is a single
+        #   row lookup instead of an aggregate over every journal entry of a
+        #   project, but it requires the trigger to be installed.
+        if self.config is None:
+            return False
+        return self.config.get("database", {}).get("package_serials", False)
+
+    def _serial_query(self, name):
+        if self.use_package_serials:
+            return (
+                select([package_serials.c.last_serial])
+                .where(package_serials.c.name == name)
+            )
+
+        return select([func.max(journals.c.id)]).where(journals.c.name == name)
+
+    @property
+    def use_project_index(self):
+        # Keeping every project name in memory lets us list and look up
+        #   projects without querying the packages table, at the cost of a
+        #   few bytes per project. Unless cache.projects has a ttl the last
+        #   serial is still looked up each time to keep the index current.
+        if self.config is None:
+            return False
+        return bool(self.config.get("cache", {}).get("projects", False))
+
     def all_projects(self):
+        # A snapshot is shared by every process on a machine, so we'd rather
+        #   list the projects from it than keep an index in each of them.
+        snapshot = self.get_snapshot()
+        if snapshot is not None:
+            return self._snapshot_projects(snapshot)
+
+        if self.use_project_index:
+            return (Project(name) for name in self.get_project_index())
+
+        return self._query_projects()
+
+    def _snapshot_projects(self, snapshot):
+        # Only the projects which have changed since the snapshot was built
+        #   need to be looked up, and are merged in where they belong.
+        changed = self.get_changed_projects(snapshot.serial or 0)
+        added = self._existing_projects(list(changed)) if changed else []
+
+        names = heapq.merge(
+            ((index_sort_key(name), name) for name in snapshot
+             if name not in changed),
+            sorted((index_sort_key(name), name) for name in added),
+        )
+
+        for _, name in names:
+            yield Project(name)
+
+    def _query_projects(self):
         query = select([packages.c.name]).order_by(func.lower(packages.c.name))
 
+        # Use a server side cursor so that we only hold a batch of rows in
+        #   memory at any one time instead of the entire table.
         with self.engine.connect() as conn:
-            return [Project(r["name"]) for r in conn.execute(query)]
+            results = conn.execution_options(stream_results=True).execute(
+                query,
+            )
+
+            for r in results:
+                yield Project(r["name"])
+
+    def _existing_projects(self, names):
+        query = select([packages.c.name]).where(packages.c.name.in_(names))
+
+        with self.engine.connect() as conn:
+            return [r["name"] for r in conn.execute(query)]
 
     def get_project(self, name):
+        # Projects created since the snapshot was built aren't in it, so only
+        #   the ones which are can skip the query.
+        snapshot = self.get_snapshot()
+        if snapshot is not None:
+            data = snapshot.get(name)
+            if data is not None:
+                return Project(data.name)
+        elif self.use_project_index:
+            name = self.get_project_index().get(name)
+            if name is not None:
+                return Project(name)
+            return
+
         query = (
             select([packages.c.name])
-            .where(
-                packages.c.normalized_name == func.lower(
-                    func.regexp_replace(name, "_", "-", "ig"),
-                )
-            )
+            .where(packages.c.normalized_name == normalize(name))
         )
 
         with self.engine.connect() as conn:
@@ -54,99 +206,401 @@ class Model(models.Model):
             if result is not None:
                 return Project(result)
 
-    def get_hosting_mode(self, name):
-        query = (
-            select([packages.c.hosting_mode])
-            .where(packages.c.name == name)
+    def get_simple_page_data(self, name):
+        project = (
+            select([packages.c.name, packages.c.hosting_mode])
+            .where(packages.c.normalized_name == normalize(name))
+            .cte("project")
         )
 
-        with self.engine.connect() as conn:
-            return conn.execute(query).scalar()
+        serial = self._serial_query(project.c.name).as_scalar()
 
-    def get_release_urls(self, name):
-        query = (
+        # Everything the simple project page needs is fetched in a single
+        #   round trip by tagging each row with the kind of data it holds and
+        #   combining them all together.
+        query = union_all(
+            select([
+                literal("project").label("kind"),
+                project.c.name.label("a"),
+                project.c.hosting_mode.label("b"),
+                null().label("c"),
+                null().label("d"),
+                serial.label("serial"),
+            ]),
+            select([
+                literal("file"),
+                release_files.c.name,
+                release_files.c.filename,
+                release_files.c.python_version,
+                release_files.c.md5_digest,
+                cast(null(), Integer),
+            ])
+            .where(release_files.c.name == project.c.name),
             select([
+                literal("release"),
+                releases.c.name,
                 releases.c.version,
                 releases.c.home_page,
                 releases.c.download_url,
+                cast(null(), Integer),
             ])
-            .where(releases.c.name == name)
-            .order_by(releases.c.version.desc())
+            .where(releases.c.name == project.c.name)
+            .where(
+                project.c.hosting_mode.in_(
+                    ["pypi-scrape-crawl", "pypi-scrape"],
+                )
+            ),
+            select(
+                [
+                    literal("external"),
+                    description_urls.c.name,
+                    description_urls.c.url,
+                    null().label("c"),
+                    null().label("d"),
+                    cast(null(), Integer).label("serial"),
+                ],
+                distinct=True,
+            )
+            .where(description_urls.c.name == project.c.name),
+        ).order_by(literal_column("b").desc())
+
+        with self.engine.connect() as conn:
+            rows = conn.execute(query).fetchall()
+
+        rows_by_kind = {}
+        for r in rows:
+            rows_by_kind.setdefault(r["kind"], []).append(r)
+
+        if not rows_by_kind.get("project"):
+            return
+
+        project_row = rows_by_kind["project"][0]
+
+        # Rows come back sorted descending, which matches how the individual
+        #   queries order files and releases, but external urls are expected
+        #   to be in ascending order.
+        return SimplePage(
+            project=Project(project_row["a"]),
+            hosting_mode=project_row["b"],
+            serial=project_row["serial"],
+            files=[
+                _file_url(r["a"], r["c"], r["b"], r["d"])
+                for r in rows_by_kind.get("file", [])
+            ],
+            release_urls={
+                r["b"]: (r["c"], r["d"])
+                for r in rows_by_kind.get("release", [])
+            },
+            external_urls=[
+                r["b"] for r in reversed(rows_by_kind.get("external", []))
+            ],
         )
 
+    def get_snapshot(self):
+        """
+        Returns the :class:`~warehouse.packaging.snapshot.Snapshot` at the
+        ``paths.snapshot`` path, reopening it whenever it has been replaced,
+        or None if there isn't one.
+        """
+        path = (self.config or {}).get("paths", {}).get("snapshot")
+        if not path:
+            return
+
+        with self._snapshot_lock:
+            snapshot = self._snapshot
+            if (snapshot is None or snapshot.path != path
+                    or not snapshot.is_current()):
+                try:
+                    snapshot = Snapshot(path)
+                except (IOError, OSError, ValueError):
+                    # Keep using the snapshot we have, if we have one, until
+                    #   a snapshot that we can read takes its place.
+                    pass
+                else:
+                    # The snapshot being replaced may still be in use by
+                    #   another thread, so it's closed once nothing is.
+                    self._snapshot = snapshot
+
+            return self._snapshot
+
+    def _get_project_serials(self, normalized):
+        project = (
+            select([packages.c.name, packages.c.normalized_name])
+            .where(
+                packages.c.normalized_name == any_(
+                    bindparam(
+                        "names",
+                        value=normalized,
+                        type_=ARRAY(UnicodeText()),
+                    ),
+                )
+            )
+            .alias("project")
+        )
+
+        query = select([
+            project.c.normalized_name,
+            project.c.name,
+            self._serial_query(project.c.name).as_scalar().label("serial"),
+        ])
+
         with self.engine.connect() as conn:
             return {
-                r["version"]: (r["home_page"], r["download_url"])
+                r["normalized_name"]: (r["name"], r["serial"])
                 for r in conn.execute(query)
             }
 
-    def get_external_urls(self, name):
-        query = (
-            select([description_urls.c.url], distinct=description_urls.c.url)
-            .where(description_urls.c.name == name)
-            .order_by(
-                description_urls.c.url,
+    def get_simple_batch(self, names):
+        """
+        Returns a mapping of the normalized form of each of ``names`` to the
+        project, last serial, and files of the project with that name. Names
+        which don't match a project are left out.
+        """
+        normalized = sorted(set(normalize(n) for n in names))
+
+        results = {}
+
+        # Files never change once they've been uploaded, so a project in the
+        #   snapshot is up to date for as long as its serial is, which we can
+        #   check without fetching any of its files.
+        snapshot = self.get_snapshot()
+        if snapshot is not None:
+            serials = self._get_project_serials(normalized)
+            for key, (name, serial) in six.iteritems(serials):
+                data = snapshot.get(key)
+                if (data is not None and data.name == name
+                        and data.serial == serial):
+                    results[key] = ProjectFiles(
+                        project=Project(data.name),
+                        serial=data.serial,
+                        files=[ReleaseFile(*f) for f in data.files],
+                    )
+
+            normalized = sorted(set(serials) - set(results))
+            if not normalized:
+                return results
+
+        results.update(self._query_simple_batch(normalized))
+
+        return results
+
+    def _query_simple_batch(self, normalized):
+        # Match every project at once instead of running a query per name
+        project = (
+            select([packages.c.name, packages.c.normalized_name])
+            .where(
+                packages.c.normalized_name == any_(
+                    bindparam(
+                        "names",
+                        value=normalized,
+                        type_=ARRAY(UnicodeText()),
+                    ),
+                )
             )
+            .cte("project")
         )
 
-        with self.engine.connect() as conn:
-            return [r["url"] for r in conn.execute(query)]
+        serial = self._serial_query(project.c.name).as_scalar()
 
-    def get_file_urls(self, name):
-        query = (
+        query = union_all(
             select([
+                literal("project").label("kind"),
+                project.c.name.label("name"),
+                project.c.normalized_name.label("a"),
+                null().label("b"),
+                null().label("c"),
+                serial.label("serial"),
+            ]),
+            select([
+                literal("file"),
                 release_files.c.name,
                 release_files.c.filename,
                 release_files.c.python_version,
                 release_files.c.md5_digest,
+                cast(null(), Integer),
             ])
-            .where(release_files.c.name == name)
-            .order_by(release_files.c.filename.desc())
-        )
+            .where(release_files.c.name == project.c.name),
+        ).order_by(literal_column("a").desc())
 
         with self.engine.connect() as conn:
-            results = conn.execute(query)
-
-            return [
-                FileURL(
-                    filename=r["filename"],
-                    url=urllib_parse.urljoin(
-                        "/".join([
-                            "../../packages",
-                            r["python_version"],
-                            r["name"][0],
-                            r["name"],
-                            r["filename"],
-                        ]),
-                        "#md5={}".format(r["md5_digest"]),
-                    ),
+            rows = conn.execute(query).fetchall()
+
+        files = {}
+        for r in rows:
+            if r["kind"] == "file":
+                url = _file_url(r["name"], r["b"], r["a"], r["c"]).url
+                files.setdefault(r["name"], []).append(
+                    ReleaseFile(filename=r["a"], url=url, md5_digest=r["c"])
+                )
+
+        return {
+            r["a"]: ProjectFiles(
+                project=Project(r["name"]),
+                serial=r["serial"],
+                files=files.get(r["name"], []),
+            )
+            for r in rows if r["kind"] == "project"
+        }
+
+    def get_file_metadata(self, filename):
+        # Files never change once they've been uploaded, so only the serial
+        #   of a file's project can have changed since the snapshot was built.
+        snapshot = self.get_snapshot()
+        if snapshot is not None:
+            data = snapshot.get_file(filename)
+            if data is not None:
+                return FileMetadata(
+                    project=Project(data.project),
+                    md5_digest=data.md5_digest,
+                    serial=self.get_last_serial(data.project),
                 )
-                for r in results
-            ]
 
-    def get_project_for_filename(self, filename):
+        serial = self._serial_query(release_files.c.name).as_scalar()
+
         query = (
-            select([release_files.c.name])
+            select([
+                release_files.c.name,
+                release_files.c.md5_digest,
+                serial.label("serial"),
+            ])
             .where(release_files.c.filename == filename)
         )
 
         with self.engine.connect() as conn:
-            return Project(conn.execute(query).scalar())
+            result = conn.execute(query).first()
 
-    def get_filename_md5(self, filename):
-        query = (
-            select([release_files.c.md5_digest])
-            .where(release_files.c.filename == filename)
-        )
+            if result is not None:
+                return FileMetadata(
+                    project=Project(result["name"]),
+                    md5_digest=result["md5_digest"],
+                    serial=result["serial"],
+                )
+
+    def get_last_serial(self, name=None):
+        if name is not None:
+            query = self._serial_query(name)
+        else:
+            query = select([func.max(journals.c.id)])
 
         with self.engine.connect() as conn:
             return conn.execute(query).scalar()
 
-    def get_last_serial(self, name=None):
-        query = select([func.max(journals.c.id)])
+    def get_project_serial(self, name):
+        project = (
+            select([packages.c.name])
+            .where(packages.c.normalized_name == normalize(name))
+            .as_scalar()
+        )
 
-        if name is not None:
-            query = query.where(journals.c.name == name)
+        query = self._serial_query(project)
 
         with self.engine.connect() as conn:
             return conn.execute(query).scalar()
+
+    def get_project_paths(self):
+        """
+        Returns a mapping of each project name to the name quoted for use as
+        a path segment, or None if it can't be used as one. The mapping is
+        kept in memory and brought up to date with the journals each time it
+        is requested.
+        """
+        serial = self.get_last_serial()
+
+        with self._paths_lock:
+            if self._paths is None:
+                paths = {
+                    p.name: _project_path(p.name) for p in self.all_projects()
+                }
+            elif serial != self._paths_serial:
+                changed = self.get_changed_projects(self._paths_serial or 0)
+                existing = self._existing_projects(list(changed))
+
+                # Build a new mapping rather than modifying the one which we
+                #   may have already handed out.
+                paths = dict(self._paths)
+                for name in changed:
+                    paths.pop(name, None)
+                for name in existing:
+                    paths[name] = _project_path(name)
+            else:
+                return self._paths
+
+            self._paths, self._paths_serial = paths, serial
+
+            return paths
+
+    def get_project_index(self):
+        """
+        Returns a :class:`~warehouse.packaging.index.ProjectIndex` of every
+        project. The index is kept in memory and brought up to date with the
+        journals when it is requested, at most once every ``ttl`` seconds if
+        the ``cache.projects`` configuration has one. Without a ``ttl`` each
+        request for the index looks up the last serial.
+        """
+        config = (self.config or {}).get("cache", {}).get("projects")
+        ttl = config.get("ttl") if isinstance(config, dict) else None
+
+        with self._index_lock:
+            now = time.time()
+            if (self._index is not None and ttl
+                    and now - self._index_checked < ttl):
+                return self._index
+
+            serial = self.get_last_serial()
+
+            if self._index is None:
+                index = ProjectIndex(
+                    (p.name for p in self._query_projects()),
+                    serial,
+                )
+            elif serial != self._index.serial:
+                changed = self.get_changed_projects(self._index.serial or 0)
+                existing = self._existing_projects(list(changed))
+
+                # Only the projects which have been created or removed since
+                #   are merged into the index that we already have.
+                index = self._index.updated(
+                    removed=set(changed) - set(existing),
+                    added=existing,
+                    serial=serial,
+                )
+            else:
+                index = self._index
+
+            self._index, self._index_checked = index, now
+
+            return index
+
+    def get_changelog(self, since, limit):
+        """
+        Returns up to ``limit`` journal entries which come after the serial
+        ``since``, in the order that they were made.
+        """
+        # Paginating on the serial instead of with an OFFSET means that every
+        #   page is a range scan over journals_id_idx, no matter how deep.
+        query = (
+            select([
+                journals.c.id,
+                journals.c.name,
+                journals.c.version,
+                journals.c.action,
+                journals.c.submitted_date,
+            ])
+            .where(journals.c.id > since)
+            .order_by(journals.c.id)
+            .limit(limit)
+        )
+
+        with self.engine.connect() as conn:
+            return [ChangelogEntry(*r) for r in conn.execute(query)]
+
+    def get_changed_projects(self, since):
+        query = (
+            select([journals.c.name, func.max(journals.c.id).label("serial")])
+            .where(journals.c.id > since)
+            .where(journals.c.name.isnot(None))
+            .group_by(journals.c.name)
+        )
+
+        with self.engine.connect() as conn:
+            return {r["name"]: r["serial"] for r in conn.execute(query)}
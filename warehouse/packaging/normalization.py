@@ -0,0 +1,31 @@
+# Copyright 2013 Donald Stufft
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from __future__ import absolute_import, division, print_function
+from __future__ import unicode_literals
+
+import re
+
+
+_SEPARATORS = re.compile(r"[-_.]+")
+
+
+def normalize(name):
+    """
+    Normalizes a project name as described by PEP 503, collapsing every run
+    of ``-``, ``_``, and ``.`` into a single ``-`` and lower casing it.
+
+    This must match the normalize_project_name() function in the database,
+    which maintains ``packages.normalized_name``.
+    """
+    return _SEPARATORS.sub("-", name).lower()
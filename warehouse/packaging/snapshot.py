@@ -0,0 +1,358 @@
+# Copyright 2013 Donald Stufft
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Read only snapshots of every project and its files, shared between processes.
+
+A snapshot is a single file which each process maps into memory, so the pages
+are shared by every worker on a machine instead of each one keeping a copy of
+its own. Lookups read the fixed size records straight out of the mapping and
+only decode the strings that they return.
+
+The file is laid out as a header, a record for each project sorted by its
+normalized name, a record for each file, the position of each project record
+in the order of the index page, the position of each file record sorted by
+its filename, and finally the strings that the records point into. Every
+number is little endian.
+"""
+from __future__ import absolute_import, division, print_function
+from __future__ import unicode_literals
+
+import errno
+import mmap
+import os
+import os.path
+import struct
+import tempfile
+
+from collections import namedtuple
+
+from warehouse.packaging.index import index_sort_key
+from warehouse.packaging.normalization import normalize
+
+
+MAGIC = b"WHSNAPSH"
+
+VERSION = 2
+
+# magic, version, serial, projects, files, and the offset of each section
+HEADER = struct.Struct(str("<8sIqIIQQQQQ"))
+
+# name, normalized name, first file, file count, serial
+PROJECT = struct.Struct(str("<IIIIIIq"))
+
+# filename, url, project, md5 digest
+FILE = struct.Struct(str("<IIIII32s"))
+
+ORDER = struct.Struct(str("<I"))
+
+
+SnapshotProject = namedtuple("SnapshotProject", ["name", "serial", "files"])
+
+SnapshotFile = namedtuple("SnapshotFile", ["filename", "url", "md5_digest"])
+
+SnapshotFileMetadata = namedtuple(
+    "SnapshotFileMetadata",
+    ["project", "serial", "md5_digest"],
+)
+
+
+def _serial(value):
+    return -1 if value is None else value
+
+
+def _md5_digest(value):
+    return value.rstrip(b"\0").decode("ascii") or None
+
+
+def dumps(serial, projects):
+    """
+    Returns the snapshot of ``projects`` as of the journal entry ``serial``.
+    Each project needs a ``project.name``, a ``serial`` and a list of
+    ``files`` which each have a ``filename``, ``url`` and ``md5_digest``.
+    """
+    projects = sorted(
+        projects,
+        key=lambda p: normalize(p.project.name).encode("utf-8"),
+    )
+
+    strings, length = [], [0]
+
+    def add_string(value):
+        data = value.encode("utf-8")
+        offset = length[0]
+        strings.append(data)
+        length[0] += len(data)
+        return offset, len(data)
+
+    project_records, file_records, filenames = [], [], []
+    for position, data in enumerate(projects):
+        name = data.project.name
+
+        project_records.append(PROJECT.pack(
+            *(
+                add_string(name)
+                + add_string(normalize(name))
+                + (len(file_records), len(data.files), _serial(data.serial))
+            )
+        ))
+
+        for f in data.files:
+            filenames.append(f.filename.encode("utf-8"))
+            file_records.append(FILE.pack(
+                *(
+                    add_string(f.filename)
+                    + add_string(f.url)
+                    + (position, (f.md5_digest or "").encode("ascii"))
+                )
+            ))
+
+    order = sorted(
+        range(len(projects)),
+        key=lambda i: index_sort_key(projects[i].project.name),
+    )
+    order_records = [ORDER.pack(i) for i in order]
+
+    filename_records = [
+        ORDER.pack(i)
+        for i in sorted(range(len(filenames)), key=filenames.__getitem__)
+    ]
+
+    projects_offset = HEADER.size
+    files_offset = projects_offset + PROJECT.size * len(project_records)
+    order_offset = files_offset + FILE.size * len(file_records)
+    filenames_offset = order_offset + ORDER.size * len(order_records)
+    strings_offset = filenames_offset + ORDER.size * len(filename_records)
+
+    header = HEADER.pack(
+        MAGIC, VERSION, _serial(serial),
+        len(project_records), len(file_records),
+        projects_offset, files_offset, order_offset, filenames_offset,
+        strings_offset,
+    )
+
+    return b"".join(
+        [header] + project_records + file_records + order_records
+        + filename_records + strings
+    )
+
+
+def write(path, serial, projects):
+    """
+    Writes the snapshot of ``projects`` to ``path``, replacing any snapshot
+    which is already there in a single step.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+
+    try:
+        os.makedirs(directory)
+    except OSError as exc:
+        if exc.errno != errno.EEXIST:
+            raise
+
+    # Processes which have the old snapshot mapped keep reading it until they
+    #   reopen the path, which only ever has a complete snapshot behind it.
+    fd, tmppath = tempfile.mkstemp(dir=directory, prefix=".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as fp:
+            fp.write(dumps(serial, projects))
+            fp.flush()
+            os.fsync(fp.fileno())
+
+        os.chmod(tmppath, 0o644)
+        os.rename(tmppath, path)
+    finally:
+        if os.path.exists(tmppath):
+            os.unlink(tmppath)
+
+
+def build(model, path, batch_size=1000):
+    """
+    Writes a snapshot of every project that ``model`` knows about to ``path``
+    and returns the number of projects in it.
+    """
+    # Look up the serial first so that the snapshot is never newer than the
+    #   serial it claims to be from.
+    serial = model.get_last_serial()
+
+    names = [p.name for p in model.all_projects()]
+
+    projects = []
+    for i in range(0, len(names), batch_size):
+        projects.extend(
+            model.get_simple_batch(names[i:i + batch_size]).values()
+        )
+
+    write(path, serial, projects)
+
+    return len(projects)
+
+
+class Snapshot(object):
+    """
+    A snapshot file mapped into memory. Raises ValueError if ``path`` isn't a
+    snapshot that we can read.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+        with open(path, "rb") as fp:
+            stat = os.fstat(fp.fileno())
+            self._buffer = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+
+        # A new snapshot is always a new file, so this tells us whether the
+        #   path still points at the one that we have open.
+        self._identity = (stat.st_dev, stat.st_ino)
+
+        if self._buffer.size() < HEADER.size:
+            raise ValueError("{} is not a snapshot".format(path))
+
+        (magic, version, serial, self._projects, self._files,
+         self._projects_offset, self._files_offset, self._order_offset,
+         self._filenames_offset, self._strings_offset) = HEADER.unpack_from(
+            self._buffer, 0,
+        )
+
+        if magic != MAGIC:
+            raise ValueError("{} is not a snapshot".format(path))
+
+        if version != VERSION:
+            raise ValueError(
+                "{} is a version {} snapshot, expected version {}".format(
+                    path, version, VERSION,
+                )
+            )
+
+        self.serial = None if serial < 0 else serial
+
+    def __len__(self):
+        return self._projects
+
+    def __iter__(self):
+        for i in range(self._projects):
+            position, = ORDER.unpack_from(
+                self._buffer, self._order_offset + ORDER.size * i,
+            )
+            offset, length = self._project(position)[:2]
+            yield self._string(offset, length)
+
+    def _bytes(self, offset, length):
+        start = self._strings_offset + offset
+        return self._buffer[start:start + length]
+
+    def _string(self, offset, length):
+        return self._bytes(offset, length).decode("utf-8")
+
+    def _project(self, i):
+        return PROJECT.unpack_from(
+            self._buffer, self._projects_offset + PROJECT.size * i,
+        )
+
+    def _file_record(self, i):
+        return FILE.unpack_from(
+            self._buffer, self._files_offset + FILE.size * i,
+        )
+
+    def _file(self, i):
+        (filename_offset, filename_length, url_offset, url_length, _,
+         md5_digest) = self._file_record(i)
+
+        return SnapshotFile(
+            filename=self._string(filename_offset, filename_length),
+            url=self._string(url_offset, url_length),
+            md5_digest=_md5_digest(md5_digest),
+        )
+
+    def _find(self, key):
+        lo, hi = 0, self._projects
+        while lo < hi:
+            mid = (lo + hi) // 2
+            record = self._project(mid)
+            normalized = self._bytes(record[2], record[3])
+
+            if normalized < key:
+                lo = mid + 1
+            elif normalized > key:
+                hi = mid
+            else:
+                return record
+
+    def get(self, name):
+        """
+        Returns the project which ``name`` refers to along with its last
+        serial and its files, or None if there isn't one.
+        """
+        record = self._find(normalize(name).encode("utf-8"))
+
+        if record is None:
+            return
+
+        name_offset, name_length, _, _, first, count, serial = record
+
+        return SnapshotProject(
+            name=self._string(name_offset, name_length),
+            serial=None if serial < 0 else serial,
+            files=[self._file(i) for i in range(first, first + count)],
+        )
+
+    def _find_file(self, key):
+        lo, hi = 0, self._files
+        while lo < hi:
+            mid = (lo + hi) // 2
+            position, = ORDER.unpack_from(
+                self._buffer, self._filenames_offset + ORDER.size * mid,
+            )
+            record = self._file_record(position)
+            filename = self._bytes(record[0], record[1])
+
+            if filename < key:
+                lo = mid + 1
+            elif filename > key:
+                hi = mid
+            else:
+                return record
+
+    def get_file(self, filename):
+        """
+        Returns the name and last serial of the project which ``filename``
+        belongs to along with the file's md5 digest, or None if there isn't a
+        file with that name.
+        """
+        record = self._find_file(filename.encode("utf-8"))
+
+        if record is None:
+            return
+
+        name_offset, name_length, _, _, _, _, serial = self._project(record[4])
+
+        return SnapshotFileMetadata(
+            project=self._string(name_offset, name_length),
+            serial=None if serial < 0 else serial,
+            md5_digest=_md5_digest(record[5]),
+        )
+
+    def is_current(self):
+        """
+        Returns whether ``path`` still points at this snapshot.
+        """
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            # Keep using the snapshot we have rather than none at all
+            return True
+
+        return (stat.st_dev, stat.st_ino) == self._identity
+
+    def close(self):
+        self._buffer.close()
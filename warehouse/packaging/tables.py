@@ -31,7 +31,8 @@ packages = Table(
 
     Column("name", UnicodeText(), primary_key=True, nullable=False),
     Column("stable_version", UnicodeText()),
-    Column("normalized_name", UnicodeText()),
+    # Maintained by a trigger, see warehouse.packaging.normalization
+    Column("normalized_name", UnicodeText(), nullable=False),
     Column("autohide", Boolean(), server_default=sql.true()),
     Column("comments", Boolean(), server_default=sql.true()),
     Column("bugtrack_url", UnicodeText()),
@@ -48,6 +49,8 @@ packages = Table(
         "name ~* '^([A-Z0-9]|[A-Z0-9][A-Z0-9._-]*[A-Z0-9])$'",
         name="packages_valid_name",
     ),
+
+    Index("packages_normalized_name_idx", "normalized_name", unique=True),
 )
 
 releases = Table(
@@ -162,13 +165,25 @@ journals = Table(
     Column("submitted_by", CIText()),  # Needs a FK to accounts_user
     Column("submitted_from", UnicodeText()),
 
+    Index("journals_id_idx", "id"),
     Index("journals_name_idx", "name"),
+    Index("journals_name_id_idx", "name", "id"),
     Index("journals_version_idx", "version"),
     Index("journals_changelog", "submitted_date", "name", "version", "action"),
     Index("journals_latest_releases", "submitted_date", "name", "version"),
 )
 
 
+# Maintained by a trigger on journals
+package_serials = Table(
+    "package_serials",
+    Warehouse.metadata,
+
+    Column("name", UnicodeText(), primary_key=True, nullable=False),
+    Column("last_serial", Integer(), nullable=False),
+)
+
+
 cheesecake_main_indices = Table(
     "cheesecake_main_indices",
     Warehouse.metadata,
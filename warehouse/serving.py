@@ -0,0 +1,97 @@
+# Copyright 2013 Donald Stufft
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from __future__ import absolute_import, division, print_function
+from __future__ import unicode_literals
+
+import os
+
+from werkzeug.serving import WSGIRequestHandler
+
+
+class SendfileWrapper(object):
+    """
+    A ``wsgi.file_wrapper`` which hands the file off to the kernel using
+    :func:`os.sendfile` instead of reading it into Python, falling back to
+    reading it in blocks when that isn't possible.
+    """
+
+    def __init__(self, connection, filelike, blksize=8192):
+        self.connection = connection
+        self.filelike = filelike
+        self.blksize = blksize
+
+    def close(self):
+        if hasattr(self.filelike, "close"):
+            self.filelike.close()
+
+    def _can_sendfile(self):
+        # sendfile() requires real file descriptors on both ends, and we
+        #   can't use it with a socket that has a timeout because that socket
+        #   is non blocking at the OS level.
+        if not hasattr(os, "sendfile"):
+            return False
+
+        try:
+            self.filelike.fileno()
+            self.connection.fileno()
+        except (AttributeError, IOError, ValueError):
+            return False
+
+        return self.connection.gettimeout() is None
+
+    def __iter__(self):
+        if not self._can_sendfile():
+            while True:
+                data = self.filelike.read(self.blksize)
+                if not data:
+                    break
+                yield data
+            return
+
+        # Writing an empty chunk causes the server to send our headers, after
+        #   that we can write the body directly to the socket.
+        yield b""
+
+        offset = self.filelike.tell()
+        while True:
+            sent = os.sendfile(
+                self.connection.fileno(),
+                self.filelike.fileno(),
+                offset,
+                self.blksize * 16,
+            )
+            if not sent:
+                break
+            offset += sent
+
+
+class SendfileRequestHandler(WSGIRequestHandler):
+    """
+    A Werkzeug request handler which provides a ``wsgi.file_wrapper`` that
+    uses :func:`os.sendfile` to serve files.
+    """
+
+    def make_environ(self):
+        environ = super(SendfileRequestHandler, self).make_environ()
+
+        # Sending the file directly would bypass TLS entirely
+        if self.server.ssl_context is not None:
+            return environ
+
+        def file_wrapper(filelike, blksize=8192):
+            return SendfileWrapper(self.connection, filelike, blksize)
+
+        environ["wsgi.file_wrapper"] = file_wrapper
+
+        return environ
@@ -24,6 +24,11 @@ from warehouse import helpers
 from warehouse.http import Response
 
 
+# The number of template output fragments that are joined together into each
+#   chunk of a streamed response.
+STREAM_BUFFER_SIZE = 500
+
+
 class AttributeDict(dict):
 
     def __getattr__(self, name):
@@ -67,17 +72,33 @@ def convert_to_attr_dict(dictionary):
     return AttributeDict(output)
 
 
-def render_response(app, request, template, **variables):
-    template = app.templates.get_template(template)
-
+def _template_context(request, variables):
     context = {
         "url_for": functools.partial(helpers.url_for, request),
     }
     context.update(variables)
+    return context
+
+
+def render_response(app, request, template, **variables):
+    template = app.templates.get_template(template)
+    context = _template_context(request, variables)
 
     return Response(template.render(**context), mimetype="text/html")
 
 
+def stream_response(app, request, template, **variables):
+    template = app.templates.get_template(template)
+    context = _template_context(request, variables)
+
+    # Render the template lazily, buffering the generated output so that we
+    #   send reasonably sized chunks instead of one write per template node.
+    stream = template.stream(**context)
+    stream.enable_buffering(size=STREAM_BUFFER_SIZE)
+
+    return Response(stream, mimetype="text/html")
+
+
 def cache(key):
     def deco(fn):
         @functools.wraps(fn)